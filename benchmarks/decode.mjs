@@ -0,0 +1,43 @@
+// Measure JSON parse and decode time of serialized shapes messages under Node.
+//
+// Usage: node decode.mjs <cases.json> [repeat]
+// where cases.json maps case names to files holding the "shapes" state of a message.
+// Prints a JSON object { name: { parse_ms, decode_ms } } with the best time of all runs.
+
+import { readFileSync } from "fs";
+import { dirname, join } from "path";
+import { fileURLToPath } from "url";
+import { performance } from "perf_hooks";
+
+const here = dirname(fileURLToPath(import.meta.url));
+
+// serializer.js is an ES module inside a commonjs package, so load it from its source
+const source = readFileSync(join(here, "..", "js", "lib", "serializer.js"), "utf8");
+const { decode } = await import(
+  "data:text/javascript," + encodeURIComponent(source)
+);
+
+const cases = JSON.parse(readFileSync(process.argv[2], "utf8"));
+const repeat = parseInt(process.argv[3] || "3");
+
+const results = {};
+for (const [name, path] of Object.entries(cases)) {
+  const text = readFileSync(path, "utf8");
+  let best = null;
+  for (let i = 0; i < repeat; i++) {
+    let start = performance.now();
+    const data = JSON.parse(text);
+    const parse = performance.now() - start;
+
+    start = performance.now();
+    decode({ data: data });
+    const decoded = performance.now() - start;
+
+    if (best == null || decoded < best.decode_ms) {
+      best = { parse_ms: parse, decode_ms: decoded };
+    }
+  }
+  results[name] = best;
+}
+
+console.log(JSON.stringify(results));
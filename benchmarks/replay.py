@@ -0,0 +1,38 @@
+"""
+Replay a comm recording of cad-viewer-widget into a headless viewer
+
+The recording is written by `CadViewer.start_recording`. Messages to the browser are sent into a comm
+that discards them, messages from the browser are handled by the kernel side of the viewer, so neither
+a browser nor the notebook of the recording is needed. Prints the message statistics and the slowest
+messages as JSON.
+
+Usage:
+
+    python benchmarks/replay.py <recording> [--speed 1.0|max] [--no-incoming]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from cad_viewer_widget import headless_viewer, replay  # pylint: disable=wrong-import-position
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a comm recording into a headless viewer")
+    parser.add_argument("recording", help="file written by CadViewer.start_recording")
+    parser.add_argument("--speed", default="max", help="replay speed relative to the recording or 'max'")
+    parser.add_argument("--no-incoming", action="store_true", help="skip the messages from the browser")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    stats = replay(args.recording, headless_viewer(), speed=speed, incoming=not args.no_incoming)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Benchmark suite for the shapes transport of cad-viewer-widget
+
+Runs the bundled example models (examples/*.json) and synthetic assemblies through
+`CadViewer.add_shapes` with a mock comm, so neither a browser nor a kernel is needed, and measures
+
+- `to_json` and `send` time and the resulting throughput (MB/s of encoded message),
+- the encoded message size (json + binary buffers),
+- the Python memory peak during `add_shapes`,
+- the Javascript `decode` time of the message under Node (see decode.mjs).
+
+Usage:
+
+    python benchmarks/run.py [--sizes 1000 10000 100000] [--output benchmarks/results.json]
+                             [--baseline <previous results.json>] [--no-js]
+
+With `--baseline` every metric is compared against the previous results using the tolerances of
+benchmarks/thresholds.json; regressions are listed in the results file and the exit code is 1.
+"""
+
+import argparse
+import copy
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import comm
+from comm.base_comm import BaseComm
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from cad_viewer_widget import CadViewer, __version__  # pylint: disable=wrong-import-position
+from cad_viewer_widget.utils import numpyify  # pylint: disable=wrong-import-position
+
+IDENTITY = [[0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 1.0]]
+
+
+class MockComm(BaseComm):
+    """A comm that serializes every message like the kernel session would and keeps its size"""
+
+    messages = []
+
+    def publish_msg(self, msg_type, data=None, metadata=None, buffers=None, **keys):
+        buffers = buffers or []
+        size = len(json.dumps(data, separators=(",", ":")).encode())
+        size += sum(memoryview(b).nbytes for b in buffers)
+        MockComm.messages.append({"type": msg_type, "data": data, "size": size})
+
+    @classmethod
+    def reset(cls):
+        cls.messages = []
+
+
+def load_examples():
+    cases = {}
+    for path in sorted(glob.glob(os.path.join(ROOT, "examples", "*.json"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "r") as fd:
+            cases[name] = numpyify(json.load(fd))
+    return cases
+
+
+def synthetic_assembly(parts, per_group=100, template="boxes"):
+    """
+    Create an assembly of `parts` instances of the example `template` on a grid, grouped into
+    sub assemblies of `per_group` parts
+    """
+    with open(os.path.join(ROOT, "examples", f"{template}.json"), "r") as fd:
+        data = json.load(fd)
+
+    instances = data["instances"]
+    n = max(1, round(parts ** (1 / 3)))
+    spacing = 40.0
+    groups = []
+    for g in range(0, parts, per_group):
+        group = {
+            "version": 3,
+            "parts": [],
+            "loc": IDENTITY,
+            "name": f"group_{g // per_group}",
+            "id": f"/assembly/group_{g // per_group}",
+        }
+        for i in range(g, min(g + per_group, parts)):
+            x, y, z = i % n, (i // n) % n, i // (n * n)
+            group["parts"].append(
+                {
+                    "id": f"{group['id']}/part_{i}",
+                    "type": "shapes",
+                    "subtype": "solid",
+                    "name": f"part_{i}",
+                    "shape": {"ref": i % len(instances)},
+                    "state": [1, 1],
+                    "color": "#e8b024",
+                    "alpha": 1.0,
+                    "texture": None,
+                    "loc": [[x * spacing, y * spacing, z * spacing], [0.0, 0.0, 0.0, 1.0]],
+                    "renderback": False,
+                    "accuracy": None,
+                    "bb": None,
+                }
+            )
+        groups.append(group)
+
+    extent = n * spacing
+    return {
+        "instances": instances,
+        "shapes": {
+            "version": 3,
+            "parts": groups,
+            "loc": IDENTITY,
+            "name": "assembly",
+            "id": "/assembly",
+            "normal_len": 0,
+            "bb": {
+                "xmin": -20.0,
+                "xmax": extent,
+                "ymin": -20.0,
+                "ymax": extent,
+                "zmin": -20.0,
+                "zmax": extent,
+            },
+        },
+    }
+
+
+def count_parts(obj):
+    if obj.get("parts") is None:
+        return 1
+    return sum(count_parts(part) for part in obj["parts"])
+
+
+def run_python(name, shapes, repeat):
+    """
+    Send `shapes` `repeat` times through a fresh viewer and keep the best timings. The memory peak is
+    measured in a separate run, since tracing allocations distorts the timings
+    """
+    best = best_message = None
+    for _ in range(repeat):
+        viewer = CadViewer()
+        MockComm.reset()
+
+        start = time.perf_counter()
+        viewer.add_shapes(copy.copy(shapes), up="Z", control="trackball")
+        total = (time.perf_counter() - start) * 1000
+
+        spans = viewer.last_timings["python"]
+        message = max(MockComm.messages, key=lambda m: m["size"])
+        result = {
+            "parts": count_parts(shapes["shapes"]),
+            "add_shapes_ms": total,
+            "to_json_ms": spans["to_json"],
+            "send_ms": spans["send"],
+            "message_bytes": message["size"],
+            "messages": len(MockComm.messages),
+        }
+        if best is None or result["add_shapes_ms"] < best["add_shapes_ms"]:
+            best = result
+            best_message = message
+        viewer.close()
+
+    viewer = CadViewer()
+    tracemalloc.start()
+    viewer.add_shapes(copy.copy(shapes), up="Z", control="trackball")
+    _, best["memory_peak_bytes"] = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    viewer.close()
+    MockComm.reset()
+
+    best["throughput_mb_s"] = best["message_bytes"] / 1e3 / max(best["to_json_ms"] + best["send_ms"], 1e-6)
+    return best, best_message["data"]["state"]["shapes"]
+
+
+def run_js(payloads, repeat):
+    """Measure the Javascript decode time of every payload under Node"""
+    node = shutil.which("node")
+    if node is None:
+        print("node not found, skipping Javascript decode benchmark")
+        return {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = {}
+        for name, payload in payloads.items():
+            files[name] = os.path.join(tmp, f"{name}.json")
+            with open(files[name], "w") as fd:
+                json.dump(payload, fd)
+
+        with open(os.path.join(tmp, "cases.json"), "w") as fd:
+            json.dump(files, fd)
+
+        result = subprocess.run(
+            [node, os.path.join(HERE, "decode.mjs"), os.path.join(tmp, "cases.json"), str(repeat)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    return json.loads(result.stdout)
+
+
+def compare(results, baseline, thresholds):
+    """List all metrics that got worse than the baseline by more than the allowed tolerance"""
+    regressions = []
+    for name, metrics in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric, tolerance in thresholds["tolerance"].items():
+            new, old = metrics.get(metric), previous.get(metric)
+            if new is None or old is None:
+                continue
+            if metric in thresholds.get("higher_is_better", []):
+                failed = new < old / tolerance
+            else:
+                failed = new > old * tolerance + thresholds.get("noise", {}).get(metric, 0)
+            if failed:
+                regressions.append(
+                    {"case": name, "metric": metric, "baseline": old, "value": new, "tolerance": tolerance}
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the shapes transport of cad-viewer-widget")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=os.path.join(HERE, "results.json"))
+    parser.add_argument("--thresholds", default=os.path.join(HERE, "thresholds.json"))
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--no-js", action="store_true")
+    args = parser.parse_args()
+
+    comm.create_comm = MockComm
+
+    cases = load_examples()
+    for size in args.sizes:
+        cases[f"synthetic_{size}"] = synthetic_assembly(size)
+
+    results = {}
+    payloads = {}
+    for name, shapes in cases.items():
+        results[name], payloads[name] = run_python(name, shapes, args.repeat)
+        print(
+            f"{name:>20}: {results[name]['parts']:7d} parts, "
+            f"{results[name]['message_bytes'] / 1e6:8.3f} MB, "
+            f"to_json {results[name]['to_json_ms']:8.2f} ms, "
+            f"send {results[name]['send_ms']:8.2f} ms, "
+            f"peak {results[name]['memory_peak_bytes'] / 1e6:8.3f} MB"
+        )
+
+    if not args.no_js:
+        for name, timings in run_js(payloads, args.repeat).items():
+            results[name].update(timings)
+            print(f"{name:>20}: decode {timings['decode_ms']:8.2f} ms (node)")
+
+    with open(args.thresholds, "r") as fd:
+        thresholds = json.load(fd)
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline, "r") as fd:
+            regressions = compare(results, json.load(fd)["results"], thresholds)
+        for r in regressions:
+            print(f"REGRESSION {r['case']}.{r['metric']}: {r['baseline']:.3f} -> {r['value']:.3f}")
+
+    with open(args.output, "w") as fd:
+        json.dump(
+            {
+                "version": __version__,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "thresholds": thresholds,
+                "baseline": args.baseline,
+                "regressions": regressions,
+                "results": results,
+            },
+            fd,
+            indent=2,
+        )
+    print(f"Results written to {args.output}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
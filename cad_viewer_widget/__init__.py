@@ -3,8 +3,33 @@ from ._version import __version__
 
 from IPython.display import display, HTML
 
-from .widget import AnimationTrack, CadViewer, get_viewer_by_id, get_viewers_by_id
+from .widget import (
+    AnimationTrack,
+    CadViewer,
+    get_viewer_by_id,
+    get_viewers_by_id,
+    get_viewer_stats,
+    set_max_live_viewers,
+    get_max_live_viewers,
+)
 from .sidecar import Sidecar
+from .store import GeometryStore, share_shapes, get_store, get_stores, close_store
+from .container import save_shapes, load_shapes
+from .loader import load_shapes_json, iter_shapes_json
+from .geometry import ShapeGeometry
+from .memory import estimate
+from .background import ShowHandle
+from .frames import FrameSequence
+from .thumbnails import ThumbnailBatch
+from .tour import CameraTour
+from .link import link_cameras, unlink_cameras
+from .recorder import read_recording, replay, headless_viewer
+from .pool import (
+    ViewerPool,
+    enable_viewer_pool,
+    disable_viewer_pool,
+    get_viewer_pool,
+)
 
 from .sidecar import (
     get_sidecar,
@@ -98,21 +123,35 @@ def open_viewer(
         print("`cad_width` cannot be smaller than 780, setting to 780")
 
     id_ = str(uuid.uuid4())
+    pool = get_viewer_pool()
 
     if title is None or title == "":
-        viewer = CadViewer(
-            title=None,
-            anchor=None,
-            cad_width=cad_width,
-            tree_width=tree_width,
-            height=height,
-            theme=theme,
-            glass=glass,
-            tools=tools,
-            pinning=pinning,
-            id_=id_,
-        )
+        viewer = None
+        if pool is not None:
+            viewer = pool.acquire(
+                cad_width=cad_width,
+                tree_width=tree_width,
+                height=height,
+                theme=theme,
+                glass=glass,
+                tools=tools,
+                pinning=pinning,
+            )
+        if viewer is None:
+            viewer = CadViewer(
+                title=None,
+                anchor=None,
+                cad_width=cad_width,
+                tree_width=tree_width,
+                height=height,
+                theme=theme,
+                glass=glass,
+                tools=tools,
+                pinning=pinning,
+                id_=id_,
+            )
 
+        viewer.widget.max_live_viewers = get_max_live_viewers()
         display(viewer.widget)
 
         image_id = f"img_{id_}"
@@ -124,19 +163,35 @@ def open_viewer(
         out = Sidecar(title=title, anchor=anchor)
         with out:
             try:
-                viewer = CadViewer(
-                    title=title,
-                    anchor=anchor,
-                    cad_width=cad_width,
-                    tree_width=tree_width,
-                    aspect_ratio=aspect_ratio,
-                    height=height,
-                    theme=theme,
-                    glass=glass,
-                    tools=tools,
-                    pinning=False,
-                    id_=id_,
-                )
+                viewer = None
+                if pool is not None:
+                    viewer = pool.acquire(
+                        cad_width=cad_width,
+                        tree_width=tree_width,
+                        aspect_ratio=aspect_ratio,
+                        height=height,
+                        theme=theme,
+                        glass=glass,
+                        tools=tools,
+                        pinning=False,
+                    )
+                if viewer is None:
+                    viewer = CadViewer(
+                        title=title,
+                        anchor=anchor,
+                        cad_width=cad_width,
+                        tree_width=tree_width,
+                        aspect_ratio=aspect_ratio,
+                        height=height,
+                        theme=theme,
+                        glass=glass,
+                        tools=tools,
+                        pinning=False,
+                        id_=id_,
+                    )
+                else:
+                    viewer.widget.title = title
+                    viewer.widget.anchor = anchor
                 display(viewer.widget)
                 error = None
 
@@ -215,6 +270,12 @@ def show(
     rotate_speed=None,
     timeit=None,
     debug=None,
+    progressive=None,
+    lazy=None,
+    gpu_budget=None,
+    gpu_evict_after=None,
+    external=None,
+    _background=False,
 ):
     """
     Show CAD objects in JupyterLab
@@ -275,6 +336,14 @@ def show(
         rotate_speed:      Speed of mouse rotate (default=1)
         zoom_speed:        Speed of mouse zoom (default=1)
 
+        progressive:       Send a preview with the parts of the largest projected size first, as share of
+                           the geometry (True means 0.05, default=None)
+        lazy:              Send hidden parts without geometry, load it when they are shown (default=False)
+        gpu_budget:        GPU memory in bytes above which long hidden parts are evicted (default=None)
+        gpu_evict_after:   Seconds a part has to be hidden before it can be evicted (default=30)
+        external:          Keep the shapes in a cache directory next to the notebook instead of the saved
+                           widget state (True means ".cad_viewer_cache", default=None)
+
     - Renderer
         default_edgecolor: Default mesh color (default=(128, 128, 128))
         ambient_intensity: Intensity of ambient light (default=1.00)
@@ -295,25 +364,27 @@ def show(
             if anchor is None:
                 anchor = "right"
         else:
-            # clean the shapes so that the same object can be show several times
-            viewer.widget.shapes = {}
-
-            if anchor is not None and viewer.widget.anchor != anchor:
-                warn(
-                    f"Parameter 'anchor' cannot be changed after sidecar with title '{title}' has been openend"
-                )
-                anchor = viewer.widget.anchor
-            if theme is not None and viewer.widget.theme != theme:
-                warn(
-                    f"Parameter 'theme' cannot be changed after sidecar with title '{title}' has been openend"
-                )
-                theme = viewer.widget.theme
-            if pinning:
-                warn("Pinning not suported for sidecar views")
-            if glass is not None and viewer.glass != glass:
-                viewer.glass = glass
-            if tools is not None and viewer.tools != tools:
-                viewer.tools = tools
+            # don't reset the shapes while add_shapes runs in the background for this sidecar
+            with viewer._lock:
+                # clean the shapes so that the same object can be show several times
+                viewer.widget.shapes = {}
+
+                if anchor is not None and viewer.widget.anchor != anchor:
+                    warn(
+                        f"Parameter 'anchor' cannot be changed after sidecar with title '{title}' has been openend"
+                    )
+                    anchor = viewer.widget.anchor
+                if theme is not None and viewer.widget.theme != theme:
+                    warn(
+                        f"Parameter 'theme' cannot be changed after sidecar with title '{title}' has been openend"
+                    )
+                    theme = viewer.widget.theme
+                if pinning:
+                    warn("Pinning not suported for sidecar views")
+                if glass is not None and viewer.glass != glass:
+                    viewer.glass = glass
+                if tools is not None and viewer.tools != tools:
+                    viewer.tools = tools
 
     def preset(key, val, default):
         if viewer is None or viewer.widget.shapes == {}:
@@ -372,6 +443,11 @@ def show(
     kwargs["rotate_speed"] = preset("rotate_speed", rotate_speed, 1.0)
     kwargs["timeit"] = preset("timeit", timeit, False)
     kwargs["debug"] = preset("debug", debug, False)
+    kwargs["progressive"] = progressive
+    kwargs["lazy"] = preset("lazy", lazy, False)
+    kwargs["gpu_budget"] = gpu_budget
+    kwargs["gpu_evict_after"] = preset("gpu_evict_after", gpu_evict_after, 30)
+    kwargs["external"] = external
     if position is not None:
         kwargs["position"] = preset("position", position, None)
     if quaternion is not None:
@@ -417,10 +493,30 @@ def show(
                 title=title, pinning=pinning, anchor=anchor, **display_args(kwargs)
             )
     # print(dict(sorted(viewer_args(kwargs).items())))
+    if _background:
+        return ShowHandle(viewer, shapes, tracks, viewer_args(kwargs))
+
     viewer.add_shapes(shapes, tracks, **viewer_args(kwargs))
     return viewer
 
 
+def show_async(shapes, tracks=None, **kwargs):
+    """
+    Show CAD objects in JupyterLab without blocking the kernel
+
+    The viewer is opened right away, preprocessing, serialization and sending of the shapes run in a
+    background thread. Background calls are processed one after the other.
+
+    - shapes:            Serialized nested tessellated shapes
+    - kwargs:            All keywords of `show`
+
+    Returns a `ShowHandle` with `done()`, `result(timeout)` and `progress`. It can be awaited in a cell:
+    `viewer = await show_async(shapes)`. Do not change the shapes object before the handle is done.
+    Adding shapes to the same viewer from the kernel waits until the background call has finished.
+    """
+    return show(shapes, tracks, _background=True, **kwargs)
+
+
 def set_default_sidecar(title, anchor="right"):
     _set_default_sidecar(title)
     if get_sidecar(title) is None:
@@ -0,0 +1,133 @@
+"""Send shapes to a viewer in a background thread to keep the kernel responsive"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+EXECUTOR = None
+LOCK = threading.Lock()
+
+# rough share of the work done when a stage of `CadViewer.add_shapes` starts
+STAGES = {
+    "queued": 0.0,
+    "preprocess": 0.05,
+    "preview": 0.1,
+    "send": 0.2,
+    "send_full": 0.5,
+    "done": 1.0,
+}
+
+
+def get_executor():
+    """
+    Get the executor running the background `show` calls. It has one worker thread, so that shapes
+    sent in the background arrive in the order of the calls
+    """
+    global EXECUTOR  # pylint: disable=global-statement
+
+    with LOCK:
+        if EXECUTOR is None:
+            EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cad-viewer")
+        return EXECUTOR
+
+
+class ShowHandle:
+    """
+    Handle of shapes being sent to a viewer in the background, returned by `show_async`.
+
+    The handle can be awaited in a notebook cell (`viewer = await show_async(...)`) or polled with
+    `done()` and `progress`.
+
+    Parameters
+    ----------
+    viewer : CadViewer
+        The (already displayed) viewer to add the shapes to
+    shapes : dict, GeometryStore or string
+        The shapes, see `CadViewer.add_shapes`
+    tracks : list or tuple
+        Animation tracks, see `CadViewer.add_shapes`
+    kwargs : dict
+        The remaining parameters of `CadViewer.add_shapes`
+    """
+
+    def __init__(self, viewer, shapes, tracks, kwargs):
+        self.viewer = viewer
+        self.stage = "queued"
+        self.created = time.perf_counter()
+        self.finished = None
+        self.future = get_executor().submit(self._run, shapes, tracks, kwargs)
+
+    def __repr__(self):
+        return f"ShowHandle(stage='{self.stage}', elapsed={self.progress['elapsed']:.3f})"
+
+    def __await__(self):
+        return asyncio.wrap_future(self.future).__await__()
+
+    def _set_stage(self, stage):
+        self.stage = stage
+
+    def _run(self, shapes, tracks, kwargs):
+        try:
+            self.viewer.add_shapes(shapes, tracks, _progress=self._set_stage, **kwargs)
+            self.stage = "done"
+            return self.viewer
+        except BaseException:
+            self.stage = "failed"
+            raise
+        finally:
+            self.finished = time.perf_counter()
+
+    def done(self):
+        """
+        Whether all shapes have been sent (or sending failed)
+
+        Returns
+        -------
+        bool
+        """
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """
+        Wait until all shapes have been sent
+
+        Parameters
+        ----------
+        timeout : float, default: None
+            Seconds to wait at most, None waits forever
+
+        Returns
+        -------
+        CadViewer
+            The viewer, exceptions raised while sending are re-raised here
+        """
+        return self.future.result(timeout)
+
+    def cancel(self):
+        """
+        Cancel sending if it has not started yet
+
+        Returns
+        -------
+        bool
+            Whether the call has been cancelled
+        """
+        cancelled = self.future.cancel()
+        if cancelled:
+            self.stage = "cancelled"
+        return cancelled
+
+    @property
+    def progress(self):
+        """
+        The current stage (`queued`, `preprocess`, `preview`, `send`, `send_full`, `done`), an estimate
+        of the share of work done as `fraction` and the seconds since `show_async` was called as
+        `elapsed`
+        """
+        end = time.perf_counter() if self.finished is None else self.finished
+        return {
+            "stage": self.stage,
+            "fraction": STAGES.get(self.stage, 1.0),
+            "elapsed": end - self.created,
+        }
@@ -0,0 +1,156 @@
+"""Binary container format for tessellated shapes with memory mapped arrays"""
+
+import base64
+import struct
+
+from .utils import byte_view
+
+MAGIC = b"CVWSHAPE"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# magic, format version, header length
+PREAMBLE = struct.Struct("<8sIQ")
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _decode_buffer(obj):
+    """Decode a base64 (or hex) encoded buffer dict as created by the tessellators into an ndarray"""
+    import numpy as np
+
+    if obj.get("codec") == "b64":
+        data = base64.b64decode(obj["buffer"])
+    else:
+        data = bytes.fromhex(obj["buffer"])
+    return np.frombuffer(data, dtype=obj["dtype"]).reshape(obj["shape"])
+
+
+def _is_encoded_buffer(obj):
+    return isinstance(obj, dict) and isinstance(obj.get("buffer"), str) and "dtype" in obj
+
+
+def save_shapes(path, shapes):
+    """
+    Save tessellated shapes to a binary container
+
+    The file consists of a preamble, a JSON header with the shape tree and the array table, and the raw
+    arrays, each aligned to 64 bytes, so that `load_shapes` can map them without copying.
+
+    Parameters
+    ----------
+    path : string or Path
+        File name of the container
+    shapes : dict
+        Nested tessellated shapes as accepted by
+        [CadViewer.add_shapes](./widget.html#cad_viewer_widget.widget.CadViewer.add_shapes). Arrays can be
+        numpy ndarrays or base64/hex encoded buffer dicts, both are stored as raw arrays
+
+    Returns
+    -------
+    int
+        Number of bytes written
+    """
+    import numpy as np
+    import orjson
+
+    arrays = []
+
+    def walk(obj):
+        if _is_encoded_buffer(obj):
+            obj = _decode_buffer(obj)
+
+        if isinstance(obj, np.ndarray):
+            # store arrays the way to_json sends them, so that no conversion is needed after loading
+            if str(obj.dtype) in ("int32", "int64", "uint64"):
+                obj = obj.astype("uint32")
+            elif str(obj.dtype) == "float64":
+                obj = obj.astype("float32")
+            arrays.append(np.ascontiguousarray(obj))
+            return {"__array__": len(arrays) - 1}
+        elif isinstance(obj, (tuple, list)):
+            return [walk(el) for el in obj]
+        elif isinstance(obj, dict):
+            return {k: walk(v) for k, v in obj.items()}
+        else:
+            return obj
+
+    tree = walk(shapes)
+
+    table = []
+    offset = 0
+    for array in arrays:
+        table.append(
+            {"dtype": str(array.dtype), "shape": list(array.shape), "offset": offset, "nbytes": array.nbytes}
+        )
+        offset = _align(offset + array.nbytes)
+
+    header = orjson.dumps({"arrays": table, "shapes": tree})
+    data_start = _align(PREAMBLE.size + len(header))
+
+    with open(path, "wb") as fd:
+        fd.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        fd.write(header)
+        for array, entry in zip(arrays, table):
+            fd.seek(data_start + entry["offset"])
+            fd.write(byte_view(array))
+        fd.truncate(data_start + offset)
+
+    return data_start + offset
+
+
+def load_shapes(path, mmap=True):
+    """
+    Load tessellated shapes from a binary container written by `save_shapes`
+
+    Parameters
+    ----------
+    path : string or Path
+        File name of the container
+    mmap : bool, default: True
+        Whether to memory map the file (True) or to read it into memory (False). With memory mapping the
+        arrays of the returned tree are read-only numpy views onto the page cache and will be sent to the
+        browser as comm buffers without copying
+
+    Returns
+    -------
+    dict
+        The nested tessellated shapes to be used with `show` or `CadViewer.add_shapes`
+    """
+    import numpy as np
+    import orjson
+
+    with open(path, "rb") as fd:
+        magic, version, header_len = PREAMBLE.unpack(fd.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a shapes container")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Unsupported shapes container version {version}")
+        header = orjson.loads(fd.read(header_len))
+        data_start = _align(PREAMBLE.size + header_len)
+
+        if mmap:
+            data = np.memmap(fd, dtype=np.uint8, mode="r")
+        else:
+            fd.seek(0)
+            data = np.frombuffer(fd.read(), dtype=np.uint8)
+
+    arrays = []
+    for entry in header["arrays"]:
+        start = data_start + entry["offset"]
+        array = data[start : start + entry["nbytes"]].view(entry["dtype"]).reshape(entry["shape"])
+        arrays.append(array)
+
+    def walk(obj):
+        if isinstance(obj, dict):
+            if "__array__" in obj:
+                return arrays[obj["__array__"]]
+            return {k: walk(v) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [walk(el) for el in obj]
+        else:
+            return obj
+
+    return walk(header["shapes"])
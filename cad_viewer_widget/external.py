@@ -0,0 +1,63 @@
+"""Content addressed cache directory to keep shapes out of the saved notebook widget state"""
+
+import os
+from pathlib import Path
+
+from .container import load_shapes, save_shapes
+from .utils import content_hash
+
+# default cache directory, relative to the notebook (the working directory of the kernel)
+CACHE_DIR = ".cad_viewer_cache"
+
+
+def externalize(shapes, directory=CACHE_DIR):
+    """
+    Store shapes as binary container in a content addressed cache directory
+
+    The file is named after the content hash of the shapes and only written if it does not exist yet.
+    The returned reference replaces the shapes in the widget state, the browser loads the file through
+    the contents API of the Jupyter server.
+
+    Parameters
+    ----------
+    shapes : dict
+        The shapes payload with `instances` and the `shapes` tree
+    directory : string or Path, default: ".cad_viewer_cache"
+        The cache directory. Relative paths are relative to the notebook. It needs to be below the root
+        directory of the Jupyter server
+
+    Returns
+    -------
+    dict
+        The reference `{"external": {"hash": <hash>, "path": <path relative to the notebook>}}`
+    """
+    key = content_hash(shapes)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{key}.cvw")
+    if not os.path.exists(path):
+        # write to a temporary file first, so that a reader never sees a partial container
+        tmp = f"{path}.{os.getpid()}.tmp"
+        save_shapes(tmp, shapes)
+        os.replace(tmp, path)
+
+    return {"external": {"hash": key, "path": Path(os.path.relpath(path)).as_posix()}}
+
+
+def load_external(reference, mmap=True):
+    """
+    Load the shapes of a reference created by `externalize`
+
+    Parameters
+    ----------
+    reference : dict
+        The reference `{"external": {"hash": ..., "path": ...}}`, e.g. the `shapes` of a restored widget
+    mmap : bool, default: True
+        Whether to memory map the container, see
+        [load_shapes](./container.html#cad_viewer_widget.container.load_shapes)
+
+    Returns
+    -------
+    dict
+        The shapes payload
+    """
+    return load_shapes(reference["external"]["path"], mmap=mmap)
@@ -0,0 +1,125 @@
+"""Frame sequences of animations rendered in the browser"""
+
+import os
+import time
+
+
+class FrameSequence:
+    """
+    The frames of an animation rendered by the browser, returned by `CadViewer.render_frames`.
+
+    Frames arrive as binary comm messages while the kernel is idle, so check `done()` or `progress` in a
+    later cell.
+
+    Parameters
+    ----------
+    count : int
+        Number of frames
+    fps : float
+        Frames per second
+    format : string
+        Image format of the frames, "png", "jpeg" or "webp"
+    directory : string or Path, default: None
+        If given, every frame is written to `<directory>/<prefix><index>.<format>` when it arrives instead
+        of being kept in memory
+    prefix : string, default: "frame"
+        File name prefix of the frames
+
+    Attributes
+    ----------
+    frames : list of bytes
+        The encoded frames (None for frames not received yet or written to `directory`)
+    paths : list of string
+        The files written to `directory`
+    error : string
+        Error message of the browser, if rendering failed
+    """
+
+    def __init__(self, count, fps, format, directory=None, prefix="frame"):
+        self.count = count
+        self.fps = fps
+        self.format = format
+        self.directory = directory
+        self.prefix = prefix
+        self.frames = [None] * count
+        self.paths = []
+        self.received = 0
+        self.error = None
+        self.finished = False
+        self.created = time.perf_counter()
+        self.elapsed = None
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return f"FrameSequence(frames={self.received}/{self.count}, fps={self.fps}, format='{self.format}')"
+
+    def __len__(self):
+        return self.count
+
+    def _filename(self, index, directory):
+        digits = len(str(max(self.count - 1, 0)))
+        ext = "jpg" if self.format == "jpeg" else self.format
+        return os.path.join(directory, f"{self.prefix}{index:0{digits}d}.{ext}")
+
+    def _receive(self, content, buffers):
+        kind = content.get("type")
+        if kind == "frame":
+            index = content["index"]
+            data = bytes(buffers[0])
+            if self.directory is not None:
+                path = self._filename(index, self.directory)
+                with open(path, "wb") as fd:
+                    fd.write(data)
+                self.paths.append(path)
+            else:
+                self.frames[index] = data
+            self.received += 1
+        elif kind == "frames_error":
+            self.error = content.get("message")
+            self.finished = True
+        elif kind == "frames_done":
+            self.finished = True
+
+        if self.finished and self.elapsed is None:
+            self.elapsed = time.perf_counter() - self.created
+
+    def done(self):
+        """
+        Whether all frames have been received (or rendering failed)
+
+        Returns
+        -------
+        bool
+        """
+        return self.finished
+
+    @property
+    def progress(self):
+        """The number of received frames, the total number of frames and the seconds rendering took"""
+        return {"frames": self.received, "count": self.count, "elapsed": self.elapsed}
+
+    def save(self, directory):
+        """
+        Write the frames kept in memory to a directory
+
+        Parameters
+        ----------
+        directory : string or Path
+            The target directory, frames are named `<prefix><index>.<format>`
+
+        Returns
+        -------
+        list of string
+            The files written
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for index, data in enumerate(self.frames):
+            if data is not None:
+                path = self._filename(index, directory)
+                with open(path, "wb") as fd:
+                    fd.write(data)
+                paths.append(path)
+        return paths
@@ -0,0 +1,207 @@
+"""Decoded geometry of tessellated parts with offset tables for faces and edges"""
+
+from functools import cached_property
+
+from .container import _decode_buffer, _is_encoded_buffer
+from .utils import iter_parts
+
+
+class ShapeGeometry:
+    """
+    The decoded geometry of one tessellated part as numpy arrays.
+
+    `triangles_per_face` and `segments_per_edge` are turned into prefix-sum offset tables, so that the
+    triangles of a face, the segments of an edge and the face of a triangle are found in O(1).
+    Coordinates are local to the part, i.e. its `loc` is not applied.
+
+    Parameters
+    ----------
+    shape : dict
+        The `shape` element of a part or an instance. Arrays can be numpy ndarrays, lists or base64/hex
+        encoded buffer dicts
+
+    Attributes
+    ----------
+    vertices : ndarray (n, 3) of float32
+    normals : ndarray (n, 3) of float32
+    triangles : ndarray (t, 3) of uint32
+        Vertex indices of the triangles, ordered by face
+    edges : ndarray (s, 2, 3) of float32
+        Line segments, ordered by edge
+    obj_vertices : ndarray (v, 3) of float32
+        The CAD vertices
+    face_types, edge_types : ndarray of int32
+    face_offsets : ndarray (faces + 1) of int64
+        Face `i` consists of `triangles[face_offsets[i]:face_offsets[i + 1]]`
+    edge_offsets : ndarray (edges + 1) of int64
+        Edge `j` consists of `edges[edge_offsets[j]:edge_offsets[j + 1]]`
+    """
+
+    def __init__(self, shape):
+        import numpy as np
+
+        def array(key, dtype, width=None):
+            value = shape.get(key)
+            if value is None:
+                value = []
+            elif _is_encoded_buffer(value):
+                value = _decode_buffer(value)
+            value = np.asarray(value, dtype=dtype)
+            if width is not None:
+                value = value.reshape(-1, *width)
+            return value
+
+        self.vertices = array("vertices", np.float32, (3,))
+        self.normals = array("normals", np.float32, (3,))
+        self.triangles = array("triangles", np.uint32, (3,))
+        self.edges = array("edges", np.float32, (2, 3))
+        self.obj_vertices = array("obj_vertices", np.float32, (3,))
+        self.face_types = array("face_types", np.int32)
+        self.edge_types = array("edge_types", np.int32)
+
+        triangles_per_face = array("triangles_per_face", np.int64)
+        segments_per_edge = array("segments_per_edge", np.int64)
+        self.face_offsets = np.concatenate(([0], np.cumsum(triangles_per_face)))
+        self.edge_offsets = np.concatenate(([0], np.cumsum(segments_per_edge)))
+
+    def __repr__(self):
+        return (
+            f"ShapeGeometry(faces={self.n_faces}, edges={self.n_edges}, "
+            f"triangles={len(self.triangles)}, vertices={len(self.vertices)})"
+        )
+
+    @property
+    def n_faces(self):
+        """Number of faces"""
+        return len(self.face_offsets) - 1
+
+    @property
+    def n_edges(self):
+        """Number of edges"""
+        return len(self.edge_offsets) - 1
+
+    def face(self, i):
+        """
+        Get the triangles (vertex indices, shape (k, 3)) of face `i`
+        """
+        return self.triangles[self.face_offsets[i] : self.face_offsets[i + 1]]
+
+    def edge(self, j):
+        """
+        Get the line segments (shape (k, 2, 3)) of edge `j`
+        """
+        return self.edges[self.edge_offsets[j] : self.edge_offsets[j + 1]]
+
+    @cached_property
+    def triangle_faces(self):
+        """ndarray (t,) of int64: the face index of every triangle"""
+        import numpy as np
+
+        return np.repeat(np.arange(self.n_faces), np.diff(self.face_offsets))
+
+    def face_of_triangle(self, t):
+        """
+        Get the face index of triangle `t` (an int or an array of ints)
+        """
+        return self.triangle_faces[t]
+
+    @cached_property
+    def _cross(self):
+        # un-normalized triangle normals with twice the triangle area as length
+        import numpy as np
+
+        a, b, c = (self.vertices[self.triangles[:, i]].astype(np.float64) for i in range(3))
+        return np.cross(b - a, c - a)
+
+    @cached_property
+    def triangle_areas(self):
+        """ndarray (t,) of float64: the area of every triangle"""
+        import numpy as np
+
+        return 0.5 * np.linalg.norm(self._cross, axis=1)
+
+    @cached_property
+    def face_areas(self):
+        """ndarray (faces,) of float64: the area of every face"""
+        import numpy as np
+
+        # bincount returns int64 for empty input, e.g. parts without faces
+        areas = np.bincount(self.triangle_faces, weights=self.triangle_areas, minlength=self.n_faces)
+        return areas.astype(np.float64, copy=False)
+
+    @cached_property
+    def face_normals(self):
+        """ndarray (faces, 3) of float64: the area weighted mean normal of every face (unit length)"""
+        import numpy as np
+
+        normals = np.stack(
+            [
+                np.bincount(self.triangle_faces, weights=self._cross[:, i], minlength=self.n_faces)
+                for i in range(3)
+            ],
+            axis=1,
+        ).astype(np.float64, copy=False)
+        length = np.linalg.norm(normals, axis=1, keepdims=True)
+        return np.divide(normals, length, out=np.zeros_like(normals), where=length > 0)
+
+    @cached_property
+    def face_centers(self):
+        """ndarray (faces, 3) of float64: the area weighted centroid of every face"""
+        import numpy as np
+
+        centroids = self.vertices[self.triangles].astype(np.float64).mean(axis=1)
+        weights = self.triangle_areas
+        sums = np.stack(
+            [
+                np.bincount(self.triangle_faces, weights=centroids[:, i] * weights, minlength=self.n_faces)
+                for i in range(3)
+            ],
+            axis=1,
+        ).astype(np.float64, copy=False)
+        area = self.face_areas[:, None]
+        return np.divide(sums, area, out=np.zeros_like(sums), where=area > 0)
+
+
+class GeometryCache:
+    """
+    Lazily decoded geometries of all parts of a shapes payload.
+
+    Parts referencing the same instance share one `ShapeGeometry`.
+
+    Parameters
+    ----------
+    shapes : dict
+        The shapes payload with `instances` and the `shapes` tree
+    """
+
+    def __init__(self, shapes):
+        self.instances = shapes.get("instances") or []
+        self.parts = {part["id"]: part for part in iter_parts(shapes["shapes"])}
+        self.geometries = {}
+
+    def __len__(self):
+        return len(self.parts)
+
+    def __contains__(self, path):
+        return path in self.parts
+
+    def __getitem__(self, path):
+        part = self.parts.get(path)
+        if part is None:
+            raise KeyError(f"Unknown part '{path}'")
+
+        shape = part.get("shape") or {}
+        ref = shape.get("ref") if isinstance(shape, dict) else None
+        key = ("instance", ref) if ref is not None else ("part", path)
+
+        geometry = self.geometries.get(key)
+        if geometry is None:
+            if ref is not None:
+                shape = self.instances[ref]
+            elif not isinstance(shape, dict):
+                # vertices parts carry the points as shape
+                shape = {"obj_vertices": shape}
+            geometry = ShapeGeometry(shape)
+            self.geometries[key] = geometry
+
+        return geometry
@@ -0,0 +1,164 @@
+"""Deferred geometry of hidden parts, sent when the parts are made visible"""
+
+# geometry attributes of a shape and their dtype, replaced by empty buffers for deferred parts
+GEOMETRY = {
+    "vertices": "float32",
+    "normals": "float32",
+    "triangles": "uint32",
+    "edges": "float32",
+    "obj_vertices": "float32",
+    "face_types": "int32",
+    "edge_types": "int32",
+    "triangles_per_face": "int32",
+    "segments_per_edge": "int32",
+}
+
+
+def _empty_shape(shape):
+    # keep all attributes so that the viewer builds the same objects, only without geometry
+    return {
+        key: {"shape": [0], "dtype": GEOMETRY[key], "buffer": "", "codec": "b64"}
+        if key in GEOMETRY
+        else value
+        for key, value in shape.items()
+    }
+
+
+def _hidden(state):
+    return state is not None and 1 not in state
+
+
+def _defer(shapes, defer, states=None):
+    instances = shapes.get("instances") or []
+    sent = []
+    refs = {}
+    empty = {}
+    deferred = []
+
+    def add_instance(key, instance, table):
+        if key not in table:
+            table[key] = len(sent)
+            sent.append(instance)
+        return table[key]
+
+    def walk(tree):
+        if tree.get("parts") is not None:
+            return {**tree, "parts": [walk(part) for part in tree["parts"]]}
+
+        if states is not None and tree["id"] in states:
+            tree = {**tree, "state": list(states[tree["id"]])}
+
+        shape = tree.get("shape")
+        if not isinstance(shape, dict):
+            return tree
+
+        ref = shape.get("ref")
+        if defer(tree):
+            deferred.append(tree["id"])
+            shape = _empty_shape(shape if ref is None else instances[ref])
+            if tree.get("type") != "shapes":
+                # the browser resolves instance references of faces only
+                return {**tree, "shape": shape}
+            ref = add_instance(tuple(shape), shape, empty)
+            return {**tree, "shape": {"ref": ref}}
+
+        if ref is not None:
+            return {**tree, "shape": {"ref": add_instance(ref, instances[ref], refs)}}
+        return tree
+
+    tree = walk(shapes["shapes"])
+    payload = {
+        **shapes,
+        "instances": sent,
+        "shapes": tree,
+    }
+    return payload, deferred
+
+
+def defer_hidden(shapes, states=None, loaded=()):
+    """
+    Replace the geometry of hidden parts by empty buffers
+
+    Deferred parts keep their metadata (id, name, state, color, loc, bb, ...), so that they show up in
+    the navigation tree and in the bounding box. Faces reference shared empty instances, and instances
+    only referenced by deferred parts are dropped.
+
+    Parameters
+    ----------
+    shapes : dict
+        The shapes payload with `instances` and the `shapes` tree
+    states : dict, default: None
+        Current states of the parts (path -> [faces, edges]) overriding the `state` in the tree
+    loaded : set of string, default: ()
+        Paths of hidden parts that keep their geometry, e.g. since they had been shown before
+
+    Returns
+    -------
+    (dict, list of string)
+        The payload to send and the paths of the deferred parts
+    """
+    return _defer(shapes, lambda tree: _hidden(tree.get("state")) and tree["id"] not in loaded, states)
+
+
+def defer_parts(shapes, paths):
+    """
+    Replace the geometry of the parts with the given paths by empty buffers, see `defer_hidden`
+
+    Parameters
+    ----------
+    shapes : dict
+        The shapes payload with `instances` and the `shapes` tree
+    paths : set of string
+        Paths of the parts to defer, e.g. the parts not in a preview
+
+    Returns
+    -------
+    (dict, list of string)
+        The payload to send and the paths of the deferred parts
+    """
+    return _defer(shapes, lambda tree: tree["id"] in paths)
+
+
+def select_parts(shapes, paths):
+    """
+    Collect the geometry of deferred parts to send them once they are made visible
+
+    Parameters
+    ----------
+    shapes : dict
+        The shapes payload with `instances` and the `shapes` tree
+    paths : set of string
+        Paths of the parts to collect
+
+    Returns
+    -------
+    dict
+        A payload with the instances referenced by the parts and a flat tree of the parts, holding only
+        `id`, `type` and `shape`. The browser adds the geometry to the objects already rendered
+    """
+    instances = shapes.get("instances") or []
+    sent = []
+    refs = {}
+    parts = []
+
+    def walk(tree):
+        if tree.get("parts") is not None:
+            for part in tree["parts"]:
+                walk(part)
+            return
+
+        if tree["id"] not in paths or not isinstance(tree.get("shape"), dict):
+            return
+
+        shape = tree["shape"]
+        ref = shape.get("ref")
+        if ref is not None:
+            if ref not in refs:
+                refs[ref] = len(sent)
+                sent.append(instances[ref])
+            shape = {"ref": refs[ref]}
+        # the browser decodes the shape depending on the type, which has to come first
+        parts.append({"id": tree["id"], "type": tree.get("type"), "shape": shape})
+
+    walk(shapes["shapes"])
+    return {"instances": sent, "shapes": {"parts": parts}}
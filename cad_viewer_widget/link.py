@@ -0,0 +1,44 @@
+"""Camera links between viewers, kept in sync by the browser"""
+
+import uuid
+
+
+def link_cameras(*viewers):
+    """
+    Link the cameras of viewers, e.g. to compare two designs side by side
+
+    Every camera change of one viewer is applied to the other viewers of the link once per animation
+    frame directly in the browser, without a round trip to Python. Python only receives the final
+    camera state (`position`, `quaternion`, `target`, `zoom`) of every viewer once the camera rests.
+    A viewer can only be part of one link, linking it again moves it to the new link.
+
+    Parameters
+    ----------
+    *viewers : CadViewer
+        The viewers to link, at least two
+
+    Returns
+    -------
+    string
+        The id of the link
+    """
+    if len(viewers) < 2:
+        raise ValueError("At least two viewers are needed to link cameras")
+
+    link = str(uuid.uuid4())
+    for viewer in viewers:
+        viewer.widget.camera_link = link
+    return link
+
+
+def unlink_cameras(*viewers):
+    """
+    Remove viewers from their camera links
+
+    Parameters
+    ----------
+    *viewers : CadViewer
+        The viewers to unlink
+    """
+    for viewer in viewers:
+        viewer.widget.camera_link = None
@@ -0,0 +1,202 @@
+"""Streaming loader for tessellated shapes stored as JSON with encoded buffers"""
+
+import json
+
+from .container import _decode_buffer, _is_encoded_buffer
+from .utils import iter_parts
+
+WHITESPACE = " \t\r\n"
+
+
+class _JsonStream:
+    """
+    Minimal incremental JSON reader: it walks the structure of objects and arrays on demand and only
+    materializes one value at a time, so the memory needed is bounded by the largest value read
+    """
+
+    def __init__(self, fd, chunk_size):
+        self.fd = fd
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        # read at least as much as is buffered, so that retrying a large value stays linear
+        chunk = self.fd.read(max(self.chunk_size, len(self.buf) - self.pos))
+        if not chunk:
+            self.eof = True
+            raise ValueError("Unexpected end of JSON data")
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            self._fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at '{self.buf[self.pos : self.pos + 20]}'")
+        self.pos += 1
+
+    def skip(self, char):
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self):
+        """Parse the next complete JSON value, reading more data until it is complete"""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number at the end of the buffer might continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def keys(self):
+        """Iterate over the keys of the next object, the caller needs to consume every value"""
+        self.expect("{")
+        if self.skip("}"):
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if not self.skip(","):
+                self.expect("}")
+                return
+
+    def items(self):
+        """Iterate over the elements of the next array"""
+        self.expect("[")
+        if self.skip("]"):
+            return
+        while True:
+            yield self.value()
+            if not self.skip(","):
+                self.expect("]")
+                return
+
+
+def _decode(obj):
+    """Replace all encoded buffers with numpy arrays"""
+    if _is_encoded_buffer(obj):
+        return _decode_buffer(obj)
+    elif isinstance(obj, dict):
+        return {k: _decode(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [_decode(el) for el in obj]
+    else:
+        return obj
+
+
+def _stream(path, chunk_size):
+    """
+    Yield ("instance", instance), ("part", top level part) and ("shapes", root attributes) events
+    """
+    with open(path, "r", encoding="utf-8") as fd:
+        stream = _JsonStream(fd, chunk_size)
+        for key in stream.keys():
+            if key == "instances":
+                for instance in stream.items():
+                    yield "instance", _decode(instance)
+
+            elif key == "shapes":
+                root = {}
+                for attr in stream.keys():
+                    if attr == "parts":
+                        root["parts"] = None
+                        for part in stream.items():
+                            yield "part", _decode(part)
+                    else:
+                        root[attr] = _decode(stream.value())
+                yield "shapes", root
+
+            else:
+                stream.value()
+
+
+def iter_shapes_json(path, chunk_size=1 << 20):
+    """
+    Iterate lazily over the parts of a shapes JSON file
+
+    Only one top level part (or sub assembly) of the shape tree is held in memory at a time, plus the
+    decoded instances.
+
+    Parameters
+    ----------
+    path : string or Path
+        File name of the JSON file, e.g. `examples/orientbox.json`
+    chunk_size : int, default: 1 MB
+        Number of characters read at a time
+
+    Returns
+    -------
+    generator of dict
+        The leaf parts of the shape tree with all buffers decoded to numpy arrays. References to
+        instances (`"shape": {"ref": n}`) are resolved when the instances precede the shapes in the file,
+        as written by the tessellators
+    """
+    instances = []
+    for kind, obj in _stream(path, chunk_size):
+        if kind == "instance":
+            instances.append(obj)
+        elif kind == "part":
+            for leaf in iter_parts(obj):
+                shape = leaf.get("shape")
+                ref = shape.get("ref") if isinstance(shape, dict) else None
+                if ref is not None and ref < len(instances):
+                    leaf = {**leaf, "shape": instances[ref]}
+                yield leaf
+
+
+def load_shapes_json(path, chunk_size=1 << 20):
+    """
+    Load a shapes JSON file with incremental parsing
+
+    Other than `json.load` the file is never materialized as a whole: base64 or hex encoded buffers
+    are decoded into numpy arrays value by value, so the peak memory is close to the size of the
+    binary geometry instead of the size of the text.
+
+    Parameters
+    ----------
+    path : string or Path
+        File name of the JSON file, e.g. `examples/orientbox.json`
+    chunk_size : int, default: 1 MB
+        Number of characters read at a time
+
+    Returns
+    -------
+    dict
+        The nested tessellated shapes to be used with `show` or `CadViewer.add_shapes`. Instances stay
+        referenced and are not copied into the parts
+    """
+    instances = []
+    parts = []
+    shapes = None
+    for kind, obj in _stream(path, chunk_size):
+        if kind == "instance":
+            instances.append(obj)
+        elif kind == "part":
+            parts.append(obj)
+        else:
+            shapes = obj
+
+    if shapes is None:
+        raise ValueError(f"{path} has no shapes")
+    if "parts" in shapes:
+        shapes["parts"] = parts
+
+    return {"instances": instances, "shapes": shapes}
@@ -0,0 +1,155 @@
+"""Memory accounting of shapes payloads in the kernel, on the wire and on the GPU"""
+
+import math
+
+from .container import _is_encoded_buffer
+from .utils import iter_parts
+
+# attributes three.js uploads to the GPU as float32 or uint32 buffers
+GPU_ATTRIBUTES = ("vertices", "normals", "triangles", "edges", "obj_vertices")
+
+# bytes per texel of a RGBA texture including its mipmaps
+TEXEL_BYTES = 4 * 4 / 3
+
+
+def _sizes(key, value):
+    """(payload, wire, gpu) bytes of one attribute"""
+    import numpy as np
+    import orjson
+
+    if isinstance(value, np.ndarray):
+        count = value.size
+        payload = value.nbytes
+        # to_json sends integer arrays as uint32
+        wire = 4 * count if value.dtype.kind in "iu" else payload
+    elif _is_encoded_buffer(value):
+        count = math.prod(value["shape"])
+        payload = wire = len(value["buffer"])
+    elif isinstance(value, (list, tuple)):
+        count = np.asarray(value).size
+        payload = 8 * count
+        wire = len(orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY))
+    else:
+        return 0, 0, 0
+
+    gpu = 4 * count if key in GPU_ATTRIBUTES else 0
+    return payload, wire, gpu
+
+
+def _texture_image(texture, textures):
+    """(key, image data) of a texture, images extracted into the `textures` table are resolved by hash"""
+    image = texture.get("image") if isinstance(texture, dict) else None
+    if not isinstance(image, dict):
+        return None, None
+    if image.get("ref") is not None:
+        entry = textures.get(image["ref"]) or {}
+        return image["ref"], entry.get("data")
+    data = image.get("data")
+    return (None if data is None else id(data)), data
+
+
+def _texture_sizes(texture, data):
+    if data is None:
+        return 0, 0, 0
+    if isinstance(data, (str, bytes)):
+        size = len(data)
+    else:
+        # binary images of the texture table
+        size = memoryview(data).nbytes
+    gpu = int((texture.get("width") or 0) * (texture.get("height") or 0) * TEXEL_BYTES)
+    return size, size, gpu
+
+
+def estimate(shapes, budget=None):
+    """
+    Estimate the memory a shapes payload needs in the kernel, on the wire and on the GPU
+
+    Instanced geometry and texture images shared by several parts are counted once for the kernel and the
+    wire, but for every part on the GPU. GPU sizes assume float32 positions and normals and uint32 indices.
+
+    Parameters
+    ----------
+    shapes : dict
+        The shapes payload with `instances`, the `shapes` tree and the `textures` table of images referenced
+        by hash, if the textures have been extracted
+    budget : int, default: None
+        GPU memory in bytes. If given, `over_budget` lists the parts (largest first) to leave out to fit
+
+    Returns
+    -------
+    dict
+        - parts: path -> {"payload": {attr: bytes}, "wire": {attr: bytes}, "gpu": {attr: bytes},
+          "instance": index of the instance or None}, largest GPU size first
+        - tree: bytes of the serialized tree without the arrays
+        - total: {"payload", "wire", "gpu"} in bytes
+        - over_budget: list of paths (only with `budget`)
+    """
+    import orjson
+
+    instances = shapes.get("instances") or []
+    textures = shapes.get("textures") or {}
+    counted = set()
+    parts = {}
+    total = {"payload": 0, "wire": 0, "gpu": 0}
+
+    for part in iter_parts(shapes["shapes"]):
+        shape = part.get("shape")
+        ref = shape.get("ref") if isinstance(shape, dict) else None
+        if ref is not None:
+            shape = instances[ref]
+        elif not isinstance(shape, dict):
+            # vertices parts carry the points as shape
+            shape = {"obj_vertices": shape}
+        shared = ref is not None and ref in counted
+        counted.add(ref)
+
+        entry = {"payload": {}, "wire": {}, "gpu": {}, "instance": ref}
+        sizes = [(key, _sizes(key, value)) for key, value in shape.items()]
+        texture = part.get("texture")
+        texture_shared = False
+        if texture is not None:
+            key, data = _texture_image(texture, textures)
+            sizes.append(("texture", _texture_sizes(texture, data)))
+            if key is not None:
+                texture_shared = ("texture", key) in counted
+                counted.add(("texture", key))
+
+        for key, (payload, wire, gpu) in sizes:
+            if shared or (key == "texture" and texture_shared):
+                payload = wire = 0
+            entry["payload"][key] = payload
+            entry["wire"][key] = wire
+            entry["gpu"][key] = gpu
+            total["payload"] += payload
+            total["wire"] += wire
+            total["gpu"] += gpu
+        parts[part["id"]] = entry
+
+    def strip(obj):
+        # geometry and texture images are accounted per attribute above
+        if isinstance(obj, dict):
+            return {k: None if k in ("shape", "texture") else strip(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [strip(el) for el in obj]
+        return obj if isinstance(obj, (str, int, float, bool, type(None))) else None
+
+    tree = len(orjson.dumps(strip(shapes["shapes"])))
+    total["wire"] += tree
+
+    order = sorted(parts, key=lambda path: -sum(parts[path]["gpu"].values()))
+    report = {
+        "parts": {path: parts[path] for path in order},
+        "tree": tree,
+        "total": total,
+    }
+
+    if budget is not None:
+        over, gpu = [], total["gpu"]
+        for path in order:
+            if gpu <= budget:
+                break
+            over.append(path)
+            gpu -= sum(parts[path]["gpu"].values())
+        report["over_budget"] = over
+
+    return report
@@ -0,0 +1,164 @@
+"""Screen importance of parts to send the most visible geometry first"""
+
+import math
+
+from .container import _is_encoded_buffer
+from .geometry import GeometryCache
+from .lazy import GEOMETRY
+from .spatial import part_bounds
+from .utils import iter_parts
+
+# three-cad-viewer's initial iso view looks from (1, 1, 1) onto the target
+DEFAULT_DIRECTION = (1.0, 1.0, 1.0)
+
+# estimated size of the serialized tree entry of a part (id, name, state, color, loc, ...)
+PART_BYTES = 250
+
+
+def _visible(part):
+    state = part.get("state")
+    return state is None or 1 in state
+
+
+def rank_parts(shapes, position=None, target=None, ortho=True, geometries=None):
+    """
+    Rank the parts of a shapes payload by their projected size on the screen
+
+    The projected area of every part's world bounding box is computed for the view direction from
+    `position` to `target` (by default the initial iso view onto the center of the shapes). For
+    perspective cameras the area is scaled by the inverse squared distance. Hidden parts rank last.
+    The boxes are taken from the `bb` of the parts, only parts without `bb` get decoded.
+
+    Parameters
+    ----------
+    shapes : dict
+        The shapes payload with `instances` and the `shapes` tree
+    position : 3-dim list of float, default: None
+        Camera position
+    target : 3-dim list of float, default: None
+        Camera target, by default the center of the bounding box of the shapes
+    ortho : bool, default: True
+        Whether the camera is orthographic (True) or perspective (False)
+    geometries : GeometryCache, default: None
+        The decoded geometries of parts without `bb`, by default a new cache is created
+
+    Returns
+    -------
+    list of (string, float)
+        The paths of the parts and their importance, most important first
+    """
+    import numpy as np
+
+    # only the part boxes are needed, a spatial index would hash the payload and build a BVH before
+    # the first byte is sent
+    if geometries is None:
+        geometries = GeometryCache(shapes)
+    paths, _, _, mins, maxs = part_bounds(shapes, geometries, use_bb=True)
+    if len(paths) == 0:
+        return []
+
+    center = (mins.min(axis=0) + maxs.max(axis=0)) / 2
+    target = center if target is None else np.asarray(target, dtype=np.float64)
+    if position is None:
+        direction = np.asarray(DEFAULT_DIRECTION)
+        radius = np.linalg.norm(maxs.max(axis=0) - mins.min(axis=0)) / 2
+        # three-cad-viewer places the camera at 5 bounding radii
+        position = target + direction / np.linalg.norm(direction) * 5 * radius
+    position = np.asarray(position, dtype=np.float64)
+    direction = target - position
+    direction = direction / np.linalg.norm(direction)
+
+    # area of the projection of an axis aligned box onto the plane normal to the view direction
+    size = maxs - mins
+    area = (
+        np.abs(direction[0]) * size[:, 1] * size[:, 2]
+        + np.abs(direction[1]) * size[:, 0] * size[:, 2]
+        + np.abs(direction[2]) * size[:, 0] * size[:, 1]
+    )
+    if not ortho:
+        distance = np.linalg.norm((mins + maxs) / 2 - position, axis=1)
+        area = area / np.maximum(distance, 1e-9) ** 2
+
+    parts = {part["id"]: part for part in iter_parts(shapes["shapes"])}
+    visible = np.array([_visible(parts[path]) for path in paths])
+    area = np.where(visible, area, -1.0)
+
+    order = np.argsort(-area, kind="stable")
+    return [(paths[i], float(max(area[i], 0.0))) for i in order]
+
+
+def _array_bytes(value):
+    if _is_encoded_buffer(value):
+        return 4 * math.prod(value["shape"])
+    if hasattr(value, "nbytes"):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sum(_array_bytes(el) for el in value)
+    return 4
+
+
+def _part_bytes(shape):
+    """Size of the geometry of a part as sent, without decoding it"""
+    if not isinstance(shape, dict):
+        # vertices parts carry the points as shape
+        return _array_bytes(shape)
+    return sum(_array_bytes(value) for key, value in shape.items() if key in GEOMETRY)
+
+
+def preview_parts(shapes, fraction=0.05, position=None, target=None, ortho=True):
+    """
+    Select the most important parts of a shapes payload for a preview
+
+    Parts are taken in `rank_parts` order until `fraction` of the total size is reached, so the most
+    important parts are always part of the preview, however large they are. Instanced geometry is
+    counted once and further instances of geometry already in the preview are added after the budget
+    is reached.
+
+    Parameters
+    ----------
+    shapes : dict
+        The shapes payload with `instances` and the `shapes` tree
+    fraction : float, default: 0.05
+        Share of the payload size to put into the preview
+    position, target, ortho
+        The initial camera, see `rank_parts`
+
+    Returns
+    -------
+    set of string or None
+        The paths of the parts in the preview, or None if the preview would hold all visible parts
+    """
+    ranking = rank_parts(shapes, position, target, ortho)
+
+    instances = shapes.get("instances") or []
+    parts = {part["id"]: part for part in iter_parts(shapes["shapes"])}
+
+    def geometry_key(path):
+        shape = parts[path].get("shape")
+        ref = shape.get("ref") if isinstance(shape, dict) else None
+        return ("instance", ref) if ref is not None else ("part", path)
+
+    sizes = {}
+    for path, _ in ranking:
+        key = geometry_key(path)
+        if key not in sizes:
+            shape = parts[path].get("shape")
+            sizes[key] = _part_bytes(instances[key[1]] if key[0] == "instance" else shape)
+    budget = fraction * (sum(sizes.values()) + PART_BYTES * len(ranking))
+
+    keep, counted, total, visible = set(), set(), 0, 0
+    for path, importance in ranking:
+        if importance <= 0:
+            break
+        visible += 1
+        key = geometry_key(path)
+        # once the budget is reached, only instances of geometry already in the preview are added
+        if total >= budget and key not in counted:
+            continue
+        keep.add(path)
+        total += PART_BYTES + (0 if key in counted else sizes[key])
+        counted.add(key)
+
+    if not keep or len(keep) == visible:
+        return None
+    return keep
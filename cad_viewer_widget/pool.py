@@ -0,0 +1,191 @@
+"""Pool of pre-created CAD viewers to speed up the first frame of `show`"""
+
+import threading
+import time
+import uuid
+
+from .widget import CadViewer
+
+POOL = None
+
+DISPLAY_DEFAULTS = {
+    "cad_width": 800,
+    "tree_width": 250,
+    "height": 600,
+    "aspect_ratio": 0.75,
+    "theme": "browser",
+    "glass": True,
+    "tools": True,
+    "pinning": True,
+}
+
+
+class ViewerPool:
+    """
+    A pool of pre-created viewers `open_viewer` and `show` draw from.
+
+    The widgets of pooled viewers are created but not displayed. Their Javascript models build the DOM,
+    the Display and the Viewer including the WebGL renderer in advance, so a view adopting a pooled
+    viewer only needs to attach it and render the shapes.
+
+    Parameters
+    ----------
+    size : int, default: 2
+        Number of viewers kept ready for the default display settings
+    sidecar_size : int, default: 1
+        Number of viewers kept ready for sidecars, i.e. the default display settings with `pinning=False`
+        (pinning is only evaluated when the viewer is built)
+    idle_timeout : float, default: 300
+        Seconds after which an unused viewer is closed to free its WebGL context. A timer evicts idle
+        viewers, the pool is refilled when it is used again. None disables eviction
+    **kwargs
+        Display settings of the viewers used to refill the pool (`cad_width`, `tree_width`, `height`,
+        `aspect_ratio`, `theme`, `glass`, `tools`, `pinning`)
+    """
+
+    def __init__(self, size=2, sidecar_size=1, idle_timeout=300, **kwargs):
+        unknown = set(kwargs) - set(DISPLAY_DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown display settings {sorted(unknown)}")
+
+        self.size = size
+        self.sidecar_size = sidecar_size
+        self.idle_timeout = idle_timeout
+        self.defaults = {**DISPLAY_DEFAULTS, **kwargs}
+        self.viewers = []
+        self._lock = threading.RLock()
+        self._timer = None
+
+        self.refill()
+
+    def __len__(self):
+        return len(self.viewers)
+
+    def _settings(self, kwargs):
+        return {**self.defaults, **{k: v for k, v in kwargs.items() if k in DISPLAY_DEFAULTS}}
+
+    def prewarm(self, count=1, **kwargs):
+        """
+        Add `count` viewers with the given display settings, e.g. `pinning=False` for sidecars
+        """
+        settings = self._settings(kwargs)
+        with self._lock:
+            for _ in range(count):
+                viewer = CadViewer(**settings, id_=str(uuid.uuid4()), prewarm=True)
+                self.viewers.append((time.monotonic(), settings, viewer))
+            self._schedule()
+
+    def refill(self):
+        """
+        Refill the pool with viewers using the default display settings and the sidecar settings
+        """
+        with self._lock:
+            self.evict()
+            for count, kwargs in ((self.size, {}), (self.sidecar_size, {"pinning": False})):
+                settings = self._settings(kwargs)
+                missing = count - sum(1 for _, candidate, _ in self.viewers if candidate == settings)
+                if missing > 0:
+                    self.prewarm(missing, **kwargs)
+
+    def evict(self, now=None):
+        """
+        Close viewers that have been idle for longer than `idle_timeout` seconds
+        """
+        if self.idle_timeout is None:
+            return
+
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            keep = []
+            for entry in self.viewers:
+                if now - entry[0] > self.idle_timeout:
+                    entry[2].widget.close()
+                else:
+                    keep.append(entry)
+            self.viewers = keep
+
+    def _schedule(self):
+        # wake up when the oldest pooled viewer expires, so that idle pools release their WebGL
+        # contexts without being used again
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.idle_timeout is None or not self.viewers:
+            return
+
+        delay = min(entry[0] for entry in self.viewers) + self.idle_timeout - time.monotonic()
+        self._timer = threading.Timer(max(delay, 0) + 1, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _expire(self):
+        with self._lock:
+            self.evict()
+            self._schedule()
+
+    def acquire(self, **kwargs):
+        """
+        Take a viewer with the given display settings out of the pool
+
+        Returns
+        -------
+        CadViewer or None
+            A prewarmed viewer, or None if the pool holds no viewer with these settings
+        """
+        settings = self._settings(kwargs)
+
+        with self._lock:
+            self.evict()
+            viewer = None
+            for i, (_, candidate, pooled) in enumerate(self.viewers):
+                if candidate == settings:
+                    viewer = pooled
+                    del self.viewers[i]
+                    break
+
+            self.refill()
+        return viewer
+
+    def close(self):
+        """
+        Close all pooled viewers
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            for _, _, viewer in self.viewers:
+                viewer.widget.close()
+            self.viewers = []
+
+
+def enable_viewer_pool(size=2, sidecar_size=1, idle_timeout=300, **kwargs):
+    """
+    Enable a pool of prewarmed viewers for `open_viewer` and `show`,
+    see [ViewerPool](./pool.html#cad_viewer_widget.pool.ViewerPool)
+    """
+    global POOL  # pylint: disable=global-statement
+
+    disable_viewer_pool()
+    POOL = ViewerPool(size=size, sidecar_size=sidecar_size, idle_timeout=idle_timeout, **kwargs)
+    return POOL
+
+
+def disable_viewer_pool():
+    """
+    Close all pooled viewers and disable the pool
+    """
+    global POOL  # pylint: disable=global-statement
+
+    if POOL is not None:
+        POOL.close()
+        POOL = None
+
+
+def get_viewer_pool():
+    """
+    Get the active viewer pool, or None
+    """
+    return POOL
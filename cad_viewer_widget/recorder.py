@@ -0,0 +1,267 @@
+"""Recording and replay of the comm traffic of a viewer for offline profiling"""
+
+import struct
+import time
+
+from comm.base_comm import BaseComm
+
+from .utils import byte_view
+
+MAGIC = b"CVWCOMMS"
+FORMAT_VERSION = 1
+
+# magic, format version
+PREAMBLE = struct.Struct("<8sI")
+
+# seconds since recording started, direction, json length, number of buffers
+RECORD = struct.Struct("<dBII")
+BUFFER = struct.Struct("<Q")
+
+DIRECTIONS = ("open", "out", "in")
+
+# keys of the initial state that reference other widgets or identify the recorded session
+SESSION_KEYS = ("layout", "store", "id", "image_id", "camera_link")
+
+# keys whose observers act on the recorded session (write screenshots, release the viewer)
+EFFECT_KEYS = ("result", "disposed")
+
+
+class CommRecorder:
+    """
+    Append-only log of comm messages, written by `CadViewerWidget.start_recording`
+
+    Every record holds the time since the recording started, the direction ("open" for the initial
+    widget state, "out" to the browser, "in" from the browser), the message data as JSON and the binary
+    buffers.
+
+    Parameters
+    ----------
+    path : string or Path
+        File name of the recording
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = open(path, "wb")
+        self.fd.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION))
+        self.start = time.perf_counter()
+        self.messages = 0
+        self.bytes = 0
+
+    def write(self, direction, data, buffers=None):
+        """
+        Append a message
+
+        Parameters
+        ----------
+        direction : string
+            "open", "out" or "in"
+        data : dict
+            The message data
+        buffers : list of bytes-like, default: None
+            The binary buffers of the message
+        """
+        import orjson
+
+        buffers = [byte_view(b) for b in buffers or []]
+        payload = orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+        self.fd.write(
+            RECORD.pack(
+                time.perf_counter() - self.start,
+                DIRECTIONS.index(direction),
+                len(payload),
+                len(buffers),
+            )
+        )
+        for buffer in buffers:
+            self.fd.write(BUFFER.pack(buffer.nbytes))
+        self.fd.write(payload)
+        for buffer in buffers:
+            self.fd.write(buffer)
+        self.messages += 1
+        self.bytes += len(payload) + sum(b.nbytes for b in buffers)
+
+    def close(self):
+        """Flush and close the recording"""
+        if not self.fd.closed:
+            self.fd.close()
+
+
+def read_recording(path):
+    """
+    Iterate over the messages of a recording
+
+    Parameters
+    ----------
+    path : string or Path
+        File name of the recording
+
+    Yields
+    ------
+    dict
+        `time` (seconds since the recording started), `direction`, `data`, `buffers` and `size` in bytes
+    """
+    import orjson
+
+    with open(path, "rb") as fd:
+        magic, version = PREAMBLE.unpack(fd.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a comm recording")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Unsupported comm recording version {version}")
+
+        while True:
+            header = fd.read(RECORD.size)
+            if len(header) < RECORD.size:
+                # end of file or a record cut off by a crashed kernel
+                return
+            t, direction, length, count = RECORD.unpack(header)
+            sizes = [BUFFER.unpack(fd.read(BUFFER.size))[0] for _ in range(count)]
+            data = orjson.loads(fd.read(length))
+            buffers = [fd.read(size) for size in sizes]
+            yield {
+                "time": t,
+                "direction": DIRECTIONS[direction],
+                "data": data,
+                "buffers": buffers,
+                "size": length + sum(sizes),
+            }
+
+
+class HeadlessComm(BaseComm):
+    """A comm without a frontend, discarding all messages"""
+
+    def publish_msg(self, msg_type, data=None, metadata=None, buffers=None, **keys):
+        pass
+
+
+def headless_viewer(**kwargs):
+    """
+    Create a viewer whose comm discards all messages, e.g. to replay a recording without a browser
+
+    Parameters
+    ----------
+    **kwargs
+        Arguments of [CadViewer](./widget.html#cad_viewer_widget.widget.CadViewer)
+
+    Returns
+    -------
+    CadViewer
+    """
+    from .widget import CadViewer
+
+    return CadViewer(**kwargs, comm=HeadlessComm(target_name="jupyter.widget"))
+
+
+def _apply_state(widget, state, buffer_paths, buffers):
+    # give the kernel side of the replay viewer the recorded state, e.g. the shapes incoming messages
+    # refer to. Arrays are restored from their buffers as numpy arrays, `state` is modified in place
+    import numpy as np
+    from ipywidgets.widgets.widget import _put_buffers
+
+    def walk(obj):
+        if isinstance(obj, dict):
+            if isinstance(obj.get("buffer"), (bytes, memoryview)) and "dtype" in obj:
+                return np.frombuffer(obj["buffer"], dtype=obj["dtype"]).reshape(obj["shape"])
+            return {k: walk(v) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [walk(el) for el in obj]
+        return obj
+
+    _put_buffers(state, buffer_paths, buffers)
+    widget.set_state({k: walk(v) for k, v in state.items() if k not in EFFECT_KEYS})
+
+
+def replay(path, viewer, speed=1.0, incoming=False):
+    """
+    Feed a recording into a viewer and measure how long every message takes
+
+    Messages to the browser ("open" and "out") are sent unchanged through the comm of `viewer`, i.e. to
+    a fresh browser view or into the void of a [headless_viewer](#cad_viewer_widget.recorder.headless_viewer),
+    and their state is applied to the kernel side of `viewer`.
+    Messages from the browser ("in") are handled by the kernel side of `viewer` if `incoming` is True.
+    Messages referencing other widgets of the recorded session (e.g. a GeometryStore) cannot be replayed.
+
+    Parameters
+    ----------
+    path : string or Path
+        File name of the recording
+    viewer : CadViewer
+        The viewer to replay into
+    speed : float, default: 1.0
+        Replay speed relative to the recording, None replays at maximum speed
+    incoming : bool, default: False
+        Whether to let the kernel side handle the messages from the browser
+
+    Returns
+    -------
+    dict
+        - messages, bytes: number and size of replayed messages
+        - elapsed: seconds of the replay
+        - handling: seconds spent sending or handling the messages
+        - by_direction: direction -> {"messages", "bytes", "handling"}
+        - slowest: the 10 messages with the longest handling time (`index`, `time`, `direction`, `size`,
+          `method`, `handling`)
+    """
+    widget = viewer.widget
+    stats = {"messages": 0, "bytes": 0, "handling": 0.0, "by_direction": {}}
+    records = []
+    start = time.perf_counter()
+
+    for index, record in enumerate(read_recording(path)):
+        direction, data, buffers = record["direction"], record["data"], record["buffers"]
+        if direction == "in" and not incoming:
+            continue
+
+        if speed:
+            delay = record["time"] / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        t0 = time.perf_counter()
+        if direction == "open":
+            state = {k: v for k, v in data["state"].items() if not k.startswith("_") and k not in SESSION_KEYS}
+            paths = [p for p in data["buffer_paths"] if p[0] in state]
+            buffers = [b for p, b in zip(data["buffer_paths"], buffers) if p[0] in state]
+            widget._send({"method": "update", "state": state, "buffer_paths": paths}, buffers=buffers)
+            _apply_state(widget, state, paths, buffers)
+        elif direction == "out":
+            widget._send(data, buffers=buffers)
+            if data.get("method") == "update":
+                state = {k: v for k, v in data["state"].items() if k not in SESSION_KEYS}
+                paths = [p for p in data.get("buffer_paths", []) if p[0] in state]
+                buffers = [b for p, b in zip(data.get("buffer_paths", []), buffers) if p[0] in state]
+                _apply_state(widget, state, paths, buffers)
+        else:
+            widget._handle_msg({"content": {"data": data}, "buffers": [memoryview(b) for b in buffers]})
+        handling = time.perf_counter() - t0
+
+        totals = stats["by_direction"].setdefault(direction, {"messages": 0, "bytes": 0, "handling": 0.0})
+        for entry in (stats, totals):
+            entry["messages"] += 1
+            entry["bytes"] += record["size"]
+            entry["handling"] += handling
+
+        method = data.get("method")
+        if method == "custom":
+            content = data.get("content") or {}
+            method = content.get("method") or content.get("type")
+            if isinstance(method, list):
+                # cad_viewer_method messages carry the path of the Javascript method
+                method = ".".join(method)
+        elif method == "update":
+            method = ",".join(sorted(data.get("state", {})))[:80]
+        records.append(
+            {
+                "index": index,
+                "time": record["time"],
+                "direction": direction,
+                "size": record["size"],
+                "method": method,
+                "handling": handling,
+            }
+        )
+
+    stats["elapsed"] = time.perf_counter() - start
+    stats["slowest"] = sorted(records, key=lambda r: -r["handling"])[:10]
+    return stats
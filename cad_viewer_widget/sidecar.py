@@ -1,8 +1,11 @@
+import weakref
+
 from ipywidgets import Output
 from traitlets import Unicode, CaselessStrEnum, Integer
 
 
-SIDECARS = {}
+# sidecar viewers by title, entries are removed when the viewer gets disposed
+SIDECARS = weakref.WeakValueDictionary()
 DEFAULT = None
 
 
@@ -92,7 +95,7 @@ def close_sidecars():
         sidecar.close()
         print(f'Closed viewer "{title}"')
 
-    SIDECARS = {}
+    SIDECARS = weakref.WeakValueDictionary()
     DEFAULT = None
 
 
@@ -101,3 +104,9 @@ def close_sidecar(title):
     if sidecar is not None:
         sidecar.close()
         print(f'Closed viewer "{title}"')
+
+
+def remove_sidecar(viewer):
+    for title, sidecar in list(SIDECARS.items()):
+        if sidecar is viewer:
+            del SIDECARS[title]
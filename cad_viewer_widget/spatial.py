@@ -0,0 +1,486 @@
+"""Bounding volume hierarchies over parts and triangles for picking and region queries in Python"""
+
+from collections import OrderedDict
+
+from .geometry import GeometryCache
+from .utils import content_hash
+
+INDEXES = OrderedDict()
+MAX_INDEXES = 8
+
+EPS = 1e-9
+
+
+def _rotation(quaternion):
+    import numpy as np
+
+    x, y, z, w = quaternion
+    return np.array(
+        [
+            [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+            [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+            [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+        ]
+    )
+
+
+def _located_parts(tree, rotation=None, translation=None):
+    """Iterate over the leaf parts with the rotation and translation of their accumulated `loc`"""
+    import numpy as np
+
+    if rotation is None:
+        rotation, translation = np.eye(3), np.zeros(3)
+
+    loc = tree.get("loc")
+    if loc is not None:
+        # most locations are identities, skip the matrix products for them
+        if any(loc[0]):
+            translation = rotation @ np.asarray(loc[0], dtype=np.float64) + translation
+        if tuple(loc[1]) != (0, 0, 0, 1):
+            rotation = rotation @ _rotation(loc[1])
+
+    if tree.get("parts") is None:
+        yield tree, rotation, translation
+    else:
+        for part in tree["parts"]:
+            yield from _located_parts(part, rotation, translation)
+
+
+def _dot(a, b):
+    return (a * b).sum(axis=-1)
+
+
+def _ray_box(origin, inv_direction, mins, maxs):
+    """Entry and exit distances of a ray for every box (n, 3), exit < entry means a miss"""
+    import numpy as np
+
+    with np.errstate(invalid="ignore"):
+        t1 = (mins - origin) * inv_direction
+        t2 = (maxs - origin) * inv_direction
+    # 0 * inf gives nan for rays parallel to a slab they start in, these slabs never limit the ray
+    near = np.nan_to_num(np.minimum(t1, t2), nan=-np.inf).max(axis=1)
+    far = np.nan_to_num(np.maximum(t1, t2), nan=np.inf).min(axis=1)
+    return np.maximum(near, 0.0), far
+
+
+def _box_distance(point, mins, maxs):
+    import numpy as np
+
+    return np.linalg.norm(np.maximum(np.maximum(mins - point, point - maxs), 0.0), axis=1)
+
+
+def _ray_triangles(origin, direction, a, b, c):
+    """Möller-Trumbore for many triangles: distance of the hit, or inf, for every triangle"""
+    import numpy as np
+
+    e1, e2 = b - a, c - a
+    p = np.cross(direction, e2)
+    det = _dot(e1, p)
+    valid = np.abs(det) > EPS
+    inv = np.divide(1.0, det, out=np.zeros_like(det), where=valid)
+    s = origin - a
+    u = _dot(s, p) * inv
+    q = np.cross(s, e1)
+    v = _dot(direction, q) * inv
+    t = _dot(e2, q) * inv
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > EPS)
+    return np.where(hit, t, np.inf)
+
+
+def _closest_on_triangles(p, a, b, c):
+    """Closest point on every triangle to point p (Ericson, Real-Time Collision Detection 5.1.5)"""
+    import numpy as np
+
+    ab, ac = b - a, c - a
+    ap, bp, cp = p - a, p - b, p - c
+    d1, d2 = _dot(ab, ap), _dot(ac, ap)
+    d3, d4 = _dot(ab, bp), _dot(ac, bp)
+    d5, d6 = _dot(ab, cp), _dot(ac, cp)
+    va, vb, vc = d3 * d6 - d5 * d4, d5 * d2 - d1 * d6, d1 * d4 - d3 * d2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = 1.0 / (va + vb + vc)
+        face = a + ab * (vb * denom)[:, None] + ac * (vc * denom)[:, None]
+        on_ab = a + ab * (d1 / (d1 - d3))[:, None]
+        on_ac = a + ac * (d2 / (d2 - d6))[:, None]
+        on_bc = b + (c - b) * ((d4 - d3) / ((d4 - d3) + (d5 - d6)))[:, None]
+
+    conditions = [
+        (d1 <= 0) & (d2 <= 0),
+        (d3 >= 0) & (d4 <= d3),
+        (vc <= 0) & (d1 >= 0) & (d3 <= 0),
+        (d6 >= 0) & (d5 <= d6),
+        (vb <= 0) & (d2 >= 0) & (d6 <= 0),
+        (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0),
+    ]
+    choices = [a, b, on_ab, c, on_ac, on_bc]
+    return np.select([cond[:, None] for cond in conditions], choices, default=face)
+
+
+def _closest_on_segments(p, a, b):
+    import numpy as np
+
+    ab = b - a
+    length = _dot(ab, ab)
+    t = np.clip(np.divide(_dot(p - a, ab), length, out=np.zeros_like(length), where=length > 0), 0, 1)
+    return a + ab * t[:, None]
+
+
+class BVH:
+    """
+    A bounding volume hierarchy over axis aligned boxes, built top down by median splits along the
+    longest axis. Queries traverse the tree level by level, testing all nodes of a level at once.
+
+    Parameters
+    ----------
+    mins, maxs : ndarray (n, 3)
+        The lower and upper corners of the boxes
+    leaf_size : int, default: 8
+        Maximum number of boxes in a leaf
+    """
+
+    def __init__(self, mins, maxs, leaf_size=8):
+        import numpy as np
+
+        n = len(mins)
+        centers = (mins + maxs) / 2
+        self.order = np.arange(n)
+
+        node_min, node_max, first, start, count = [], [], [], [], []
+
+        def add_node(s, e):
+            idx = self.order[s:e]
+            node_min.append(mins[idx].min(axis=0))
+            node_max.append(maxs[idx].max(axis=0))
+            first.append(-1)
+            start.append(s)
+            count.append(e - s)
+            return len(first) - 1
+
+        stack = [add_node(0, n)] if n > 0 else []
+        while stack:
+            node = stack.pop()
+            s = start[node]
+            e = s + count[node]
+            if e - s <= leaf_size:
+                continue
+            idx = self.order[s:e]
+            c = centers[idx]
+            axis = np.argmax(c.max(axis=0) - c.min(axis=0))
+            mid = (e - s) // 2
+            self.order[s:e] = idx[np.argpartition(c[:, axis], mid)]
+            # children are always created consecutively, the second child is first + 1
+            first[node] = add_node(s, s + mid)
+            add_node(s + mid, e)
+            stack.extend((first[node], first[node] + 1))
+
+        self.mins = np.array(node_min).reshape(-1, 3)
+        self.maxs = np.array(node_max).reshape(-1, 3)
+        self.first = np.array(first, dtype=np.int64)
+        self.start = np.array(start, dtype=np.int64)
+        self.count = np.array(count, dtype=np.int64)
+
+    def query(self, test):
+        """
+        Get the indices of all boxes in leaves whose nodes pass `test(mins, maxs) -> bool mask`
+        """
+        import numpy as np
+
+        if len(self.first) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        leaves = []
+        frontier = np.zeros(1, dtype=np.int64)
+        while frontier.size > 0:
+            frontier = frontier[test(self.mins[frontier], self.maxs[frontier])]
+            is_leaf = self.first[frontier] < 0
+            leaves.append(frontier[is_leaf])
+            inner = self.first[frontier[~is_leaf]]
+            frontier = np.concatenate((inner, inner + 1))
+
+        leaves = np.concatenate(leaves)
+        counts = self.count[leaves]
+        offsets = np.cumsum(counts) - counts
+        positions = np.arange(counts.sum()) - np.repeat(offsets, counts) + np.repeat(self.start[leaves], counts)
+        return self.order[positions]
+
+
+def part_bounds(shapes, geometries, use_bb=False):
+    """
+    World aligned bounding boxes of all parts with geometry, without building an index
+
+    Parameters
+    ----------
+    shapes : dict
+        The shapes payload with `instances` and the `shapes` tree
+    geometries : GeometryCache
+        The decoded geometries of the parts
+    use_bb : bool, default: False
+        Take the box of a part from its `bb` (in the coordinates of its vertices) when present, so that
+        only parts without `bb` get decoded
+
+    Returns
+    -------
+    tuple
+        The paths of the parts, their rotations (p, 3, 3), translations (p, 3), and the minimum and
+        maximum corners (p, 3) of their boxes
+    """
+    import numpy as np
+
+    paths, rotations, translations, lows, highs = [], [], [], [], []
+    bounds = {}
+    for part, rotation, translation in _located_parts(shapes["shapes"]):
+        bb = part.get("bb") if use_bb else None
+        if isinstance(bb, dict):
+            box = (
+                np.array([bb["xmin"], bb["ymin"], bb["zmin"]], dtype=np.float64),
+                np.array([bb["xmax"], bb["ymax"], bb["zmax"]], dtype=np.float64),
+            )
+        else:
+            geometry = geometries[part["id"]]
+            if id(geometry) not in bounds:
+                points = np.concatenate(
+                    (geometry.vertices, geometry.edges.reshape(-1, 3), geometry.obj_vertices)
+                ).astype(np.float64)
+                bounds[id(geometry)] = (points.min(axis=0), points.max(axis=0)) if len(points) > 0 else None
+            box = bounds[id(geometry)]
+        if box is None:
+            continue
+        paths.append(part["id"])
+        rotations.append(rotation)
+        translations.append(translation)
+        lows.append(box[0])
+        highs.append(box[1])
+
+    rotations = np.array(rotations).reshape(-1, 3, 3)
+    translations = np.array(translations).reshape(-1, 3)
+
+    # world aligned bounding boxes of the rotated local boxes, for all parts at once
+    center = (np.array(lows).reshape(-1, 3) + np.array(highs).reshape(-1, 3)) / 2
+    extent = np.array(highs).reshape(-1, 3) - center
+    center = np.einsum("pij,pj->pi", rotations, center) + translations
+    extent = np.einsum("pij,pj->pi", np.abs(rotations), extent)
+    return paths, rotations, translations, center - extent, center + extent
+
+
+class SpatialIndex:
+    """
+    Spatial queries over all parts of a shapes payload in world coordinates.
+
+    A BVH over the bounding boxes of the parts is built on creation, the BVHs over the triangles of a
+    part's geometry are built on first use and shared by all parts referencing the same instance.
+
+    Parameters
+    ----------
+    shapes : dict
+        The shapes payload with `instances` and the `shapes` tree
+    geometries : GeometryCache, default: None
+        The decoded geometries to use, by default a new cache is created
+    """
+
+    def __init__(self, shapes, geometries=None):
+        self.geometries = GeometryCache(shapes) if geometries is None else geometries
+        self.paths, self.rotations, self.translations, self.mins, self.maxs = part_bounds(
+            shapes, self.geometries
+        )
+        self.bvh = BVH(self.mins, self.maxs)
+        self._triangle_bvhs = {}
+
+    def _triangles(self, i):
+        """Triangle corners (3 x (t, 3)) in local coordinates and their BVH for part i"""
+        import numpy as np
+
+        geometry = self.geometries[self.paths[i]]
+        entry = self._triangle_bvhs.get(id(geometry))
+        if entry is None:
+            tri = geometry.vertices.astype(np.float64)[geometry.triangles]
+            corners = (tri[:, 0], tri[:, 1], tri[:, 2])
+            entry = (geometry, corners, BVH(tri.min(axis=1), tri.max(axis=1), leaf_size=16))
+            self._triangle_bvhs[id(geometry)] = entry
+        return entry[1], entry[2]
+
+    def _to_local(self, i, point, direction=None):
+        local = (point - self.translations[i]) @ self.rotations[i]
+        if direction is None:
+            return local
+        return local, direction @ self.rotations[i]
+
+    def ray_pick(self, origin, direction):
+        """
+        Find the first triangle hit by a ray
+
+        Parameters
+        ----------
+        origin : 3-dim list of float
+            Start point of the ray
+        direction : 3-dim list of float
+            Direction of the ray (needs not be normalized)
+
+        Returns
+        -------
+        dict or None
+            `path`, `distance`, `point`, `face` and `triangle` of the hit, or None
+        """
+        import numpy as np
+
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        direction = direction / np.linalg.norm(direction)
+        with np.errstate(divide="ignore"):
+            inv_direction = 1.0 / direction
+
+        def hit_boxes(mins, maxs):
+            near, far = _ray_box(origin, inv_direction, mins, maxs)
+            return near <= far
+
+        candidates = self.bvh.query(hit_boxes)
+        # leaves hold boxes the ray misses, too
+        near, far = _ray_box(origin, inv_direction, self.mins[candidates], self.maxs[candidates])
+        candidates, near = candidates[near <= far], near[near <= far]
+        best = None
+        for i, entry in sorted(zip(candidates, near), key=lambda c: c[1]):
+            if best is not None and entry > best["distance"]:
+                break
+
+            local_origin, local_direction = self._to_local(i, origin, direction)
+            with np.errstate(divide="ignore"):
+                local_inv = 1.0 / local_direction
+            (a, b, c), tri_bvh = self._triangles(i)
+
+            def hit_triangle_boxes(mins, maxs):
+                near, far = _ray_box(local_origin, local_inv, mins, maxs)
+                return near <= far
+
+            tris = tri_bvh.query(hit_triangle_boxes)
+            if tris.size == 0:
+                continue
+            t = _ray_triangles(local_origin, local_direction, a[tris], b[tris], c[tris])
+            k = np.argmin(t)
+            if np.isfinite(t[k]) and (best is None or t[k] < best["distance"]):
+                triangle = int(tris[k])
+                best = {
+                    "path": self.paths[i],
+                    "distance": float(t[k]),
+                    "point": (origin + t[k] * direction).tolist(),
+                    "face": int(self.geometries[self.paths[i]].face_of_triangle(triangle)),
+                    "triangle": triangle,
+                }
+        return best
+
+    def parts_in_box(self, bbox, inside=False):
+        """
+        Find the parts whose bounding boxes intersect (or lie inside) a box
+
+        Parameters
+        ----------
+        bbox : dict or tuple
+            The box as `{"xmin": ..., "xmax": ..., "ymin": ..., ...}` or `((xmin, ymin, zmin), (xmax, ymax, zmax))`
+        inside : bool, default: False
+            Whether to only return parts completely inside the box
+
+        Returns
+        -------
+        list of string
+            The paths of the parts in tree order
+        """
+        import numpy as np
+
+        if isinstance(bbox, dict):
+            lo = np.array([bbox["xmin"], bbox["ymin"], bbox["zmin"]], dtype=np.float64)
+            hi = np.array([bbox["xmax"], bbox["ymax"], bbox["zmax"]], dtype=np.float64)
+        else:
+            lo, hi = (np.asarray(corner, dtype=np.float64) for corner in bbox)
+
+        def intersects(mins, maxs):
+            return np.all((mins <= hi) & (maxs >= lo), axis=1)
+
+        found = self.bvh.query(intersects)
+        # leaves hold boxes outside the box, too
+        found = found[intersects(self.mins[found], self.maxs[found])]
+        if inside:
+            found = found[np.all((self.mins[found] >= lo) & (self.maxs[found] <= hi), axis=1)]
+        return [self.paths[i] for i in np.sort(found)]
+
+    def nearest_part(self, point):
+        """
+        Find the part closest to a point, measured to its triangles, edges or vertices
+
+        Parameters
+        ----------
+        point : 3-dim list of float
+
+        Returns
+        -------
+        dict or None
+            `path`, `distance` and the closest `point` on the part, or None if there are no parts
+        """
+        import numpy as np
+
+        point = np.asarray(point, dtype=np.float64)
+        bounds = _box_distance(point, self.mins, self.maxs)
+        best = None
+        for i in np.argsort(bounds, kind="stable"):
+            if best is not None and bounds[i] > best["distance"]:
+                break
+
+            local = self._to_local(i, point)
+            geometry = self.geometries[self.paths[i]]
+            if len(geometry.triangles) > 0:
+                (a, b, c), _ = self._triangles(i)
+                closest = _closest_on_triangles(local, a, b, c)
+            elif len(geometry.edges) > 0:
+                segments = geometry.edges.astype(np.float64)
+                closest = _closest_on_segments(local, segments[:, 0], segments[:, 1])
+            else:
+                closest = geometry.obj_vertices.astype(np.float64)
+
+            distances = np.linalg.norm(closest - local, axis=1)
+            k = np.argmin(distances)
+            if best is None or distances[k] < best["distance"]:
+                best = {
+                    "path": self.paths[i],
+                    "distance": float(distances[k]),
+                    "point": (closest[k] @ self.rotations[i].T + self.translations[i]).tolist(),
+                }
+        return best
+
+
+def get_spatial_index(shapes, geometries=None):
+    """
+    Get the spatial index of a shapes payload, cached per content hash of the payload
+
+    Parameters
+    ----------
+    shapes : dict
+        The shapes payload with `instances` and the `shapes` tree
+    geometries : GeometryCache, default: None
+        The decoded geometries to use when a new index needs to be built
+
+    Returns
+    -------
+    SpatialIndex
+    """
+    key = content_hash(shapes)
+    index = INDEXES.get(key)
+    if index is None:
+        index = SpatialIndex(shapes, geometries)
+        INDEXES[key] = index
+        if len(INDEXES) > MAX_INDEXES:
+            INDEXES.popitem(last=False)
+    else:
+        INDEXES.move_to_end(key)
+    return index
+
+
+def release_spatial_index(index):
+    """
+    Remove a spatial index from the cache, e.g. when the viewer using it is closed
+
+    Parameters
+    ----------
+    index : SpatialIndex
+        The index to remove
+    """
+    for key, value in list(INDEXES.items()):
+        if value is index:
+            del INDEXES[key]
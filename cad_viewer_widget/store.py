@@ -0,0 +1,89 @@
+"""Kernel level geometry store to share one shapes payload between several viewers"""
+
+import uuid
+
+import ipywidgets as widgets
+from traitlets import Unicode, Dict
+
+from .utils import to_json
+
+
+STORES = {}
+
+
+@widgets.register
+class GeometryStore(widgets.Widget):
+    """
+    A widget holding one serialized shapes payload.
+
+    The payload is sent to the browser once and decoded once. Every `CadViewer` referencing the store
+    (see [CadViewer.add_shapes](./widget.html#cad_viewer_widget.widget.CadViewer.add_shapes)) renders
+    from this decoded geometry instead of receiving its own copy.
+    """
+
+    _model_name = Unicode("CadViewerGeometryStoreModel").tag(sync=True)
+    _model_module = Unicode("cad-viewer-widget").tag(sync=True)
+    _model_module_version = Unicode("3.0.2").tag(sync=True)
+
+    key = Unicode(allow_none=True).tag(sync=True)
+    "unicode string: the key the store is registered with"
+
+    shapes = Dict(allow_none=True).tag(sync=True, to_json=to_json)
+    "dict: Serialized nested tessellated shapes"
+
+
+def share_shapes(shapes, key=None):
+    """
+    Store shapes once in the kernel and the browser so that they can be referenced by any number of viewers
+
+    Parameters
+    ----------
+    shapes : dict
+        Nested tessellated shapes, see [CadViewer.add_shapes](./widget.html#cad_viewer_widget.widget.CadViewer.add_shapes)
+    key : string, default: None
+        The key to register the store with. If None, a store already holding the very same `shapes`
+        object will be reused, else a new key will be generated
+
+    Returns
+    -------
+    GeometryStore
+        The store widget to be passed as `shapes` to `show` or `CadViewer.add_shapes`
+    """
+    if key is None:
+        for store in STORES.values():
+            if store.shapes is shapes:
+                return store
+        key = str(uuid.uuid4())
+
+    store = STORES.get(key)
+    if store is None:
+        store = GeometryStore(key=key, shapes=shapes)
+        STORES[key] = store
+    elif store.shapes is not shapes:
+        store.shapes = shapes
+
+    return store
+
+
+def get_store(key):
+    """
+    Get the geometry store registered as `key`, or None
+    """
+    return STORES.get(key)
+
+
+def get_stores():
+    """
+    Get all registered geometry stores
+    """
+    return STORES
+
+
+def close_store(key):
+    """
+    Close the geometry store registered as `key` and free its payload
+    """
+    store = STORES.pop(key, None)
+    if store is not None:
+        store.shapes = None
+        store.close()
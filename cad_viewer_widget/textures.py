@@ -0,0 +1,98 @@
+"""Binary transport of part textures, deduplicated by content hash"""
+
+import base64
+import hashlib
+
+
+def _image_bytes(data):
+    if isinstance(data, str):
+        return base64.b64decode(data)
+    return bytes(data)
+
+
+def _texture_refs(tree, refs):
+    if tree.get("parts") is not None:
+        for part in tree["parts"]:
+            _texture_refs(part, refs)
+    else:
+        texture = tree.get("texture")
+        image = texture.get("image") if isinstance(texture, dict) else None
+        if isinstance(image, dict) and image.get("ref") is not None:
+            refs.add(image["ref"])
+    return refs
+
+
+def extract_textures(shapes):
+    """
+    Move the images of part textures into a table of binary buffers
+
+    Every distinct image is stored once under the hash of its bytes, parts reference it by this hash
+    (`"texture": {..., "image": {"format": "png", "ref": <hash>}}`), and the Javascript viewer caches
+    the images across `add_shapes` calls. The table always holds the image data, images cached by the
+    browser are only left out of the comm messages.
+
+    Parameters
+    ----------
+    shapes : dict
+        The shapes payload with `instances` and the `shapes` tree. Images can be base64 strings (the
+        tessellator format) or bytes
+
+    Returns
+    -------
+    dict
+        The payload with a `textures` table (hash -> {"format", "data"}), or `shapes` itself if no part
+        has a texture
+    """
+    import numpy as np
+
+    table = {}
+    hashes = {}
+
+    def walk(tree):
+        if tree.get("parts") is not None:
+            return {**tree, "parts": [walk(part) for part in tree["parts"]]}
+
+        texture = tree.get("texture")
+        image = texture.get("image") if isinstance(texture, dict) else None
+        if not isinstance(image, dict) or image.get("data") is None:
+            return tree
+
+        data = image["data"]
+        # catalog parts usually share the image object, hash it only once
+        key = hashes.get(id(data))
+        if key is None:
+            raw = _image_bytes(data)
+            key = hashlib.blake2b(raw, digest_size=16).hexdigest()
+            hashes[id(data)] = key
+            if key not in table:
+                table[key] = {
+                    "format": image.get("format"),
+                    "data": np.frombuffer(raw, dtype=np.uint8),
+                }
+
+        return {**tree, "texture": {**texture, "image": {"format": image.get("format"), "ref": key}}}
+
+    tree = walk(shapes["shapes"])
+    if not table:
+        return shapes
+    return {**shapes, "shapes": tree, "textures": table}
+
+
+def select_textures(shapes, textures):
+    """
+    Attach the entries of a texture table referenced by the parts of `shapes` (e.g. a preview)
+
+    Parameters
+    ----------
+    shapes : dict
+        The shapes payload with `instances` and the `shapes` tree
+    textures : dict
+        The texture table created by `extract_textures`
+
+    Returns
+    -------
+    dict
+        The payload with its `textures` table
+    """
+    refs = _texture_refs(shapes["shapes"], set())
+    return {**shapes, "textures": {key: textures[key] for key in refs if key in textures}}
@@ -0,0 +1,128 @@
+"""Thumbnails of parts rendered in the browser"""
+
+import os
+
+
+def part_spheres(index, paths):
+    """
+    Bounding spheres of parts or groups to frame them in the viewer
+
+    Parameters
+    ----------
+    index : SpatialIndex
+        The spatial index over the parts of the shapes
+    paths : list of string
+        Paths of parts or groups, a group is framed with all its parts
+
+    Returns
+    -------
+    list of dict
+        `{"path", "center", "radius"}` for every path with geometry
+    """
+    import numpy as np
+
+    # indices of the parts below every group, built in one pass over the part paths
+    members = {}
+    for i, part in enumerate(index.paths):
+        names = part.split("/")
+        for depth in range(2, len(names) + 1):
+            members.setdefault("/".join(names[:depth]), []).append(i)
+
+    spheres = []
+    for path in paths:
+        rows = members.get(path)
+        if rows is None:
+            continue
+        low = index.mins[rows].min(axis=0)
+        high = index.maxs[rows].max(axis=0)
+        spheres.append(
+            {
+                "path": path,
+                "center": ((low + high) / 2).tolist(),
+                "radius": float(np.linalg.norm(high - low) / 2),
+            }
+        )
+    return spheres
+
+
+class ThumbnailBatch:
+    """
+    Thumbnails of parts rendered by the browser, returned by `CadViewer.thumbnails`.
+
+    All images arrive in one binary comm message while the kernel is idle, so check `done()` in a later cell.
+
+    Parameters
+    ----------
+    paths : list of string
+        The paths of the requested parts
+    format : string
+        Image format, "png", "jpeg" or "webp"
+
+    Attributes
+    ----------
+    images : dict
+        path -> encoded image (bytes)
+    skipped : list of string
+        Paths not rendered since all their parts are hidden
+    error : string
+        Error message of the browser, if rendering failed
+    """
+
+    def __init__(self, paths, format):
+        self.paths = paths
+        self.format = format
+        self.images = {}
+        self.skipped = []
+        self.error = None
+        self.finished = False
+
+    def __repr__(self):
+        return f"ThumbnailBatch(images={len(self.images)}/{len(self.paths)}, format='{self.format}')"
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, path):
+        return self.images[path]
+
+    def _receive(self, content, buffers):
+        if content.get("type") == "thumbnails":
+            self.images = {path: bytes(buffer) for path, buffer in zip(content["paths"], buffers)}
+            self.skipped = content.get("skipped") or []
+        else:
+            self.error = content.get("message")
+        self.finished = True
+
+    def done(self):
+        """
+        Whether the thumbnails have been received (or rendering failed)
+
+        Returns
+        -------
+        bool
+        """
+        return self.finished
+
+    def save(self, directory):
+        """
+        Write the thumbnails to a directory, named after the part paths with "/" replaced by "_"
+
+        Parameters
+        ----------
+        directory : string or Path
+            The target directory
+
+        Returns
+        -------
+        dict
+            path -> file written
+        """
+        os.makedirs(directory, exist_ok=True)
+        ext = "jpg" if self.format == "jpeg" else self.format
+        files = {}
+        for path, data in self.images.items():
+            filename = os.path.join(directory, f"{path.strip('/').replace('/', '_')}.{ext}")
+            with open(filename, "wb") as fd:
+                fd.write(data)
+            files[path] = filename
+        return files
@@ -0,0 +1,119 @@
+"""Camera moves interpolated in the browser render loop"""
+
+import time
+
+EASINGS = ("linear", "ease-in", "ease-out", "ease-in-out")
+
+KEYFRAME_KEYS = ("position", "target", "quaternion", "zoom", "duration", "easing", "hold")
+
+
+def check_keyframe(keyframe):
+    """
+    Validate a keyframe of a camera tour and convert its vectors to lists
+
+    Parameters
+    ----------
+    keyframe : dict
+        The camera at the end of the move, `position`, `target`, `quaternion` and `zoom` (all optional,
+        missing values are kept from the previous keyframe), the `duration` of the move and the `hold`
+        time afterwards in seconds and the `easing`, one of "linear", "ease-in", "ease-out", "ease-in-out"
+
+    Returns
+    -------
+    dict
+        The validated keyframe
+    """
+    unknown = set(keyframe) - set(KEYFRAME_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown keyframe keys {sorted(unknown)}, valid keys are {list(KEYFRAME_KEYS)}")
+
+    result = {}
+    for key, size in (("position", 3), ("target", 3), ("quaternion", 4)):
+        value = keyframe.get(key)
+        if value is not None:
+            value = [float(v) for v in value]
+            if len(value) != size:
+                raise ValueError(f"Keyframe {key} needs {size} values")
+            result[key] = value
+    if keyframe.get("zoom") is not None:
+        result["zoom"] = float(keyframe["zoom"])
+
+    easing = keyframe.get("easing", "ease-in-out")
+    if easing not in EASINGS:
+        raise ValueError(f"{easing} is not a valid easing {list(EASINGS)}")
+    result["easing"] = easing
+
+    for key in ("duration", "hold"):
+        value = float(keyframe.get(key, 1.0 if key == "duration" else 0.0))
+        if value < 0:
+            raise ValueError(f"Keyframe {key} needs to be >= 0")
+        result[key] = value
+
+    return result
+
+
+class CameraTour:
+    """
+    A camera tour running in the browser, returned by `CadViewer.fly_to` and `CadViewer.play_tour`.
+
+    The browser reports the end of the tour with one message while the kernel is idle, so check `done()`
+    in a later cell or register a callback with `on_done`.
+
+    Parameters
+    ----------
+    keyframes : list of dict
+        The validated keyframes
+    loop : bool
+        Whether the tour repeats until it is stopped
+
+    Attributes
+    ----------
+    completed : bool
+        Whether the last keyframe was reached (False if the tour was stopped or interrupted by the user)
+    elapsed : float
+        Seconds from starting the tour until the browser reported its end
+    """
+
+    def __init__(self, keyframes, loop=False):
+        self.keyframes = keyframes
+        self.loop = loop
+        self.completed = None
+        self.finished = False
+        self.created = time.perf_counter()
+        self.elapsed = None
+        self._callbacks = []
+
+    def __repr__(self):
+        state = "running" if not self.finished else ("completed" if self.completed else "stopped")
+        return f"CameraTour(keyframes={len(self.keyframes)}, loop={self.loop}, {state})"
+
+    def _receive(self, content, _buffers):
+        self.completed = bool(content.get("completed"))
+        self.finished = True
+        self.elapsed = time.perf_counter() - self.created
+        for callback in self._callbacks:
+            callback(self)
+
+    def done(self):
+        """
+        Whether the tour has ended
+
+        Returns
+        -------
+        bool
+        """
+        return self.finished
+
+    def on_done(self, callback):
+        """
+        Register a function called with the tour when the browser reports its end
+
+        Parameters
+        ----------
+        callback : callable
+            Function with the tour as argument
+        """
+        if self.finished:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
@@ -1,9 +1,11 @@
 """Utility functions"""
 
+import functools
 import itertools
+import sys
 import warnings
-import numpy as np
-from pyparsing import Literal, Word, alphanums, nums, delimitedList, ZeroOrMore
+
+# numpy and pyparsing are imported on first use to keep `import cad_viewer_widget` fast
 
 # Warnings
 
@@ -26,6 +28,8 @@ def warn(message, warning=RuntimeWarning, when="always"):
 
 
 def distance(v1, v2=None):
+    import numpy as np
+
     if v2 is None:
         return np.linalg.norm(v1)
     else:
@@ -33,10 +37,14 @@ def distance(v1, v2=None):
 
 
 def normalize(v):
+    import numpy as np
+
     return np.array(v) / distance(v)
 
 
 def bsphere(bbox):
+    import numpy as np
+
     center = (
         (bbox["xmin"] + bbox["xmax"]) / 2.0,
         (bbox["ymin"] + bbox["ymax"]) / 2.0,
@@ -59,8 +67,12 @@ def bsphere(bbox):
 
 
 def to_json(value, widget):
+    # without numpy being loaded there can't be any ndarray in value
+    np = sys.modules.get("numpy")
+    ndarray = () if np is None else np.ndarray
+
     def walk(obj):
-        if isinstance(obj, np.ndarray):
+        if isinstance(obj, ndarray):
             if str(obj.dtype) in ("int32", "int64", "uint64"):
                 obj = obj.astype("uint32", order="C")  # force uint triangles
             elif not obj.flags["C_CONTIGUOUS"]:
@@ -86,6 +98,8 @@ def to_json(value, widget):
 
 def numpyify(obj):
     """Replace all arrays with numpy ndarrays. They will be serialized with compression"""
+    import numpy as np
+
     result = {}
     for k, v in obj.items():
         if isinstance(v, dict):
@@ -103,20 +117,87 @@ def numpyify(obj):
     return result
 
 
+def byte_view(value):
+    """
+    Flat byte view of a C contiguous buffer or ndarray without copying. Empty arrays with more than one
+    dimension, e.g. the (0, 3) triangles of a part without faces, cannot be cast by memoryview
+    """
+    view = memoryview(value)
+    if view.nbytes == 0:
+        return memoryview(b"")
+    return view.cast("B")
+
+
+def content_hash(obj):
+    """
+    Hash of a shapes payload over its structure and the raw bytes of its arrays (hex string)
+    """
+    import hashlib
+
+    import orjson
+
+    digest = hashlib.blake2b(digest_size=16)
+
+    def default(value):
+        np = sys.modules.get("numpy")
+        if np is not None and isinstance(value, (np.ndarray, np.generic)):
+            value = np.ascontiguousarray(value)
+            digest.update(byte_view(value))
+            return [str(value.dtype), list(value.shape)]
+        digest.update(byte_view(value))
+        return "buffer"
+
+    digest.update(orjson.dumps(obj, default=default))
+    return digest.hexdigest()
+
+
+def iter_parts(tree):
+    """Iterate over the leaf parts of a nested shapes tree"""
+    if tree.get("parts") is None:
+        yield tree
+    else:
+        for part in tree["parts"]:
+            yield from iter_parts(part)
+
+
+_PARSER = None
+
+
 def get_parser():
     """
     A parser for nested json objects
 
-    Only used internally to parse Javascript object paths
+    Only used internally to parse Javascript object paths. The grammar is built once and shared
+    """
+    global _PARSER  # pylint: disable=global-statement
+
+    if _PARSER is None:
+        from pyparsing import Literal, Word, alphanums, nums, delimitedList, ZeroOrMore
+
+        dot = Literal(".").suppress()
+        lbrack = Literal("[").suppress()
+        rbrack = Literal("]").suppress()
+        integer = Word(nums)
+        index = lbrack + delimitedList(integer) + rbrack
+        obj = Word(alphanums + "_$") + ZeroOrMore(index)
+        _PARSER = obj + ZeroOrMore(dot + obj)
+
+    return _PARSER
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_path(string):
+    """
+    Parse a Javascript object path like `abc.def[3].method` into a tuple of its elements, or None
+    if the path is invalid. Results are memoized, since scripted camera moves call the same few
+    methods over and over again
     """
+    from pyparsing import ParseException
 
-    dot = Literal(".").suppress()
-    lbrack = Literal("[").suppress()
-    rbrack = Literal("]").suppress()
-    integer = Word(nums)
-    index = lbrack + delimitedList(integer) + rbrack
-    obj = Word(alphanums + "_$") + ZeroOrMore(index)
-    return obj + ZeroOrMore(dot + obj)
+    try:
+        return tuple(get_parser().parseString(string).asList())
+    except ParseException:
+        return None
 
 
 # Arguments split helpers
@@ -186,5 +267,10 @@ def viewer_args(config):
             "rotate_speed",
             "timeit",
             "debug",
+            "progressive",
+            "lazy",
+            "gpu_budget",
+            "gpu_evict_after",
+            "external",
         ]
     }
@@ -2,14 +2,16 @@
 """This module is the Python part of the CAD Viewer widget"""
 
 import base64
-import orjson
+import functools
+import threading
+import time
+import uuid
+import weakref
+from collections import deque
 from pathlib import Path
 from textwrap import dedent
 
-import numpy as np
-
 import ipywidgets as widgets
-from ipywidgets.embed import embed_minimal_html, dependency_state
 
 from traitlets import (
     Unicode,
@@ -22,15 +24,35 @@ from traitlets import (
     Bool,
     Enum,
     Callable,
+    Instance,
     observe,
 )
 from IPython.display import HTML, update_display
-from pyparsing import ParseException
-
-from .utils import get_parser, to_json, bsphere, normalize
 
+from .utils import parse_path, to_json, bsphere, normalize, iter_parts
+from .store import GeometryStore, get_store
+from .geometry import GeometryCache
+from .spatial import get_spatial_index, release_spatial_index
+from .ordering import preview_parts
+from .lazy import defer_hidden, defer_parts, select_parts
+from .textures import extract_textures
+from .memory import estimate
+from .external import CACHE_DIR, externalize
+from .frames import FrameSequence
+from .thumbnails import ThumbnailBatch, part_spheres
+from .sidecar import remove_sidecar
+from .background import get_executor
+from .recorder import CommRecorder
+from .tour import CameraTour, check_keyframe
+
+
+# registered viewers by widget id, an entry lives as long as its widget (comm handlers reference the
+# viewer) and is removed when the viewer gets disposed
+VIEWER = weakref.WeakValueDictionary()
+
+# cell viewers with a WebGL context, browsers allow around 16 contexts per page
+MAX_LIVE_VIEWERS = 12
 
-VIEWER = {}
 COLLAPSE = {
     "R": "R",
     "C": "C",
@@ -51,7 +73,92 @@ def get_viewer_by_id(id_):
 
 
 def get_viewers_by_id():
-    return VIEWER
+    return dict(VIEWER)
+
+
+def get_viewer_stats():
+    """
+    Get the number of live registered viewers and the bytes of shapes they keep in the kernel
+
+    Shapes shared via a [GeometryStore](./store.html) are owned by the store and not counted.
+
+    Returns
+    -------
+    dict
+        - live: number of registered viewers
+        - cell / sidecar: number of cell and sidecar viewers
+        - retained_bytes: bytes of all shapes payloads held by the viewers
+        - viewers: widget id -> {"title", "retained_bytes"}
+    """
+    viewers = {}
+    for id_, viewer in list(VIEWER.items()):
+        viewers[id_] = {
+            "title": viewer.widget.title,
+            "retained_bytes": viewer.retained_bytes(),
+        }
+    sidecars = sum(1 for v in viewers.values() if v["title"] is not None)
+    return {
+        "live": len(viewers),
+        "cell": len(viewers) - sidecars,
+        "sidecar": sidecars,
+        "retained_bytes": sum(v["retained_bytes"] for v in viewers.values()),
+        "viewers": viewers,
+    }
+
+
+def set_max_live_viewers(count):
+    """
+    Set the maximum number of cell viewers keeping their WebGL context in the browser
+
+    When a cell viewer shows shapes and more viewers are live, the least recently used ones (last click,
+    drag or wheel) are replaced by an image of their view and release their WebGL context. A click on
+    the image rebuilds the viewer from the shapes held by the widget. Prewarmed viewers of the
+    [ViewerPool](./pool.html#cad_viewer_widget.pool.ViewerPool) hold a context, too, and count
+    towards the limit.
+
+    Parameters
+    ----------
+    count : int
+        Number of live cell viewers, None disables the limit
+    """
+    global MAX_LIVE_VIEWERS
+    MAX_LIVE_VIEWERS = count
+    for viewer in list(VIEWER.values()):
+        if viewer.widget.title is None:
+            viewer.widget.max_live_viewers = count
+
+
+def get_max_live_viewers():
+    """
+    Get the maximum number of cell viewers keeping their WebGL context in the browser
+
+    Returns
+    -------
+    int
+        Number of live cell viewers or None
+    """
+    return MAX_LIVE_VIEWERS
+
+
+def _traced_to_json(value, widget):
+    # to_json for the shapes trait that accounts its time to the active trace
+    start = time.perf_counter()
+    result = to_json(value, widget)
+    trace = getattr(widget, "_trace", None)
+    if trace is not None and trace["thread"] == threading.get_ident():
+        trace["to_json"] += (time.perf_counter() - start) * 1000
+    return result
+
+
+def _serialized(method):
+    # run the method under the viewer's lock, shapes can be added from the background thread of
+    # show_async and from the kernel's main thread
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
 
 
 # pylint: disable=too-few-public-methods
@@ -131,6 +238,8 @@ class AnimationTrack:
             The 4 dim array comprising of the instance variables `path`, `action`, `times` and `values`
         """
 
+        import numpy as np
+
         def tolist(obj):
             if isinstance(obj, np.ndarray):
                 return obj.tolist()
@@ -192,6 +301,9 @@ class CadViewerWidget(
     new_tree_behavior = Bool(allow_none=True, default_value=None).tag(sync=True)
     "bool: Whether to  hide the complete shape when clicking on the eye (True) or only the faces (False)"
 
+    max_live_viewers = Integer(allow_none=True, default_value=None).tag(sync=True)
+    "int: Maximum number of live cell viewers in the browser, see [set_max_live_viewers](./widget.html#cad_viewer_widget.widget.set_max_live_viewers)"
+
     #
     # Viewer traits
     #
@@ -199,9 +311,14 @@ class CadViewerWidget(
     keymap = Dict(Tuple(Unicode(), Unicode()), allow_none=True).tag(sync=True)
     "dict: Mapping of the modifier keys, defaults to {'shift': 'shiftKey', 'ctrl': 'ctrlKey', 'meta': 'metaKey'}"
 
-    shapes = Dict(allow_none=True).tag(sync=True, to_json=to_json)
+    shapes = Dict(allow_none=True).tag(sync=True, to_json=_traced_to_json)
     "unicode: Serialized nested tessellated shapes"
 
+    store = Instance(GeometryStore, allow_none=True).tag(
+        sync=True, **widgets.widget_serialization
+    )
+    "GeometryStore: Shared geometry store to render from instead of `shapes`"
+
     states = Dict(Tuple(Integer(), Integer()), allow_none=True).tag(sync=True)
     # pylint: disable=line-too-long
     "dict: State of the nested cad objects, key = object path, value = 2-dim tuple of 0/1 (hidden/visible) for object and edges"
@@ -210,6 +327,18 @@ class CadViewerWidget(
     # pylint: disable=line-too-long
     "dict: Updates to the state of the nested cad objects, key = object path, value = 2-dim tuple of 0/1 (hidden/visible) for object and edges"
 
+    lazy_parts = List(Unicode(), allow_none=True, default_value=None).tag(sync=True)
+    "list: Paths of hidden parts sent without geometry, requested by the browser when they are shown"
+
+    texture_cache = List(Unicode(), allow_none=True, default_value=None).tag(sync=True)
+    "list: Content hashes of the texture images cached by the browser, they are not sent again"
+
+    gpu_budget = Integer(allow_none=True, default_value=None).tag(sync=True)
+    "integer: GPU memory in bytes above which the geometry of long hidden parts is evicted (None: never)"
+
+    gpu_evict_after = Float(allow_none=True, default_value=None).tag(sync=True)
+    "float: Seconds a part has to be hidden before its geometry can be evicted from the GPU"
+
     tracks = List(allow_none=True).tag(sync=True)
     # pylint: disable=line-too-long
     "unicode: Serialized list of animation track arrays, see [AnimationTrack.to_array](/widget.html#cad_viewer_widget.widget.AnimationTrack.to_array)"
@@ -342,6 +471,9 @@ class CadViewerWidget(
     zoom = Float(allow_none=True).tag(sync=True)
     "float: Zoom value of the camera"
 
+    camera_link = Unicode(allow_none=True, default_value=None).tag(sync=True)
+    "unicode: Id of the camera link the viewer belongs to, see [link_cameras](./link.html)"
+
     zoom_speed = Float(allow_none=True).tag(sync=True)
     "float: Speed of zooming with the mouse"
 
@@ -366,6 +498,12 @@ class CadViewerWidget(
     result = Unicode(allow_none=True, read_only=True).tag(sync=True)
     "unicode string: JSON serialized result from Javascript"
 
+    timings = Dict(allow_none=True, read_only=True).tag(sync=True)
+    "dict: Timing spans in ms of the last `add_shapes` measured in Javascript"
+
+    gpu_memory = Dict(allow_none=True, read_only=True).tag(sync=True)
+    "dict: Bytes of geometry (per part and total) and textures on the GPU, reported by Javascript on request"
+
     #
     # Internal traitlets
     #
@@ -379,9 +517,15 @@ class CadViewerWidget(
     debug = Bool(allow_none=True, default_value=None).tag(sync=True)
     "bool: Whether to show infos in the browser console (True) or not (False)"
 
+    trace_id = Unicode(allow_none=True).tag(sync=True)
+    "unicode string: id of the `add_shapes` call the Javascript timings will be reported for"
+
     image_id = Unicode(allow_none=True).tag(sync=True)
     "unicode string: the id of the image tag to use for pin as png"
 
+    prewarm = Bool(allow_none=True, default_value=None).tag(sync=True)
+    "bool: internally used to build the Javascript viewer before the widget is displayed. Do not use!"
+
     activeTool = Unicode(allow_none=True).tag(sync=True)
     "unicode: Active measurement tool"
 
@@ -393,6 +537,100 @@ class CadViewerWidget(
 
     measure_callback = Callable(allow_none=True)
 
+    _trace = None
+    _recorder = None
+    _cached_textures = None
+
+    def start_recording(self, path):
+        """
+        Record every message to and from the browser, e.g. to profile a session offline with
+        [replay](./recorder.html#cad_viewer_widget.recorder.replay)
+
+        The recording starts with the current state of the widget.
+
+        Parameters
+        ----------
+        path : string or Path
+            File name of the recording
+        """
+        from ipywidgets.widgets.widget import _remove_buffers
+
+        self.stop_recording()
+        recorder = CommRecorder(path)
+        state, buffer_paths, buffers = _remove_buffers(self.get_state())
+        recorder.write(
+            "open",
+            {"method": "update", "state": state, "buffer_paths": buffer_paths},
+            buffers,
+        )
+        self._recorder = recorder
+
+    def stop_recording(self):
+        """
+        Stop recording
+
+        Returns
+        -------
+        dict
+            `messages` and `bytes` recorded, or None if no recording was running
+        """
+        recorder = self._recorder
+        if recorder is None:
+            return None
+        self._recorder = None
+        recorder.close()
+        return {"messages": recorder.messages, "bytes": recorder.bytes}
+
+    def _handle_msg(self, msg):
+        if self._recorder is not None:
+            self._recorder.write("in", msg["content"]["data"], msg.get("buffers"))
+        super()._handle_msg(msg)
+
+    def _strip_cached_textures(self, msg, buffers):
+        # the state keeps all texture images (for saving, exporting and new views), images the browser
+        # has cached are not sent again
+        cached = self._cached_textures
+        state = msg.get("state") or {}
+        if cached is None or cached["thread"] != threading.get_ident() or not state.get("shapes"):
+            return buffers
+
+        textures = state["shapes"].get("textures") or {}
+        paths, kept = [], []
+        for path, buffer in zip(msg.get("buffer_paths", []), buffers or []):
+            if path[:2] == ["shapes", "textures"] and path[2] in cached["keys"]:
+                textures[path[2]]["data"] = None
+            else:
+                paths.append(path)
+                kept.append(buffer)
+        msg["buffer_paths"] = paths
+        return kept
+
+    def _send(self, msg, buffers=None):
+        buffers = self._strip_cached_textures(msg, buffers)
+
+        if self._recorder is not None:
+            self._recorder.write("out", msg, buffers)
+
+        # only messages of the thread running add_shapes belong to its trace
+        trace = self._trace
+        if trace is None or trace["thread"] != threading.get_ident():
+            super()._send(msg, buffers=buffers)
+            return
+
+        # message sizes are only measured with timeit, since it requires an extra serialization
+        if trace["measure_size"]:
+            import orjson
+
+            trace["message_bytes"] += len(orjson.dumps(msg, default=str))
+            trace["message_bytes"] += sum(memoryview(b).nbytes for b in buffers or [])
+        trace["messages"] += 1
+
+        super()._send(msg, buffers=buffers)
+
+        state = msg.get("state", {})
+        if "shapes" in state or "store" in state:
+            trace["sent_at"] = time.time()
+
     @observe("result")
     def func(self, change):
         """
@@ -408,6 +646,8 @@ class CadViewerWidget(
         - If "display_id" is not present and `self.test_func` is not callable, it writes the decoded image data to a file specified by "filename".
         """
         if change["new"] is not None:
+            import orjson
+
             data = orjson.loads(change["new"])
 
             if data.get("display_id") is not None:
@@ -435,6 +675,8 @@ class CadViewerWidget(
                 self.id, {"selectedShapeIDs": change["new"]}
             )
             if status == 200:
+                import orjson
+
                 result = orjson.loads(result)
                 if result.get("success") is not None:
                     self.measure = result["success"]
@@ -465,6 +707,12 @@ class CadViewer:
         Whether to use glass mode (True) or not (False)
     pinning: bool, default: False
         Whether to allow replacing the CAD View by a canvas screenshot
+    prewarm: bool, default: False
+        Whether to build the Javascript viewer before the widget gets displayed, see
+        [ViewerPool](./pool.html#cad_viewer_widget.pool.ViewerPool)
+    comm: Comm, default: None
+        The comm of the widget, None opens a comm to the frontend, see
+        [headless_viewer](./recorder.html#cad_viewer_widget.recorder.headless_viewer)
 
     See also
     --------
@@ -488,6 +736,8 @@ class CadViewer:
         anchor=None,
         new_tree_behavior=True,
         id_=None,
+        prewarm=False,
+        comm=None,
     ):
         if cad_width < 780:
             raise ValueError("Ensure cad_width >= 780")
@@ -509,24 +759,81 @@ class CadViewer:
             up="Z",
             control="trackball",
             id=id_,
+            prewarm=prewarm,
+            comm=comm,
         )
         self.widget.test_func = None
         self.msg_id = 0
-        self.parser = get_parser()
 
         self.empty = True
         self._splash = True
         self.tracks = []
 
+        self._geometries = None
+        self._spatial_index = None
+
+        self._source = None
+        self._cache_dir = None
+        self._requests = {}
+        self._lock = threading.RLock()
+        self.widget.on_msg(self._handle_msg)
+
+        self.last_timings = None
+        self.timings_history = deque(maxlen=100)
+        self.widget.observe(self._handle_timings, names="timings")
+        self.widget.observe(self._handle_disposed, names="disposed")
+
     def register_viewer(self):
-        global VIEWER
         VIEWER[self.widget.id] = self
 
+    def _handle_disposed(self, change):
+        if change["new"]:
+            self._release()
+
+    def _release(self):
+        # drop the viewer from the registries and free its payloads, the Javascript viewer is disposed
+        if VIEWER.get(self.widget.id) is self:
+            del VIEWER[self.widget.id]
+        remove_sidecar(self)
+
+        if self._spatial_index is not None:
+            release_spatial_index(self._spatial_index)
+        self._spatial_index = None
+        self._geometries = None
+        self._source = None
+        self._requests = {}
+        self.tracks = []
+
+        # close the comm first, so that clearing the traits is not sent to the browser. The browser may
+        # not handle the disposed update before the close, its views dispose the viewer when removed
+        self.widget.stop_recording()
+        self.widget.close()
+        self.widget.shapes = None
+        self.widget.store = None
+        self.widget.tracks = None
+
+    def retained_bytes(self):
+        """
+        Bytes of the shapes payload the viewer keeps in the kernel
+
+        Returns
+        -------
+        int
+            Bytes of the arrays and texture images, 0 for shapes of a GeometryStore
+        """
+        shapes = self._source if self._source is not None else self.widget.shapes
+        if not shapes or shapes.get("shapes") is None:
+            return 0
+
+        size = estimate(shapes)["total"]["payload"]
+        for texture in (shapes.get("textures") or {}).values():
+            if texture.get("data") is not None:
+                size += len(texture["data"])
+        return size
+
     def _parse(self, string):
-        try:
-            return self.parser.parseString(string).asList()
-        except ParseException:
-            return None
+        path = parse_path(string)
+        return None if path is None else list(path)
 
     def dispose(self):
         """
@@ -535,6 +842,7 @@ class CadViewer:
 
         self.execute("viewer.dispose")
 
+    @_serialized
     def add_shapes(
         self,
         shapes,
@@ -582,7 +890,13 @@ class CadViewer:
         rotate_speed=None,
         timeit=False,
         debug=False,
+        progressive=None,
+        lazy=False,
+        gpu_budget=None,
+        gpu_evict_after=30,
+        external=None,
         _is_logo=False,
+        _progress=None,
     ):
         # pylint: disable=line-too-long
         """
@@ -590,8 +904,9 @@ class CadViewer:
 
         Parameters
         ----------
-        shapes : dict
-            Nested tessellated shapes
+        shapes : dict, GeometryStore or string
+            Nested tessellated shapes, or a shared geometry store (or its key) created by
+            [share_shapes](./store.html#cad_viewer_widget.store.share_shapes)
         tracks : list or tuple, default None
             List of animation track arrays, see [AnimationTrack.to_array](/widget.html#cad_viewer_widget.widget.AnimationTrack.to_array)
         title: str, default: None
@@ -660,6 +975,23 @@ class CadViewer:
             Speed of rotation with the mouse
         timeit : bool, default False
             Whether to output timing info to the browser console (True) or not (False)
+        progressive : bool or float, default None
+            If set, first send a preview with the parts of the largest projected size for the initial
+            camera, comprising this share of the geometry (True means 0.05), then add the geometry of
+            the other parts to it
+        lazy : bool, default False
+            Send hidden parts (`state` without 1) without geometry. The browser requests their geometry
+            when they are made visible, and only the geometry of these parts is sent and added to the scene
+        gpu_budget : int, default None
+            GPU memory in bytes for geometry. Above it, the geometry of parts hidden for longer than
+            `gpu_evict_after` is freed on the GPU and uploaded again when shown (None: no eviction)
+        gpu_evict_after : float, default 30
+            Seconds a part has to be hidden before its geometry can be evicted
+        external : bool or string, default None
+            Store the shapes in a content addressed cache directory next to the notebook (True means
+            `.cad_viewer_cache`, a string is the directory) and keep only a reference in the widget state,
+            so that saved notebooks stay small. The browser loads the shapes through the contents API of
+            the Jupyter server (JupyterLab only)
 
         Examples
         --------
@@ -816,6 +1148,11 @@ class CadViewer:
         }
         """
 
+        start = time.perf_counter()
+
+        if _progress is not None:
+            _progress("preprocess")
+
         if control == "orbit" and quaternion is not None:
             raise ValueError(
                 "Camera quaternion cannot be used with Orbit camera control"
@@ -832,6 +1169,22 @@ class CadViewer:
         if grid is None:
             grid = [False, False, False]
 
+        if isinstance(shapes, str):
+            store = get_store(shapes)
+            if store is None:
+                raise ValueError(f"Unknown geometry store '{shapes}'")
+            shapes = store
+
+        trace_id = str(uuid.uuid4())
+        trace = {
+            "to_json": 0.0,
+            "messages": 0,
+            "message_bytes": 0,
+            "measure_size": bool(timeit),
+            "sent_at": None,
+            "thread": threading.get_ident(),
+        }
+
         self.widget.debug = debug
         self.widget.initialize = True
 
@@ -841,55 +1194,133 @@ class CadViewer:
         if self.widget.aspect_ratio is None:
             self.widget.aspect_ratio = 0.75
 
-        with self.widget.hold_trait_notifications():
-            self.widget.shapes = shapes
-
-            self.widget.default_edgecolor = default_edgecolor
-            self.widget.default_opacity = default_opacity
-            self.widget.ambient_intensity = ambient_intensity
-            self.widget.direct_intensity = direct_intensity
-            self.widget.metalness = metalness
-            self.widget.roughness = roughness
-            self.widget.normal_len = normal_len
-            self.widget.control = control
-            self.widget.up = up
-            if tools is not None:
-                self.widget.tools = tools
-            if glass is not None:
-                self.widget.glass = glass
-            self.widget.new_tree_behavior = new_tree_behavior
-            self.widget.axes = axes
-            self.widget.axes0 = axes0
-            self.widget.grid = grid
-            self.widget.center_grid = center_grid
-            self.explode = explode
-            self.widget.ticks = ticks
-            self.widget.ortho = ortho
-            self.widget.transparent = transparent
-            self.widget.black_edges = black_edges
-            self.widget.collapse = collapse
-            self.widget.reset_camera = reset_camera
-            self.widget.position = position
-            self.widget.quaternion = quaternion
-            self.widget.target = target
-            self.widget.zoom = zoom
-            self.widget.zoom_speed = zoom_speed
-            self.widget.pan_speed = pan_speed
-            self.widget.rotate_speed = rotate_speed
-            self.widget.timeit = timeit
-            self.widget.clip_slider_0 = clip_slider_0
-            self.widget.clip_slider_1 = clip_slider_1
-            self.widget.clip_slider_2 = clip_slider_2
-            self.widget.clip_normal_0 = clip_normal_0
-            self.widget.clip_normal_1 = clip_normal_1
-            self.widget.clip_normal_2 = clip_normal_2
-            self.widget.clip_intersection = clip_intersection
-            self.widget.clip_planes = clip_planes
-            self.widget.clip_object_colors = clip_object_colors
-
-            self.add_tracks(tracks)
-
-        self.widget.initialize = False
+        preprocess = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        self.widget._trace = trace
+        self.widget._cached_textures = {"thread": threading.get_ident(), "keys": self._known_textures()}
+        try:
+            self._geometries = None
+            self._spatial_index = None
+
+            self._source = None
+            self._cache_dir = None
+            if external and not isinstance(shapes, GeometryStore):
+                self._cache_dir = CACHE_DIR if external is True else external
+                self._source = shapes
+
+            payload, deferred = shapes, None
+            if lazy and not isinstance(shapes, GeometryStore):
+                payload, deferred = defer_hidden(shapes)
+                self._source = shapes
+            if not isinstance(shapes, GeometryStore):
+                payload = extract_textures(payload)
+
+            preview, rest = None, None
+            if progressive and not isinstance(shapes, GeometryStore):
+                fraction = 0.05 if progressive is True else progressive
+                if _progress is not None:
+                    _progress("preview")
+                keep = preview_parts(payload, fraction, position, target, ortho)
+                if keep is not None:
+                    # the preview holds all parts, the others without geometry, which is added afterwards
+                    paths = {part["id"] for part in iter_parts(payload["shapes"])}
+                    preview, rest = defer_parts(payload, paths - keep - set(deferred or ()))
+                    self._source = shapes
+
+            if self._cache_dir is not None:
+                payload = externalize(payload, self._cache_dir)
+
+            if _progress is not None:
+                _progress("send")
+
+            with self.widget.hold_trait_notifications():
+                self.widget.trace_id = trace_id
+                if isinstance(shapes, GeometryStore):
+                    # the store replaces the own payload, don't keep (and export or save) stale shapes
+                    self.widget.shapes = None
+                    self.widget.store = shapes
+                else:
+                    self.widget.store = None
+                    self.widget.shapes = payload if preview is None else preview
+                self.widget.lazy_parts = deferred if preview is None else (deferred or []) + rest
+                self.widget.gpu_budget = gpu_budget
+                self.widget.gpu_evict_after = gpu_evict_after
+
+                self.widget.default_edgecolor = default_edgecolor
+                self.widget.default_opacity = default_opacity
+                self.widget.ambient_intensity = ambient_intensity
+                self.widget.direct_intensity = direct_intensity
+                self.widget.metalness = metalness
+                self.widget.roughness = roughness
+                self.widget.normal_len = normal_len
+                self.widget.control = control
+                self.widget.up = up
+                if tools is not None:
+                    self.widget.tools = tools
+                if glass is not None:
+                    self.widget.glass = glass
+                self.widget.new_tree_behavior = new_tree_behavior
+                self.widget.axes = axes
+                self.widget.axes0 = axes0
+                self.widget.grid = grid
+                self.widget.center_grid = center_grid
+                self.explode = explode
+                self.widget.ticks = ticks
+                self.widget.ortho = ortho
+                self.widget.transparent = transparent
+                self.widget.black_edges = black_edges
+                self.widget.collapse = collapse
+                self.widget.reset_camera = reset_camera
+                self.widget.position = position
+                self.widget.quaternion = quaternion
+                self.widget.target = target
+                self.widget.zoom = zoom
+                self.widget.zoom_speed = zoom_speed
+                self.widget.pan_speed = pan_speed
+                self.widget.rotate_speed = rotate_speed
+                self.widget.timeit = timeit
+                self.widget.clip_slider_0 = clip_slider_0
+                self.widget.clip_slider_1 = clip_slider_1
+                self.widget.clip_slider_2 = clip_slider_2
+                self.widget.clip_normal_0 = clip_normal_0
+                self.widget.clip_normal_1 = clip_normal_1
+                self.widget.clip_normal_2 = clip_normal_2
+                self.widget.clip_intersection = clip_intersection
+                self.widget.clip_planes = clip_planes
+                self.widget.clip_object_colors = clip_object_colors
+
+                self.add_tracks(tracks)
+
+            self.widget.initialize = False
+
+            if preview is not None:
+                if _progress is not None:
+                    _progress("send_full")
+                if self._cache_dir is not None:
+                    # the saved widget state has to reference the full shapes in the cache directory
+                    self.widget.initialize = True
+                    with self.widget.hold_trait_notifications():
+                        self.widget.lazy_parts = deferred
+                        self.widget.shapes = payload
+                    self.widget.initialize = False
+                else:
+                    # add the geometry of the other parts to the preview, the camera is kept
+                    self._load_parts(rest)
+        finally:
+            self.widget._trace = None
+            self.widget._cached_textures = None
+
+        self._add_timings(
+            trace_id,
+            {
+                "preprocess": preprocess,
+                "to_json": trace["to_json"],
+                "send": (time.perf_counter() - start) * 1000 - trace["to_json"],
+                "messages": trace["messages"],
+                "message_bytes": trace["message_bytes"] if timeit else None,
+                "sent_at": trace["sent_at"],
+            },
+        )
 
         if tools is not None:
             self.widget.tools = tools
@@ -900,6 +1331,251 @@ class CadViewer:
         if not _is_logo:
             self._splash = False
 
+    #
+    # Geometry
+    #
+
+    def geometry(self, path):
+        """
+        Get the decoded geometry of a part of the current shapes
+
+        The part is decoded on first access and cached until new shapes are added. Parts referencing the
+        same instance share their geometry.
+
+        Parameters
+        ----------
+        path : string
+            The id of the part, e.g. `/Group/Part_0`
+
+        Returns
+        -------
+        ShapeGeometry
+            Numpy arrays and face/edge offset tables of the part, see
+            [ShapeGeometry](./geometry.html#cad_viewer_widget.geometry.ShapeGeometry)
+        """
+        return self._get_geometries()[path]
+
+    def _handle_msg(self, _widget, content, buffers):
+        kind = content.get("type")
+        if kind == "request_geometry":
+            # don't block the shell thread with collecting and sending the geometry, the single worker
+            # also runs it after shapes still being sent in the background
+            get_executor().submit(self._load_parts, content.get("paths") or [])
+        elif kind in (
+            "frame",
+            "frames_done",
+            "frames_error",
+            "thumbnails",
+            "thumbnails_error",
+            "tour_done",
+        ):
+            # results of render_frames, thumbnails and camera tours
+            handle = self._requests.get(content.get("id"))
+            if handle is not None:
+                handle._receive(content, buffers)
+                if handle.done():
+                    del self._requests[content["id"]]
+
+    @_serialized
+    def _load_parts(self, paths):
+        # send the geometry of the requested deferred parts only, the browser adds it to the rendered scene
+        from ipywidgets.widgets.widget import _remove_buffers
+
+        lazy_parts = self.widget.lazy_parts or []
+        if self._source is None or not lazy_parts:
+            return
+        paths = set(paths) & set(lazy_parts)
+        if not paths:
+            return
+
+        payload = select_parts(self._source, paths)
+        data, buffer_paths, buffers = _remove_buffers(to_json(payload, self.widget))
+        self.widget.lazy_parts = [path for path in lazy_parts if path not in paths]
+        self.widget.send(
+            {"type": "part_geometry", "data": data, "buffer_paths": buffer_paths},
+            buffers=buffers,
+        )
+
+    def _known_textures(self):
+        # externalized shapes are loaded by a fresh browser, they need all images
+        if self._cache_dir is not None:
+            return set()
+        return set(self.widget.texture_cache or [])
+
+    def _get_shapes(self):
+        if self._source is not None:
+            return self._source
+        if self.widget.store is not None:
+            shapes = self.widget.store.shapes
+        else:
+            shapes = self.widget.shapes
+        if not shapes:
+            raise RuntimeError("No shapes added to the viewer")
+        return shapes
+
+    def _get_geometries(self):
+        if self._geometries is None:
+            self._geometries = GeometryCache(self._get_shapes())
+        return self._geometries
+
+    @property
+    def spatial_index(self):
+        """
+        Get the spatial index over the parts of the current shapes. It is built on first use and
+        cached per content of the shapes, see [SpatialIndex](./spatial.html#cad_viewer_widget.spatial.SpatialIndex)
+        """
+        if self._spatial_index is None:
+            self._spatial_index = get_spatial_index(self._get_shapes(), self._get_geometries())
+        return self._spatial_index
+
+    def ray_pick(self, origin, direction):
+        """
+        Find the first triangle of the current shapes hit by a ray, without a browser round trip
+
+        Parameters
+        ----------
+        origin : 3-dim list of float
+            Start point of the ray in world coordinates
+        direction : 3-dim list of float
+            Direction of the ray
+
+        Returns
+        -------
+        dict or None
+            `path`, `distance`, `point`, `face` and `triangle` of the hit, or None
+        """
+        return self.spatial_index.ray_pick(origin, direction)
+
+    def parts_in_box(self, bbox, inside=False):
+        """
+        Find the parts whose bounding boxes intersect (or lie inside) a box
+
+        Parameters
+        ----------
+        bbox : dict or tuple
+            The box as `{"xmin": ..., "xmax": ..., "ymin": ..., ...}` or `((xmin, ymin, zmin), (xmax, ymax, zmax))`
+        inside : bool, default: False
+            Whether to only return parts completely inside the box
+
+        Returns
+        -------
+        list of string
+            The paths of the parts
+        """
+        return self.spatial_index.parts_in_box(bbox, inside)
+
+    def nearest_part(self, point):
+        """
+        Find the part closest to a point
+
+        Parameters
+        ----------
+        point : 3-dim list of float
+            The point in world coordinates
+
+        Returns
+        -------
+        dict or None
+            `path`, `distance` and the closest `point` on the part
+        """
+        return self.spatial_index.nearest_part(point)
+
+    #
+    # Timings
+    #
+
+    def _add_timings(self, trace_id, spans):
+        self.last_timings = {
+            "trace_id": trace_id,
+            "timestamp": time.time(),
+            "python": spans,
+            "js": None,
+        }
+        self.timings_history.append(self.last_timings)
+
+    def _handle_timings(self, change):
+        timings = change["new"]
+        if not timings:
+            return
+
+        for record in reversed(self.timings_history):
+            if record["trace_id"] == timings.get("trace_id"):
+                spans = dict(timings.get("spans", {}))
+                received_at = timings.get("received_at")
+                sent_at = record["python"]["sent_at"]
+                if received_at is not None and sent_at is not None:
+                    # only meaningful when browser and kernel share the clock
+                    spans["transfer"] = received_at - sent_at * 1000
+                record["js"] = spans
+                break
+
+    @property
+    def timings(self):
+        """
+        Get the timing history of the last 100 `add_shapes` calls (oldest first).
+        Every record has the Python spans (ms) `preprocess`, `to_json`, `send`, the number and size (only
+        with `timeit=True`) of the messages, and the Javascript spans (ms) `receive`, `decode`, `render`,
+        `add_shapes`, `first_frame` and `transfer` once reported back by the browser (else None)
+        """
+        return list(self.timings_history)
+
+    def memory_report(self, budget=None):
+        """
+        Get the memory the current shapes need in the kernel, on the wire and on the GPU
+
+        The kernel and wire sizes are computed from the shapes, see
+        [estimate](./memory.html#cad_viewer_widget.memory.estimate). The GPU sizes measured by the browser
+        need a round trip: every call requests a new browser report, but returns right away with the
+        report of the previous call (the kernel can't wait for the reply while the cell runs). Call it
+        again in a later cell to get the figures of the current shapes. `browser` is None for the first
+        call and when the previous report belongs to earlier shapes.
+
+        Parameters
+        ----------
+        budget : int, default: None
+            GPU memory in bytes, adds the parts to leave out to fit as `over_budget`
+
+        Returns
+        -------
+        dict
+            The estimate, `messages` with the bytes sent by the last `add_shapes` (only measured with
+            `timeit=True`) and `browser` with {"parts": {path: bytes}, "geometries": bytes,
+            "textures": bytes, "geometry_count": int, "texture_count": int, "trace_id": string,
+            "reported_at": epoch ms} measured on the GPU for the previous call
+        """
+        report = estimate(self._get_shapes(), budget)
+        python = self.last_timings["python"] if self.last_timings is not None else {}
+        report["messages"] = python.get("message_bytes")
+        browser = self.widget.gpu_memory
+        if browser is not None and browser.get("trace_id") != self.widget.trace_id:
+            browser = None
+        report["browser"] = browser
+        self.execute("reportMemory")
+        return report
+
+    def start_recording(self, path):
+        """
+        Record the comm traffic of the viewer to a file, see
+        [CadViewerWidget.start_recording](./widget.html#cad_viewer_widget.widget.CadViewerWidget.start_recording)
+
+        Parameters
+        ----------
+        path : string or Path
+            File name of the recording
+        """
+        self.widget.start_recording(path)
+
+    def stop_recording(self):
+        """
+        Stop recording the comm traffic of the viewer
+
+        Returns
+        -------
+        dict
+            `messages` and `bytes` recorded, or None if no recording was running
+        """
+        return self.widget.stop_recording()
+
     def update_camera_location(self):
         """Sync position, quaternion and zoom of camera to Python"""
         self.execute("updateCamera", [])
@@ -925,6 +1601,8 @@ class CadViewer:
         for k, v in states.items():
             if old_states.get(k) is not None:
                 new_states[k] = v
+        # deferred parts need their geometry before they can be shown
+        self._load_parts([k for k, v in new_states.items() if 1 in v])
         self.widget.state_updates = new_states
 
     @property
@@ -1637,6 +2315,125 @@ class CadViewer:
         print(f"Saving CAD view to {path}")
         self.execute("saveAsPng", str(path))
 
+    def render_frames(
+        self,
+        fps=30,
+        start=0,
+        end=None,
+        size=None,
+        format="png",
+        directory=None,
+        quality=0.92,
+    ):
+        """
+        Render the animation frame by frame in the browser, e.g. to create a video
+
+        The browser sets the animation clip of the tracks added with `add_tracks` to the time of every
+        frame explicitly (independent of the display frame rate and of `animation_speed`), renders it and
+        sends the encoded image as binary buffer. The frames arrive while the kernel is idle, i.e. after
+        the calling cell has finished.
+
+        Parameters
+        ----------
+        fps : float, default: 30
+            Frames per second of animation time
+        start : float, default: 0
+            Animation time of the first frame in seconds
+        end : float, default: None
+            Animation time in seconds where rendering stops (exclusive), the end of the longest track if None
+        size : tuple of int, default: None
+            (width, height) of the frames in pixels, the size of the canvas if None
+        format : string, default: "png"
+            Image format, "png", "jpeg" or "webp"
+        directory : string or Path, default: None
+            Write the frames to this directory as they arrive instead of keeping them in memory
+        quality : float, default: 0.92
+            Quality of "jpeg" and "webp" frames between 0 and 1
+
+        Returns
+        -------
+        FrameSequence
+            Handle collecting the frames, see [FrameSequence](./frames.html#cad_viewer_widget.frames.FrameSequence)
+        """
+        if not self.tracks:
+            raise ValueError("No animation tracks, add them with add_tracks first")
+        if format not in ("png", "jpeg", "webp"):
+            raise ValueError(
+                f"{format} is not a valid image format ['png', 'jpeg', 'webp']"
+            )
+        if fps <= 0:
+            raise ValueError("fps needs to be positive")
+
+        if end is None:
+            end = max(max(track.times) for track in self.tracks)
+        if end <= start:
+            raise ValueError("end needs to be larger than start")
+
+        width, height = (None, None) if size is None else size
+        count = max(1, round((end - start) * fps))
+        sequence = FrameSequence(count, fps, format, directory)
+        id_ = str(uuid.uuid4())
+        self._requests[id_] = sequence
+
+        # the tracks travel with the request, state updates could be applied after the browser handles it
+        tracks = [track.to_array() for track in self.tracks]
+        self.execute(
+            "renderFrames",
+            [id_, tracks, fps, start, end, width, height, format, quality],
+        )
+        return sequence
+
+    def thumbnails(
+        self, paths=None, size=(128, 128), direction="iso", format="png", quality=0.92
+    ):
+        """
+        Render a thumbnail of every part, isolated and framed, in one pass in the browser
+
+        The browser hides all other parts and renders every path with its own camera framing the part into
+        an offscreen render target, so the view itself doesn't change, then sends all images in one
+        binary message. They arrive while the kernel is idle, i.e. after the calling cell has finished.
+        Paths whose parts are all hidden are skipped, see `ThumbnailBatch.skipped`.
+
+        Parameters
+        ----------
+        paths : list of string, default: None
+            Paths of parts or groups, all parts with geometry if None
+        size : tuple of int, default: (128, 128)
+            (width, height) of the thumbnails in pixels
+        direction : string, default: "iso"
+            Camera direction, one of ["iso", "top", "bottom", "left", "right", "front", "rear"]
+        format : string, default: "png"
+            Image format, "png", "jpeg" or "webp"
+        quality : float, default: 0.92
+            Quality of "jpeg" and "webp" images between 0 and 1
+
+        Returns
+        -------
+        ThumbnailBatch
+            Handle collecting the images, see [ThumbnailBatch](./thumbnails.html#cad_viewer_widget.thumbnails.ThumbnailBatch)
+        """
+        directions = ["iso", "top", "bottom", "left", "right", "front", "rear"]
+        if direction not in directions:
+            raise ValueError(f"{direction} is not a valid direction {directions}")
+        if format not in ("png", "jpeg", "webp"):
+            raise ValueError(
+                f"{format} is not a valid image format ['png', 'jpeg', 'webp']"
+            )
+
+        index = self.spatial_index
+        spheres = part_spheres(index, index.paths if paths is None else paths)
+        batch = ThumbnailBatch([sphere["path"] for sphere in spheres], format)
+
+        # the browser renders after the pending state updates have been applied and requests the
+        # geometry of deferred parts first
+        id_ = str(uuid.uuid4())
+        self._requests[id_] = batch
+        width, height = size
+        self.execute(
+            "thumbnails", [id_, spheres, width, height, direction, format, quality]
+        )
+        return batch
+
     #
     # Tab handling
     #
@@ -1740,6 +2537,93 @@ class CadViewer:
             raise NameError("rotateLeft only works for orbit control")
         self.execute("viewer.controls.rotateLeft", (angle,))
 
+    #
+    # Camera tours
+    #
+
+    def fly_to(
+        self,
+        position=None,
+        target=None,
+        quaternion=None,
+        zoom=None,
+        duration=1.0,
+        easing="ease-in-out",
+    ):
+        """
+        Move the camera smoothly to a new location, interpolated by the browser in its render loop
+
+        Missing values are kept. With trackball control and without `quaternion` the camera keeps looking
+        at the target. The move sends no camera updates to Python, only the final camera and one
+        completion message.
+
+        Parameters
+        ----------
+        position : 3-dim list of float, default: None
+            Camera position
+        target : 3-dim list of float, default: None
+            Camera look at target
+        quaternion : 4-dim list of float, default: None
+            Camera orientation as quaternion, ignored for orbit control
+        zoom : float, default: None
+            Zoom factor of view
+        duration : float, default: 1.0
+            Duration of the move in seconds
+        easing : string, default: "ease-in-out"
+            One of "linear", "ease-in", "ease-out", "ease-in-out"
+
+        Returns
+        -------
+        CameraTour
+            Handle reporting the end of the move, see [CameraTour](./tour.html#cad_viewer_widget.tour.CameraTour)
+        """
+        keyframe = {
+            "position": position,
+            "target": target,
+            "quaternion": quaternion,
+            "zoom": zoom,
+            "duration": duration,
+            "easing": easing,
+        }
+        return self.play_tour([keyframe])
+
+    def play_tour(self, keyframes, loop=False):
+        """
+        Move the camera along a sequence of keyframes, interpolated by the browser in its render loop
+
+        A running tour is stopped first. A click into the view stops the tour as well.
+
+        Parameters
+        ----------
+        keyframes : list of dict
+            The camera at the end of every move: `position`, `target`, `quaternion`, `zoom` (missing
+            values are kept from the previous keyframe), `duration` of the move and `hold` time afterwards
+            in seconds (default 1.0 and 0.0), and the `easing` (default "ease-in-out"), see
+            [check_keyframe](./tour.html#cad_viewer_widget.tour.check_keyframe)
+        loop : bool, default: False
+            Whether to repeat the tour until `stop_tour` is called, e.g. for kiosk demos
+
+        Returns
+        -------
+        CameraTour
+            Handle reporting the end of the tour, see [CameraTour](./tour.html#cad_viewer_widget.tour.CameraTour)
+        """
+        if len(keyframes) == 0:
+            raise ValueError("A tour needs at least one keyframe")
+        checked = [check_keyframe(keyframe) for keyframe in keyframes]
+
+        tour = CameraTour(checked, loop)
+        id_ = str(uuid.uuid4())
+        self._requests[id_] = tour
+        self.execute("playTour", [id_, checked, loop])
+        return tour
+
+    def stop_tour(self):
+        """
+        Stop the running camera tour, the camera stays where it is
+        """
+        self.execute("stopTour")
+
     #
     # Exports
     #
@@ -1758,24 +2642,47 @@ class CadViewer:
         Notes:
         - This method temporarily disables pinning while exporting the HTML.
         - The state of the widget is captured and embedded in the HTML file.
+        - Externalized shapes and deferred parts are embedded with their full geometry, since the HTML
+          file can neither load the cache directory nor request geometry from Python.
         """
         if not (self.widget.title is None or self.widget.title == ""):
             raise RuntimeError(
                 "Export_html does not work with sidecar. Show the object again in a cell viewer"
             )
 
+        from ipywidgets.embed import embed_minimal_html, dependency_state
+
         pinning = self.pinning
         self.pinning = False
 
+        state = dependency_state(self.widget)
+        if self._source is not None:
+            self._inline_shapes(state[self.widget.model_id])
+
         embed_minimal_html(
             filename,
             title=title,
             views=[self.widget],
-            state=dependency_state(self.widget),
+            state=state,
         )
 
         self.pinning = pinning
 
+    def _inline_shapes(self, embed_state):
+        # replace the external reference or the payload with deferred parts by the full payload
+        from ipywidgets.widgets.widget import _remove_buffers
+
+        payload = extract_textures(self._source)
+        state, buffer_paths, buffers = _remove_buffers({"shapes": to_json(payload, self.widget)})
+        embed_state["state"]["shapes"] = state["shapes"]
+        embed_state["state"]["lazy_parts"] = None
+        embed_state["buffers"] = [
+            buffer for buffer in embed_state.get("buffers", []) if buffer["path"][0] != "shapes"
+        ] + [
+            {"encoding": "base64", "path": path, "data": base64.standard_b64encode(buffer).decode("ascii")}
+            for path, buffer in zip(buffer_paths, buffers)
+        ]
+
     #
     # Custom message handling
     #
@@ -1879,6 +2786,7 @@ class CadViewer:
                 {
                     "keymap": self.widget.keymap,
                     "shapes": self.widget.shapes,
+                    "store": self.widget.store,
                     "normal_len": self.widget.normal_len,
                     "timeit": self.widget.timeit,
                     "new_tree_behavior": self.widget.new_tree_behavior,
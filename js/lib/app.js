@@ -1,7 +1,11 @@
 var _shell = null;
+var _serviceManager = null;
 var _sidecars = {};
 var _cellViewers = {};
+var _cellUsage = {};
+var _warmViewers = new Set();
 var _currentCadViewer = null;
+var _cameraLinks = {};
 
 export default {
   getCadViewers() {
@@ -35,14 +39,45 @@ export default {
   addCellViewer(id, viewer) {
     _currentCadViewer = viewer;
     _cellViewers[id] = viewer;
+    _cellUsage[id] = performance.now();
     console.log(`cad-viewer-widget: Cell viewer ${id} created`);
   },
 
+  touchCellViewer(id) {
+    _cellUsage[id] = performance.now();
+  },
+
+  addWarmViewer(id) {
+    _warmViewers.add(id);
+  },
+
+  removeWarmViewer(id) {
+    _warmViewers.delete(id);
+  },
+
+  evictCellViewers(limit) {
+    // suspend the least recently used cell viewers beyond limit to free their
+    // WebGL contexts, prewarmed viewers of the pool hold a context, too
+    if (limit == null) return;
+    const live = Object.keys(_cellViewers).filter((id) =>
+      _cellViewers[id].isLive()
+    );
+    const budget = Math.max(limit - _warmViewers.size, 1);
+    if (live.length <= budget) return;
+
+    live.sort((a, b) => _cellUsage[a] - _cellUsage[b]);
+    for (const id of live.slice(0, live.length - budget)) {
+      _cellViewers[id].suspend();
+      console.log(`cad-viewer-widget: Cell viewer "${id}" suspended`);
+    }
+  },
+
   cleanupCellViewers() {
     for (const [id, viewer] of Object.entries(_cellViewers)) {
       if (document.getElementById(id) == null) {
         viewer.dispose();
         delete _cellViewers[id];
+        delete _cellUsage[id];
         console.log(`cad-viewer-widget: Cell viewer "${id}" removed`);
       }
     }
@@ -50,6 +85,28 @@ export default {
 
   removeCellViewer(id) {
     delete _cellViewers[id];
+    delete _cellUsage[id];
+  },
+
+  linkCamera(link, view) {
+    if (_cameraLinks[link] == null) {
+      _cameraLinks[link] = new Set();
+    }
+    _cameraLinks[link].add(view);
+  },
+
+  unlinkCamera(link, view) {
+    const views = _cameraLinks[link];
+    if (views != null) {
+      views.delete(view);
+      if (views.size === 0) {
+        delete _cameraLinks[link];
+      }
+    }
+  },
+
+  getLinkedViews(link) {
+    return _cameraLinks[link] != null ? Array.from(_cameraLinks[link]) : [];
   },
 
   setShell(shell) {
@@ -58,5 +115,13 @@ export default {
 
   getShell() {
     return _shell;
+  },
+
+  setServiceManager(serviceManager) {
+    _serviceManager = serviceManager;
+  },
+
+  getServiceManager() {
+    return _serviceManager;
   }
 };
@@ -7,6 +7,6 @@
 // Export widget models and views, and the npm package version number.
 
 // eslint-disable-next-line no-undef
-module.exports = require("./widget.js");
+module.exports = {...require("./widget.js"), ...require("./store.js")};
 // eslint-disable-next-line no-undef
 module.exports["version"] = require("../package.json").version;
@@ -4,9 +4,11 @@
 var widgetExports = require("./widget.js");
 // eslint-disable-next-line no-undef
 var sidecarExports = require("./sidecar.js");
+// eslint-disable-next-line no-undef
+var storeExports = require("./store.js");
 
 // eslint-disable-next-line no-undef
-module.exports = {...widgetExports, ...sidecarExports};
+module.exports = {...widgetExports, ...sidecarExports, ...storeExports};
 
 // eslint-disable-next-line no-undef
 module.exports["version"] = require("../package.json").version;
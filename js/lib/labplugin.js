@@ -21,6 +21,7 @@ const cadViewerWidget = {
     );
 
     App.setShell(app.shell);
+    App.setServiceManager(app.serviceManager);
   },
   autoStart: true
 };
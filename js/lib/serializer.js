@@ -26,8 +26,137 @@ function fromB64(s) {
   return uint;
 }
 
+function toB64(bytes) {
+  // String.fromCharCode takes a limited number of arguments, so encode in chunks
+  var binary = "";
+  for (var i = 0; i < bytes.length; i += 0x8000) {
+      binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+  }
+  return btoa(binary);
+}
+
+class TextureCache extends Map {
+  // base64 images by content hash. trim() drops the least recently used ones
+  // above maxBytes, images of the shapes being decoded must stay until resolved
+  constructor(maxBytes) {
+      super();
+      this.maxBytes = maxBytes;
+      this.bytes = 0;
+      // changes with every added or dropped image, to sync the keys to Python
+      this.version = 0;
+  }
+
+  get(key) {
+      const value = super.get(key);
+      if (value !== undefined) {
+          super.delete(key);
+          super.set(key, value);
+      }
+      return value;
+  }
+
+  set(key, value) {
+      this.delete(key);
+      super.set(key, value);
+      this.bytes += value.length;
+      this.version++;
+      return this;
+  }
+
+  delete(key) {
+      const value = super.get(key);
+      if (value === undefined) return false;
+      this.bytes -= value.length;
+      this.version++;
+      return super.delete(key);
+  }
+
+  clear() {
+      super.clear();
+      this.bytes = 0;
+      this.version++;
+  }
+
+  trim() {
+      for (const key of this.keys()) {
+          if (this.bytes <= this.maxBytes) break;
+          this.delete(key);
+      }
+  }
+}
+
+function decodeTextures(textures, textureCache) {
+  // binary texture images are cached as base64 by content hash across decode calls
+  for (var key in textures) {
+      var image = textures[key];
+      if (textureCache.has(key) || image.data == null) {
+          continue;
+      }
+      var bytes;
+      if (typeof image.data.buffer == "string") {
+          bytes = image.data.codec === "b64" ? fromB64(image.data.buffer) : fromHex(image.data.buffer);
+      } else {
+          var view = image.data.buffer;
+          bytes = new Uint8Array(view.buffer, view.byteOffset, view.byteLength);
+      }
+      textureCache.set(key, toB64(bytes));
+  }
+}
 
-function decode(data) {
+function restoreTextures(textures, textureCache) {
+  // images cached by the browser are sent without data, put it back into the
+  // model state, so that saved widget state and new views hold every image
+  for (var key in textures) {
+      var image = textures[key];
+      if (image.data == null && textureCache.has(key)) {
+          var bytes = fromB64(textureCache.get(key));
+          image.data = {
+              shape: [bytes.length],
+              dtype: "uint8",
+              buffer: new DataView(bytes.buffer)
+          };
+      }
+  }
+}
+
+function parseContainer(bytes) {
+  // binary shapes container written by cad_viewer_widget.save_shapes:
+  // magic (8 bytes), version (uint32), header length (uint64), JSON header, arrays aligned to 64 bytes
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  const magic = String.fromCharCode.apply(null, bytes.subarray(0, 8));
+  if (magic !== "CVWSHAPE") {
+      throw new Error("Not a shapes container");
+  }
+  const headerLength = Number(view.getBigUint64(12, true));
+  const header = JSON.parse(new TextDecoder().decode(bytes.subarray(20, 20 + headerLength)));
+  const dataStart = Math.ceil((20 + headerLength) / 64) * 64;
+
+  function walk(obj) {
+      if (Array.isArray(obj)) {
+          return obj.map(walk);
+      } else if (obj != null && typeof obj === "object") {
+          if (obj.__array__ !== undefined) {
+              const entry = header.arrays[obj.__array__];
+              return {
+                  shape: entry.shape,
+                  dtype: entry.dtype,
+                  buffer: new DataView(bytes.buffer, bytes.byteOffset + dataStart + entry.offset, entry.nbytes)
+              };
+          }
+          const result = {};
+          for (const key in obj) {
+              result[key] = walk(obj[key]);
+          }
+          return result;
+      }
+      return obj;
+  }
+
+  // a fresh tree for every call, since decode converts it in place
+  return walk(header.shapes);
+}
+
+function decode(data, textureCache = new Map()) {
   function convert(obj) {
       var result;
       if (typeof obj.buffer == "string") {
@@ -46,6 +175,20 @@ function decode(data) {
           } else {
               console.log("Error: unknown dtype", obj.dtype);
           }
+      } else if (ArrayBuffer.isView(obj.buffer)) {
+          // binary comm buffer (e.g. numpy arrays of memory mapped containers)
+          var view = obj.buffer;
+          var bytes = obj.dtype === "float32" || obj.dtype.endsWith("int32") ? 4 : 1;
+          if (view.byteOffset % bytes !== 0) {
+              view = new Uint8Array(view.buffer, view.byteOffset, view.byteLength).slice();
+          }
+          if (obj.dtype === "float32") {
+              result = new Float32Array(view.buffer, view.byteOffset, view.byteLength / 4);
+          } else if (obj.dtype === "int32" || obj.dtype === "uint32") {
+              result = new Uint32Array(view.buffer, view.byteOffset, view.byteLength / 4);
+          } else {
+              console.log("Error: unknown dtype", obj.dtype);
+          }
       } else if (Array.isArray(obj)) {
           result = [];
           for (var arr of obj) {
@@ -83,6 +226,12 @@ function decode(data) {
           } else if (attr === "type") {
               type = obj.type;
 
+          } else if (attr === "texture") {
+              var image = obj.texture != null ? obj.texture.image : null;
+              if (image != null && image.ref !== undefined) {
+                  obj.texture.image = { format: image.format, data: textureCache.get(image.ref) };
+              }
+
           } else if (attr === "shape") {
               if (type === "shapes") {
                   if (obj.shape.ref === undefined) {
@@ -114,6 +263,11 @@ function decode(data) {
   
   const instances = data.data.instances;
 
+  if (data.data.textures != null) {
+      decodeTextures(data.data.textures, textureCache);
+      data.data.textures = null;
+  }
+
   data.data.instances.forEach((instance) => {
       instance.vertices = convert(instance.vertices);
       instance.obj_vertices = convert(instance.obj_vertices);
@@ -131,4 +285,4 @@ function decode(data) {
   data.data.instances = []
 }
 
-export { decode };
+export { TextureCache, decode, fromB64, parseContainer, restoreTextures };
@@ -0,0 +1,45 @@
+import { WidgetModel } from "@jupyter-widgets/base";
+
+import { decode } from "./serializer.js";
+import { cloneTree } from "./utils.js";
+import { _module, _version } from "./version.js";
+
+export class CadViewerGeometryStoreModel extends WidgetModel {
+  defaults() {
+    return {
+      ...super.defaults(),
+      _model_name: "CadViewerGeometryStoreModel",
+      _model_module: _module,
+      _model_module_version: _version,
+      _view_name: null,
+      _view_module: null,
+      _view_module_version: "",
+
+      key: null,
+      shapes: null
+    };
+  }
+
+  initialize(attributes, options) {
+    super.initialize(attributes, options);
+    this.decoded = null;
+    this.on("change:shapes", this.invalidate, this);
+  }
+
+  invalidate() {
+    this.decoded = null;
+  }
+
+  getShapes() {
+    // decode only once for all viewers referencing this store
+    if (this.decoded == null) {
+      const shapes = { data: this.get("shapes") };
+      decode(shapes);
+      this.decoded = shapes["data"]["shapes"];
+      console.debug(`cad-viewer-widget: Geometry store "${this.get("key")}" decoded`);
+    }
+    // the viewer modifies the shapes tree when rendering and disposing, so every
+    // viewer gets its own tree sharing the decoded buffers
+    return cloneTree(this.decoded);
+  }
+}
@@ -65,4 +65,115 @@ function normalize(v) {
   return [v[0] / n, v[1] / n, v[2] / n];
 }
 
-export { extend, isThreeType, isTolEqual, length, normalize };
+function cloneTree(obj) {
+  // copy the nested structure, but share typed arrays (the geometry buffers)
+  if (obj == null || typeof obj !== "object" || ArrayBuffer.isView(obj)) {
+    return obj;
+  }
+  if (Array.isArray(obj)) {
+    return obj.map((el) => cloneTree(el));
+  }
+  var result = {};
+  Object.keys(obj).forEach((key) => {
+    result[key] = cloneTree(obj[key]);
+  });
+  return result;
+}
+
+function joinPath(dir, path) {
+  // join two server relative paths and resolve "." and ".."
+  const parts = [];
+  for (const part of `${dir}/${path}`.split("/")) {
+    if (part === "" || part === ".") continue;
+    if (part === "..") {
+      parts.pop();
+    } else {
+      parts.push(part);
+    }
+  }
+  return parts.join("/");
+}
+
+// easing functions of camera tours, t in [0, 1]
+const EASINGS = {
+  linear: (t) => t,
+  "ease-in": (t) => t * t * t,
+  "ease-out": (t) => 1 - Math.pow(1 - t, 3),
+  "ease-in-out": (t) =>
+    t < 0.5 ? 4 * t * t * t : 1 - Math.pow(-2 * t + 2, 3) / 2
+};
+
+function lerp(a, b, t) {
+  return a.map((v, i) => v + (b[i] - v) * t);
+}
+
+function slerp(q0, q1, t) {
+  // spherical interpolation of quaternions [x, y, z, w] along the shorter arc
+  var dot = q0[0] * q1[0] + q0[1] * q1[1] + q0[2] * q1[2] + q0[3] * q1[3];
+  if (dot < 0) {
+    q1 = q1.map((v) => -v);
+    dot = -dot;
+  }
+  if (dot > 0.9995) {
+    const q = lerp(q0, q1, t);
+    const n = Math.sqrt(q[0] * q[0] + q[1] * q[1] + q[2] * q[2] + q[3] * q[3]);
+    return q.map((v) => v / n);
+  }
+  const theta0 = Math.acos(dot);
+  const theta = theta0 * t;
+  const s1 = Math.sin(theta) / Math.sin(theta0);
+  const s0 = Math.cos(theta) - dot * s1;
+  return q0.map((v, i) => s0 * v + s1 * q1[i]);
+}
+
+function cross(a, b) {
+  return [
+    a[1] * b[2] - a[2] * b[1],
+    a[2] * b[0] - a[0] * b[2],
+    a[0] * b[1] - a[1] * b[0]
+  ];
+}
+
+function lookAtQuaternion(position, target, up) {
+  // orientation of a camera at position looking at target (null if along up)
+  const z = normalize([0, 1, 2].map((i) => position[i] - target[i]));
+  const side = cross(up, z);
+  if (length(side) < 1e-9) return null;
+  const x = normalize(side);
+  const y = cross(z, x);
+
+  // rotation matrix with the columns x, y, z to quaternion
+  const [m00, m01, m02] = [x[0], y[0], z[0]];
+  const [m10, m11, m12] = [x[1], y[1], z[1]];
+  const [m20, m21, m22] = [x[2], y[2], z[2]];
+  const trace = m00 + m11 + m22;
+  var s;
+  if (trace > 0) {
+    s = 0.5 / Math.sqrt(trace + 1);
+    return [(m21 - m12) * s, (m02 - m20) * s, (m10 - m01) * s, 0.25 / s];
+  } else if (m00 > m11 && m00 > m22) {
+    s = 2 * Math.sqrt(1 + m00 - m11 - m22);
+    return [0.25 * s, (m01 + m10) / s, (m02 + m20) / s, (m21 - m12) / s];
+  } else if (m11 > m22) {
+    s = 2 * Math.sqrt(1 + m11 - m00 - m22);
+    return [(m01 + m10) / s, 0.25 * s, (m12 + m21) / s, (m02 - m20) / s];
+  } else {
+    s = 2 * Math.sqrt(1 + m22 - m00 - m11);
+    return [(m02 + m20) / s, (m12 + m21) / s, 0.25 * s, (m10 - m01) / s];
+  }
+}
+
+export {
+  EASINGS,
+  cross,
+  lerp,
+  lookAtQuaternion,
+  slerp,
+  extend,
+  isThreeType,
+  isTolEqual,
+  length,
+  normalize,
+  cloneTree,
+  joinPath
+};
@@ -1,16 +1,294 @@
-import { DOMWidgetModel, DOMWidgetView } from "@jupyter-widgets/base";
+import {
+  DOMWidgetModel,
+  DOMWidgetView,
+  put_buffers,
+  unpack_models
+} from "@jupyter-widgets/base";
 
 import { Viewer, Display, Timer } from "three-cad-viewer";
-
-import { decode } from "./serializer.js";
-import { isTolEqual, length, normalize } from "./utils.js";
+import { WebGLRenderTarget } from "three";
+
+import {
+  TextureCache,
+  decode,
+  fromB64,
+  parseContainer,
+  restoreTextures
+} from "./serializer.js";
+import {
+  EASINGS,
+  cloneTree,
+  isTolEqual,
+  joinPath,
+  length,
+  lerp,
+  lookAtQuaternion,
+  normalize,
+  slerp
+} from "./utils.js";
 import { _module, _version } from "./version.js";
 
 import "../style/index.css";
 
 import App from "./app.js";
 
+// quiet period (ms) after the last resize event before the new size is sent to Python
+const RESIZE_SYNC_DELAY = 250;
+
+// quiet period (ms) after the last camera change of a linked viewer before the camera is sent to Python
+const CAMERA_SYNC_DELAY = 200;
+
+const CAMERA_KEYS = ["position", "quaternion", "target", "zoom"];
+
+// size (base64 characters) of the texture images kept for add_shapes calls to come
+const TEXTURE_CACHE_BYTES = 64 * 1024 * 1024;
+
+// interval (ms) of the check for hidden geometry to evict from the GPU
+const EVICTION_INTERVAL = 5000;
+
+function isRendered(object) {
+  // three.js skips objects with an invisible ancestor or invisible materials
+  const materials = Array.isArray(object.material)
+    ? object.material
+    : [object.material];
+  if (!materials.some((material) => material == null || material.visible)) {
+    return false;
+  }
+  for (var obj = object; obj != null; obj = obj.parent) {
+    if (!obj.visible) return false;
+  }
+  return true;
+}
+
+function hasData(array) {
+  return array != null && array.length > 0;
+}
+
+function replaceAttribute(geometry, name, array, itemSize) {
+  const attribute = geometry.getAttribute(name);
+  if (attribute == null || array == null) return false;
+  geometry.setAttribute(name, new attribute.constructor(array, itemSize));
+  return true;
+}
+
+function fillGeometry(group, part) {
+  // set the geometry of a part rendered without it (deferred), false if its
+  // objects can't take it, e.g. since no edges object was created for no edges
+  if (group == null || part == null || typeof group.traverse !== "function") {
+    return false;
+  }
+  const shape = part.shape;
+  const geometries = new Map();
+  group.traverse((object) => {
+    if (object.geometry != null) geometries.set(object.geometry, object);
+  });
+
+  let faces = false;
+  let edges = false;
+  let vertices = false;
+  for (const [geometry, object] of geometries) {
+    if (
+      geometry.isLineSegmentsGeometry &&
+      typeof geometry.setPositions === "function"
+    ) {
+      geometry.setPositions(shape.edges);
+      edges = true;
+    } else if (object.isLineSegments) {
+      if (!replaceAttribute(geometry, "position", shape.edges, 3)) return false;
+      edges = true;
+    } else if (object.isPoints) {
+      if (!replaceAttribute(geometry, "position", shape.obj_vertices, 3)) {
+        return false;
+      }
+      vertices = true;
+    } else if (object.isMesh) {
+      // the index must not be narrowed to 16 bit
+      if (
+        geometry.index == null ||
+        !(geometry.index.array instanceof Uint32Array) ||
+        !replaceAttribute(geometry, "position", shape.vertices, 3) ||
+        !replaceAttribute(geometry, "normal", shape.normals, 3)
+      ) {
+        return false;
+      }
+      geometry.setIndex(new geometry.index.constructor(shape.triangles, 1));
+      faces = true;
+    } else {
+      return false;
+    }
+    geometry.computeBoundingBox();
+    geometry.computeBoundingSphere();
+  }
+  return (
+    (faces || part.type !== "shapes" || !hasData(shape.triangles)) &&
+    (edges || !hasData(shape.edges)) &&
+    (vertices || part.type !== "vertices" || !hasData(shape.obj_vertices))
+  );
+}
+
+function replaceShapes(tree, parts) {
+  // put the geometry of deferred parts loaded later into a decoded shapes tree
+  if (tree.parts != null) {
+    tree.parts.forEach((part) => replaceShapes(part, parts));
+  } else if (parts.has(tree.id)) {
+    tree.shape = parts.get(tree.id).shape;
+  }
+}
+
+function encodeArrays(value) {
+  // decoded typed arrays as binary buffers in the format of the shapes trait
+  if (Array.isArray(value)) return value.map(encodeArrays);
+  if (ArrayBuffer.isView(value)) {
+    return {
+      shape: [value.length],
+      dtype: value instanceof Float32Array ? "float32" : "uint32",
+      buffer: new DataView(value.buffer, value.byteOffset, value.byteLength)
+    };
+  }
+  return value;
+}
+
+function withLoadedParts(shapes, parts) {
+  // the shapes trait only holds empty geometry for deferred parts loaded later,
+  // put theirs back in, e.g. for the widget state saved with the notebook
+  if (shapes == null || shapes.shapes == null || parts.size === 0) {
+    return shapes;
+  }
+  const merge = (tree) => {
+    if (tree.parts != null) return { ...tree, parts: tree.parts.map(merge) };
+    const part = parts.get(tree.id);
+    if (part == null) return tree;
+    const shape = {};
+    for (const key in part.shape) shape[key] = encodeArrays(part.shape[key]);
+    return { ...tree, shape: shape };
+  };
+  return { ...shapes, shapes: merge(shapes.shapes) };
+}
+
+function geometryBytes(geometry) {
+  // interleaved attributes share one buffer, count it once
+  const arrays = new Set();
+  if (geometry.index != null) arrays.add(geometry.index.array);
+  for (const name in geometry.attributes) {
+    const attribute = geometry.attributes[name];
+    arrays.add(
+      attribute.isInterleavedBufferAttribute
+        ? attribute.data.array
+        : attribute.array
+    );
+  }
+  var bytes = 0;
+  for (const array of arrays) bytes += array.byteLength;
+  return bytes;
+}
+
+function encodeCanvas(canvas, format, quality) {
+  // resolves to the encoded image as ArrayBuffer
+  return new Promise((resolve, reject) => {
+    canvas.toBlob(
+      (blob) =>
+        blob == null
+          ? reject(new Error(`cannot encode image as ${format}`))
+          : resolve(blob.arrayBuffer()),
+      `image/${format}`,
+      quality
+    );
+  });
+}
+
+// 8 bit linear to sRGB, three.js renders into render targets without the output conversion
+const SRGB = Uint8ClampedArray.from({ length: 256 }, (_, i) => {
+  const c = i / 255;
+  return (
+    255 * (c <= 0.0031308 ? 12.92 * c : 1.055 * Math.pow(c, 1 / 2.4) - 0.055)
+  );
+});
+
+function pixelsToCanvas(pixels, width, height, srgb) {
+  // WebGL rows start at the bottom
+  const canvas = document.createElement("canvas");
+  canvas.width = width;
+  canvas.height = height;
+  const context = canvas.getContext("2d");
+  const image = context.createImageData(width, height);
+  const row = width * 4;
+  for (let y = 0; y < height; y++) {
+    const source = (height - 1 - y) * row;
+    for (let x = 0; x < row; x++) {
+      const value = pixels[source + x];
+      image.data[y * row + x] = srgb && x % 4 !== 3 ? SRGB[value] : value;
+    }
+  }
+  context.putImageData(image, 0, 0);
+  return canvas;
+}
+
+function isHidden(states, path) {
+  // all parts at or below path are hidden, unknown paths are not
+  let found = false;
+  for (const name in states) {
+    if (name === path || name.startsWith(`${path}/`)) {
+      found = true;
+      if (states[name].includes(1)) return false;
+    }
+  }
+  return found;
+}
+
+// model attributes handled by handle_change, grouped by subsystem in the order they are applied
+const CHANGE_GROUPS = {
+  debug: ["debug"],
+  layout: ["cad_width", "tree_width", "height"],
+  ui: ["tools", "glass", "pinning", "tab", "collapse"],
+  camera: [
+    "ortho",
+    "position",
+    "quaternion",
+    "target",
+    "zoom",
+    "zoom_speed",
+    "pan_speed",
+    "rotate_speed",
+    "camera_link"
+  ],
+  lights: [
+    "default_edgecolor",
+    "default_opacity",
+    "ambient_intensity",
+    "direct_intensity",
+    "metalness",
+    "roughness"
+  ],
+  helpers: ["axes", "axes0", "grid", "center_grid"],
+  clipping: [
+    "clip_intersection",
+    "clip_planes",
+    "clip_normal_0",
+    "clip_normal_1",
+    "clip_normal_2",
+    "clip_slider_0",
+    "clip_slider_1",
+    "clip_slider_2",
+    "clip_object_colors"
+  ],
+  visibility: ["transparent", "black_edges", "explode", "state_updates"],
+  animation: ["tracks"],
+  memory: ["gpu_budget"],
+  measure: ["measure"],
+  lifecycle: ["disposed"]
+};
+const CHANGE_ORDER = Object.values(CHANGE_GROUPS).flat();
+
 export class CadViewerModel extends DOMWidgetModel {
+  static serializers = {
+    ...DOMWidgetModel.serializers,
+    store: { deserialize: unpack_models },
+    // keeps the binary buffers, the default serializer copies through JSON
+    shapes: {
+      serialize: (shapes, model) => withLoadedParts(shapes, model.loadedParts)
+    }
+  };
+
   defaults() {
     return {
       ...super.defaults(),
@@ -36,10 +314,12 @@ export class CadViewerModel extends DOMWidgetModel {
       theme: null,
       pinning: null,
       newTreeBehavior: null,
+      max_live_viewers: null,
 
       // View traits
 
       shapes: null,
+      store: null,
       states: null,
       tracks: null,
       timeit: null,
@@ -99,11 +379,141 @@ export class CadViewerModel extends DOMWidgetModel {
       image_id: null,
 
       result: "",
+      timings: null,
+      trace_id: null,
+      lazy_parts: null,
+      texture_cache: null,
+      gpu_memory: null,
+      camera_link: null,
+      gpu_budget: null,
+      gpu_evict_after: null,
       debug: false,
       disposed: false,
+      prewarm: null,
       rendered: false
     };
   }
+
+  initialize(attributes, options) {
+    super.initialize(attributes, options);
+    this.warm = null;
+    // base64 texture images by content hash, shared by all add_shapes calls
+    this.textureCache = new TextureCache(TEXTURE_CACHE_BYTES);
+    // bytes of externalized shapes containers by content hash
+    this.externalFiles = new Map();
+    // decoded deferred parts sent after the shapes they belong to, by path
+    this.loadedParts = new Map();
+    // shapes decoded once for all views, see getShapes
+    this.decoded = null;
+    this.on("change:shapes", () => {
+      this.loadedParts.clear();
+      this.decoded = null;
+    });
+    this.on("msg:custom", this.onCustomMessage, this);
+    if (this.get("prewarm")) {
+      this.prewarm();
+    }
+    this.once("destroy", this.disposeWarm, this);
+  }
+
+  getDisplayOptions() {
+    return {
+      cadWidth: this.get("cad_width"),
+      height: this.get("height"),
+      treeWidth: this.get("tree_width"),
+      theme: this.get("theme"),
+      glass: this.get("glass"),
+      tools: this.get("tools"),
+      pinning: this.get("pinning"),
+      keymap: this.get("keymap"),
+      newTreeBehavior: this.get("new_tree_behavior")
+    };
+  }
+
+  prewarm() {
+    // Build DOM, Display and Viewer (incl. the WebGL renderer) before the model
+    // gets displayed, so that a pooled viewer can show its first frame immediately
+    const displayOptions = this.getDisplayOptions();
+    const container = document.createElement("div");
+    container.id = `cvw_${Math.random().toString().slice(2)}`;
+
+    const display = new Display(container, displayOptions);
+    display.glassMode(displayOptions.glass);
+    display.showTools(displayOptions.tools);
+
+    // notifications will be redirected to the view adopting the viewer
+    const viewer = new Viewer(display, displayOptions, null, null);
+    this.warm = { container, display, viewer, options: displayOptions };
+    App.addWarmViewer(container.id);
+    console.debug(`cad-viewer-widget: Viewer ${container.id} prewarmed`);
+  }
+
+  takeWarm(displayOptions) {
+    const warm = this.warm;
+    this.warm = null;
+    if (warm != null) {
+      App.removeWarmViewer(warm.container.id);
+    }
+    if (warm != null && !sameViewerOptions(warm.options, displayOptions)) {
+      warm.viewer.dispose();
+      return null;
+    }
+    return warm;
+  }
+
+  getShapes() {
+    // decode once for all views, the model keeps the shapes as received, e.g. to
+    // rebuild a resumed view or to save the widget state. Decoding converts the
+    // tree in place, so it gets a copy of the structure, and every view gets its
+    // own tree, since the viewer modifies it. All trees share the decoded buffers
+    if (this.decoded == null) {
+      const data = { data: cloneTree(this.get("shapes")) };
+      decode(data, this.textureCache);
+      this.decoded = data.data.shapes;
+    }
+    return cloneTree(this.decoded);
+  }
+
+  onCustomMessage(msg, buffers) {
+    if (msg.type !== "part_geometry") return;
+
+    // decode once for all views, after the state updates sent before, i.e.
+    // after the shapes the parts belong to
+    this.state_change = this.state_change.then(() => {
+      try {
+        put_buffers(msg.data, msg.buffer_paths, buffers);
+        const data = { data: msg.data };
+        decode(data, this.textureCache);
+        const paths = data.data.shapes.parts.map((part) => {
+          this.loadedParts.set(part.id, part);
+          return part.id;
+        });
+        this.trigger("parts:loaded", paths);
+      } catch (error) {
+        console.error("cad-viewer-widget: Cannot add part geometry", error);
+      }
+    });
+  }
+
+  disposeWarm() {
+    if (this.warm != null) {
+      App.removeWarmViewer(this.warm.container.id);
+      this.warm.viewer.dispose();
+      console.debug(
+        `cad-viewer-widget: Prewarmed viewer ${this.warm.container.id} disposed`
+      );
+      this.warm = null;
+    }
+  }
+}
+
+function sameViewerOptions(options1, options2) {
+  // theme, pinning and keymap are only evaluated when the Viewer is constructed
+  return (
+    options1.theme === options2.theme &&
+    options1.pinning === options2.pinning &&
+    isTolEqual(options1.keymap, options2.keymap)
+  );
 }
 
 export class CadViewerView extends DOMWidgetView {
@@ -117,6 +527,15 @@ export class CadViewerView extends DOMWidgetView {
     this.activeTab = "";
     this.display = null;
     this.viewer = null;
+    this.viewerOptions = null;
+    this.appliedSize = null;
+    this.suspended = false;
+    this.suspending = false;
+    this.suspendedImage = null;
+    this.tour = null;
+    this.loading = null;
+    this.pendingThumbnails = null;
+    this.closing = false;
   }
 
   debug(...args) {
@@ -130,51 +549,34 @@ export class CadViewerView extends DOMWidgetView {
       super.render();
 
       this.model.on("change:initialize", this.clearOrAddShapes, this);
-      this.model.on("change:tracks", this.handle_change, this);
-      this.model.on("change:position", this.handle_change, this);
-      this.model.on("change:quaternion", this.handle_change, this);
-      this.model.on("change:target", this.handle_change, this);
-      this.model.on("change:zoom", this.handle_change, this);
-      this.model.on("change:axes", this.handle_change, this);
-      this.model.on("change:grid", this.handle_change, this);
-      this.model.on("change:axes0", this.handle_change, this);
-      this.model.on("change:ortho", this.handle_change, this);
-      this.model.on("change:explode", this.handle_change, this);
-      this.model.on("change:transparent", this.handle_change, this);
-      this.model.on("change:black_edges", this.handle_change, this);
-      this.model.on("change:collapse", this.handle_change, this);
-      this.model.on("change:tools", this.handle_change, this);
-      this.model.on("change:glass", this.handle_change, this);
-      this.model.on("change:cad_width", this.handle_change, this);
-      this.model.on("change:tree_width", this.handle_change, this);
-      this.model.on("change:height", this.handle_change, this);
-      this.model.on("change:pinning", this.handle_change, this);
-      this.model.on("change:default_edgecolor", this.handle_change, this);
-      this.model.on("change:default_opacity", this.handle_change, this);
-      this.model.on("change:ambient_intensity", this.handle_change, this);
-      this.model.on("change:direct_intensity", this.handle_change, this);
-      this.model.on("change:metalness", this.handle_change, this);
-      this.model.on("change:roughness", this.handle_change, this);
-      this.model.on("change:zoom_speed", this.handle_change, this);
-      this.model.on("change:pan_speed", this.handle_change, this);
-      this.model.on("change:rotate_speed", this.handle_change, this);
-      this.model.on("change:state_updates", this.handle_change, this);
-      this.model.on("change:tab", this.handle_change, this);
-      this.model.on("change:clip_intersection", this.handle_change, this);
-      this.model.on("change:clip_planes", this.handle_change, this);
-      this.model.on("change:clip_normal_0", this.handle_change, this);
-      this.model.on("change:clip_normal_1", this.handle_change, this);
-      this.model.on("change:clip_normal_2", this.handle_change, this);
-      this.model.on("change:clip_slider_0", this.handle_change, this);
-      this.model.on("change:clip_slider_1", this.handle_change, this);
-      this.model.on("change:clip_slider_2", this.handle_change, this);
-      this.model.on("change:debug", this.handle_change, this);
-      this.model.on("change:disposed", this.handle_change, this);
-      this.model.on("change:center_grid", this.handle_change, this);
-      this.model.on("change:clip_object_colors", this.handle_change, this);
-      this.model.on("change:measure", this.handle_change, this);
+      this.model.on("change:shapes", this.shapesReceived, this);
+      this.model.on("change:store", this.shapesReceived, this);
+      this.model.on("change", this.handle_change, this);
 
       this.listenTo(this.model, "msg:custom", this.onCustomMessage.bind(this));
+      this.listenTo(this.model, "parts:loaded", this.addParts.bind(this));
+
+      // widget state restored from a saved notebook: render the externalized shapes
+      if (
+        this.model.get("initialize") === false &&
+        this.externalReference() != null
+      ) {
+        this.displayed.then(() => {
+          this.showViewer();
+          this.clearOrAddShapes();
+        });
+      }
+
+      // a reloaded page starts with an empty texture cache
+      const textureCache = this.model.get("texture_cache");
+      if (
+        this.model.textureCache.size === 0 &&
+        textureCache != null &&
+        textureCache.length > 0
+      ) {
+        this.model.set("texture_cache", []);
+        this.model.save_changes();
+      }
 
       this.shell = App.getShell();
 
@@ -191,6 +593,17 @@ export class CadViewerView extends DOMWidgetView {
       this.container_id = null;
 
       this.observer = null;
+      this.resizeFrame = null;
+      this.syncTimer = null;
+      this.appliedSize = null;
+
+      this.requestedParts = new Set();
+      this.evictionTimer = null;
+
+      this.cameraLink = null;
+      this.cameraFrame = null;
+      this.cameraTimer = null;
+      this.setCameraLink(this.model.get("camera_link"));
 
       this.height = null;
       this.width = null;
@@ -219,17 +632,7 @@ export class CadViewerView extends DOMWidgetView {
   }
 
   getDisplayOptions() {
-    return {
-      cadWidth: this.model.get("cad_width"),
-      height: this.model.get("height"),
-      treeWidth: this.model.get("tree_width"),
-      theme: this.model.get("theme"),
-      glass: this.model.get("glass"),
-      tools: this.model.get("tools"),
-      pinning: this.model.get("pinning"),
-      keymap: this.model.get("keymap"),
-      newTreeBehavior: this.model.get("new_tree_behavior")
-    };
+    return this.model.getDisplayOptions();
   }
 
   getRenderOptions() {
@@ -305,15 +708,54 @@ export class CadViewerView extends DOMWidgetView {
 
   dispose() {
     if (!this.disposed) {
-      this.viewer.dispose();
+      this.stopResizing();
+      this.stopEviction();
+      this.setCameraLink(null);
+      if (this.cameraFrame != null) {
+        cancelAnimationFrame(this.cameraFrame);
+      }
+      clearTimeout(this.cameraTimer);
+      this.stopTour();
+      if (this.viewer != null) {
+        this.viewer.dispose();
+      }
 
       // first set disposed to true to avoid double dispose call
       this.disposed = true;
 
       // then set model widget, to block additional triggered dispose call
-      this.model.set("disposed", true);
-      this.model.save_changes();
+      if (this.model.comm != null) {
+        this.model.set("disposed", true);
+        this.model.save_changes();
+      }
+    }
+  }
+
+  disposeView() {
+    // close the sidecar or dispose the cell viewer
+    if (this.closing) return;
+    this.closing = true;
+    if (this.title != null) {
+      const sidecar = App.getSidecar(this.title);
+      if (sidecar != null) {
+        if (this.anchor == "right") {
+          sidecar.disposeSidebar(null, sidecar.widget);
+        } else {
+          sidecar.widget.title.owner.dispose();
+        }
+      }
+    }
+    this.dispose();
+  }
+
+  remove() {
+    // Python closes the comm right after setting disposed, so the model can be
+    // closed before the change is handled: free the WebGL context and the
+    // sidecar when the views of the closed model are removed
+    if (!this.disposed && this.model.comm == null) {
+      this.disposeView();
     }
+    return super.remove();
   }
 
   _barHandler(index, tab) {
@@ -328,7 +770,18 @@ export class CadViewerView extends DOMWidgetView {
     }
   }
 
-  resize = (rect) => {
+  scheduleResize = (rect) => {
+    // coalesce resize events, e.g. while dragging a splitter, to one layout per animation frame
+    this.pendingRect = rect;
+    if (this.resizeFrame == null) {
+      this.resizeFrame = requestAnimationFrame(() => {
+        this.resizeFrame = null;
+        this.resize(this.pendingRect);
+      });
+    }
+  };
+
+  resize = (rect, force = false) => {
     var width = Math.round(rect.width);
     var height = Math.round(rect.height);
 
@@ -354,34 +807,104 @@ export class CadViewerView extends DOMWidgetView {
           }
         }
 
-        this.viewer.resizeCadView(
-          width,
-          displayOptions.treeWidth,
-          height,
-          displayOptions.glass
-        );
+        const applied = this.appliedSize;
+        if (
+          force ||
+          applied == null ||
+          applied.width !== width ||
+          applied.height !== height
+        ) {
+          this.viewer.resizeCadView(
+            width,
+            displayOptions.treeWidth,
+            height,
+            displayOptions.glass
+          );
+          this.appliedSize = { width: width, height: height };
+        }
+        this.syncSize(width, height);
       }
-
-      this.model.set("cad_width", width);
-      this.model.set("height", height);
-      this.model.save_changes();
     }
   };
 
+  syncSize(width, height) {
+    // send the size to Python only after the resizing has settled
+    clearTimeout(this.syncTimer);
+    this.syncTimer = setTimeout(() => {
+      this.syncTimer = null;
+      if (this.disposed) return;
+
+      if (
+        this.model.get("cad_width") !== width ||
+        this.model.get("height") !== height
+      ) {
+        this.model.set("cad_width", width);
+        this.model.set("height", height);
+        this.model.save_changes();
+      }
+    }, RESIZE_SYNC_DELAY);
+  }
+
+  resizeFromModel(force) {
+    if (this.viewer == null) return;
+
+    const width = this.model.get("cad_width");
+    const height = this.model.get("height");
+    const applied = this.appliedSize;
+    // skip the echo of a size synced by syncSize
+    if (
+      !force &&
+      applied != null &&
+      applied.width === width &&
+      applied.height === height
+    ) {
+      return;
+    }
+    this.viewer.resizeCadView(
+      width,
+      this.model.get("tree_width"),
+      height,
+      this.model.get("glass")
+    );
+    this.appliedSize = { width: width, height: height };
+  }
+
+  stopResizing() {
+    if (this.observer != null) {
+      this.observer.disconnect();
+      this.observer = null;
+    }
+    if (this.resizeFrame != null) {
+      cancelAnimationFrame(this.resizeFrame);
+      this.resizeFrame = null;
+    }
+    clearTimeout(this.syncTimer);
+    this.syncTimer = null;
+  }
+
   showViewer() {
     const displayOptions = this.getDisplayOptions();
     this._debug = this.model.get("debug");
 
     if (this.display == null) {
-      const container = document.createElement("div");
-      container.id = `cvw_${Math.random().toString().slice(2)}`; // sufficient or uuid?
-      container.innerHTML = "";
+      // adopt DOM, Display and Viewer prewarmed by the model, if available
+      const warm = this.model.takeWarm(displayOptions);
+
+      const container =
+        warm != null ? warm.container : document.createElement("div");
+      if (warm == null) {
+        container.id = `cvw_${Math.random().toString().slice(2)}`; // sufficient or uuid?
+        container.innerHTML = "";
+      }
 
       this.container_id = container.id;
       this.container = container;
 
       if (this.title == null) {
         App.addCellViewer(container.id, this);
+        const touch = () => App.touchCellViewer(container.id);
+        container.addEventListener("pointerdown", touch);
+        container.addEventListener("wheel", touch, { passive: true });
       } else {
         App.getSidecar(this.title).registerChild(this);
       }
@@ -406,13 +929,21 @@ export class CadViewerView extends DOMWidgetView {
         this.model.save_changes();
       }
 
-      this.display = new Display(container, displayOptions);
+      if (warm != null) {
+        this.display = warm.display;
+        this.viewer = warm.viewer;
+        this.viewer.notifyCallback = this.handleNotification.bind(this);
+        this.viewerOptions = warm.options;
+        this.debug("Adopted prewarmed viewer");
+      } else {
+        this.display = new Display(container, displayOptions);
+      }
 
       if (this.title != null) {
         // do not resize cell viewers
         this.observer = new ResizeObserver((entries) => {
           for (const entry of entries) {
-            this.resize(entry.contentRect);
+            this.scheduleResize(entry.contentRect);
           }
         });
 
@@ -424,6 +955,12 @@ export class CadViewerView extends DOMWidgetView {
     this.display.showTools(displayOptions.tools);
 
     if (this.viewer != null) {
+      if (
+        this.canReuseViewer(displayOptions) &&
+        this.recycleViewer(displayOptions)
+      ) {
+        return;
+      }
       this.clear();
     }
 
@@ -433,30 +970,136 @@ export class CadViewerView extends DOMWidgetView {
       this.handleNotification.bind(this),
       null
     );
+    this.viewerOptions = displayOptions;
+  }
+
+  canReuseViewer(displayOptions) {
+    return (
+      this.viewer.renderer != null &&
+      this.viewerOptions != null &&
+      sameViewerOptions(this.viewerOptions, displayOptions)
+    );
+  }
+
+  recycleViewer(displayOptions) {
+    // Warm path: keep the Viewer with its WebGL renderer, DOM and tools alive and
+    // only remove the scene content. Viewer.render() rebuilds the scene afterwards.
+    // Returns false if the viewer lacks a member this relies on, the caller then
+    // constructs a new Viewer.
+    const viewer = this.viewer;
+    if (
+      typeof viewer.clear !== "function" ||
+      viewer.renderer == null ||
+      typeof viewer.renderer.setSize !== "function" ||
+      viewer.display == null ||
+      typeof viewer.display.setSizes !== "function"
+    ) {
+      this.debug("Viewer cannot be recycled");
+      return false;
+    }
+    const timer = new Timer("recycleViewer", this.model.get("timeit"));
+
+    try {
+      viewer.hasAnimationLoop = false;
+      viewer.continueAnimation = false;
+      viewer.clear();
+      timer.split("scene cleared");
+
+      // the scene helpers are rebuilt by render(), they are not part of the
+      // public API, so only existing members are released
+      for (const key of [
+        "expandedNestedGroup",
+        "compactNestedGroup",
+        "treeview",
+        "orientationMarker",
+        "raycaster"
+      ]) {
+        if (viewer[key] != null && typeof viewer[key].dispose === "function") {
+          viewer[key].dispose();
+        }
+        if (key in viewer) viewer[key] = null;
+      }
+      for (const key of [
+        "nestedGroup",
+        "expandedTree",
+        "compactTree",
+        "tree",
+        "shapes",
+        "bbox",
+        "lastBbox",
+        "lastObject",
+        "lastSelection"
+      ]) {
+        if (key in viewer) viewer[key] = null;
+      }
+      if ("lastNotification" in viewer) viewer.lastNotification = {};
+      if ("newTreeBehavior" in viewer) {
+        viewer.newTreeBehavior = displayOptions.newTreeBehavior;
+      }
+
+      viewer.renderer.setSize(displayOptions.cadWidth, displayOptions.height);
+      viewer.display.setSizes({
+        treeWidth: displayOptions.treeWidth,
+        cadWidth: displayOptions.cadWidth,
+        height: displayOptions.height
+      });
+    } catch (error) {
+      console.warn("cad-viewer-widget: Cannot recycle the viewer", error);
+      return false;
+    }
+    this.viewerOptions = displayOptions;
+
+    timer.split("groups disposed");
+    timer.stop();
+    this.debug("Viewer recycled");
+    return true;
   }
 
   handleNotification(change) {
+    if (
+      this.cameraLink != null &&
+      CAMERA_KEYS.some((key) => change[key] != null)
+    ) {
+      // linked views follow every frame, Python only gets the final camera
+      this.propagateCamera();
+      this.scheduleCameraSync();
+      change = { ...change };
+      CAMERA_KEYS.forEach((key) => delete change[key]);
+    }
+
     Object.keys(change).forEach((key) => {
       const new_value = change[key]["new"];
       this.model.set(key, new_value);
       this.debug(`Setting Python attribute ${key} to`, new_value);
     });
     this.model.save_changes();
+
+    if (change.states != null) {
+      this.requestGeometry(change.states["new"]);
+    }
   }
 
   clear() {
+    this.stopEviction();
     this.viewer.hasAnimationLoop = false;
     this.viewer.continueAnimation = false;
     this.viewer.dispose();
     this.viewer = null;
+    this.viewerOptions = null;
   }
 
   clearOrAddShapes() {
     this.init = this.model.get("initialize");
 
+    this.suspending = false;
+    if (this.suspended) {
+      // new shapes from Python, the viewer is rebuilt below
+      this.resume(false);
+    }
+
     if (this.init) {
       // support rest initial position and  keeping camera location
-      if (!this.empty) {
+      if (!this.empty && this.viewer != null) {
         this.lastPosition = this.viewer.getCameraPosition();
         this.lastQuaternion = this.viewer.getCameraQuaternion();
         this.lastZoom = this.viewer.getCameraZoom();
@@ -464,15 +1107,97 @@ export class CadViewerView extends DOMWidgetView {
       }
       this.showViewer();
     } else {
+      const reference = this.externalReference();
+      if (reference != null && !this.model.externalFiles.has(reference.hash)) {
+        const loading = this.loadExternal(reference).then(
+          () => {
+            // render only if no other shapes have arrived in the meantime
+            const current = this.externalReference();
+            if (
+              current != null &&
+              current.hash === reference.hash &&
+              this.model.get("initialize") === false
+            ) {
+              this.clearOrAddShapes();
+            }
+          },
+          (error) => {
+            console.error(
+              `cad-viewer-widget: Cannot load shapes from ${reference.path}`,
+              error
+            );
+          }
+        );
+        // lets requests wait until the shapes are rendered
+        this.loading = loading;
+        loading.then(() => {
+          if (this.loading === loading) this.loading = null;
+        });
+        return;
+      }
       this.addShapes();
       if (this.title != null) {
         this.resize(
-          this.container.parentNode.parentNode.getBoundingClientRect()
+          this.container.parentNode.parentNode.getBoundingClientRect(),
+          true
         );
       }
     }
   }
 
+  externalReference() {
+    const shapes = this.model.get("shapes");
+    if (this.model.get("store") != null || shapes == null) {
+      return null;
+    }
+    return shapes.external != null ? shapes.external : null;
+  }
+
+  notebookDir() {
+    // the reference path is relative to the notebook, the contents API expects server relative paths
+    const manager = this.model.widget_manager;
+    var path =
+      manager != null && manager.context != null ? manager.context.path : null;
+    if (path == null) {
+      const shell = App.getShell();
+      const widget = shell != null ? shell.currentWidget : null;
+      path =
+        widget != null && widget.context != null ? widget.context.path : "";
+    }
+    return path.split("/").slice(0, -1).join("/");
+  }
+
+  loadExternal(reference) {
+    // load an externalized shapes container through the contents API of the Jupyter server
+    const serviceManager = App.getServiceManager();
+    if (serviceManager == null) {
+      return Promise.reject(
+        new Error("The Jupyter contents API is not available")
+      );
+    }
+    const path = joinPath(this.notebookDir(), reference.path);
+    this.debug("Loading externalized shapes", path);
+    return serviceManager.contents
+      .get(path, { type: "file", format: "base64", content: true })
+      .then((model) => {
+        this.model.externalFiles.set(reference.hash, fromB64(model.content));
+      });
+  }
+
+  shapesReceived() {
+    this.receivedAt = performance.now();
+    this.receivedEpoch = Date.now();
+  }
+
+  reportTimings(trace, start) {
+    // report the spans after the first frame with the new shapes has been drawn
+    requestAnimationFrame(() => {
+      trace.spans.first_frame = performance.now() - start;
+      this.model.set("timings", trace);
+      this.model.save_changes();
+    });
+  }
+
   backupClipping() {
     this.clipSettings = {
       tab: this.model.get("tab"),
@@ -520,14 +1245,55 @@ export class CadViewerView extends DOMWidgetView {
     }
   }
 
-  addShapes() {
+  addShapes(resetCamera = this.model.get("reset_camera")) {
     if (this.model.get("initialize") == null) {
       return;
     }
 
-    this.shapes = { data: this.model.get("shapes") };
-    decode(this.shapes);
-    this.shapes = this.shapes["data"]["shapes"];
+    const start = performance.now();
+    const trace = {
+      trace_id: this.model.get("trace_id"),
+      received_at: this.receivedEpoch,
+      spans: {}
+    };
+    if (this.receivedAt != null) {
+      trace.spans.receive = start - this.receivedAt;
+    }
+
+    const store = this.model.get("store");
+    if (store != null) {
+      this.shapes = store.getShapes();
+    } else {
+      const reference = this.externalReference();
+      if (reference == null && this.model.get("shapes").textures != null) {
+        restoreTextures(
+          this.model.get("shapes").textures,
+          this.model.textureCache
+        );
+      }
+      const textureCache = this.model.textureCache;
+      const version = textureCache.version;
+      if (reference != null) {
+        // a fresh tree with views into the container bytes
+        this.shapes = {
+          data: parseContainer(this.model.externalFiles.get(reference.hash))
+        };
+        decode(this.shapes, textureCache);
+        this.shapes = this.shapes["data"]["shapes"];
+      } else {
+        this.shapes = this.model.getShapes();
+      }
+      replaceShapes(this.shapes, this.model.loadedParts);
+      // the images are resolved now, Python sends dropped ones again
+      textureCache.trim();
+      if (textureCache.version !== version) {
+        this.model.set(
+          "texture_cache",
+          Array.from(this.model.textureCache.keys())
+        );
+      }
+    }
+    trace.spans.decode = performance.now() - start;
 
     const bbox = this.shapes["bb"];
     const center = [
@@ -546,8 +1312,6 @@ export class CadViewerView extends DOMWidgetView {
 
     const timer = new Timer("addShapes", this.model.get("timeit"));
 
-    const resetCamera = this.model.get("reset_camera");
-
     this.tracks = [];
 
     var viewerOptions = this.getViewerOptions();
@@ -627,7 +1391,9 @@ export class CadViewerView extends DOMWidgetView {
         viewerOptions.zoom = this._zoom;
       }
     }
+    const renderStart = performance.now();
     this.viewer.render(this.shapes, this.getRenderOptions(), viewerOptions);
+    trace.spans.render = performance.now() - renderStart;
 
     if (resetCamera === "keep" && this.camera_distance != null) {
       // console.log("camera_distance", this.camera_distance, viewer.camera.camera_distance, viewer.camera.camera_distance/this.camera_distance);
@@ -687,9 +1453,440 @@ export class CadViewerView extends DOMWidgetView {
 
     timer.stop();
 
+    trace.spans.add_shapes = performance.now() - start;
+    this.reportTimings(trace, start);
+
+    this.requestedParts = new Set();
+    this.startEviction();
+
+    if (this.title == null) {
+      App.evictCellViewers(this.model.get("max_live_viewers"));
+    }
+
+    if (this.pendingThumbnails != null) {
+      // the deferred parts requested for thumbnails have arrived
+      const render = this.pendingThumbnails;
+      this.pendingThumbnails = null;
+      render();
+    }
+
     return true;
   }
 
+  addParts(paths) {
+    // add the geometry of deferred parts to the rendered scene, suspended
+    // views rebuild from the model with it when resumed
+    if (!this.isLive() || this.shapes == null) return;
+
+    const parts = this.model.loadedParts;
+    replaceShapes(this.shapes, parts);
+    const groups =
+      this.viewer.nestedGroup != null ? this.viewer.nestedGroup.groups : null;
+    if (
+      groups != null &&
+      paths.every((path) => fillGeometry(groups[path], parts.get(path)))
+    ) {
+      this.viewer.update(true, false);
+      this.debug("Added geometry of", paths);
+    } else {
+      // rebuild the scene, keeping the camera
+      this.debug("Rebuilding the scene for", paths);
+      this.showViewer();
+      this.addShapes("keep");
+      return;
+    }
+
+    if (this.pendingThumbnails != null) {
+      const render = this.pendingThumbnails;
+      this.pendingThumbnails = null;
+      render();
+    }
+  }
+
+  isLive() {
+    // viewers being suspended don't count, their context is about to be freed
+    return (
+      !this.disposed &&
+      !this.suspended &&
+      !this.suspending &&
+      this.viewer != null &&
+      this.viewer.renderer != null
+    );
+  }
+
+  suspend() {
+    // replace the view by an image and release the WebGL context, a click restores it
+    if (!this.isLive()) return;
+    this.suspending = true;
+
+    this.viewer.getImage("suspend").then((result) => {
+      // new shapes arriving in the meantime cancel suspending
+      if (!this.suspending) return;
+      this.suspending = false;
+      if (!this.isLive()) return;
+
+      const image = document.createElement("img");
+      image.src = result.dataUrl;
+      image.width = this.viewer.cadWidth;
+      image.height = this.viewer.height;
+      image.className = "cvw-suspended";
+      image.title = "Click to restore the interactive view";
+      image.addEventListener("click", () => this.resume(), { once: true });
+      this.el.insertBefore(image, this.container);
+      this.container.style.display = "none";
+      this.suspendedImage = image;
+
+      // browsers free the context only on garbage collection otherwise
+      this.viewer.renderer.forceContextLoss();
+      this.clear();
+      this.suspended = true;
+      this.debug("Suspended viewer", this.container_id);
+    });
+  }
+
+  resume(render = true) {
+    if (!this.suspended) return;
+    this.suspended = false;
+    this.suspendedImage.remove();
+    this.suspendedImage = null;
+    this.container.style.display = "";
+    App.touchCellViewer(this.container_id);
+
+    if (render) {
+      // rebuild the viewer from the shapes still held by the model
+      this.showViewer();
+      this.addShapes();
+    }
+    this.debug("Resumed viewer", this.container_id);
+  }
+
+  setCameraLink(link) {
+    if (this.cameraLink != null) {
+      App.unlinkCamera(this.cameraLink, this);
+    }
+    this.cameraLink = link;
+    if (link != null) {
+      App.linkCamera(link, this);
+    }
+  }
+
+  getCamera() {
+    return {
+      position: this.viewer.getCameraPosition(),
+      quaternion: this.viewer.getCameraQuaternion(),
+      target: this.viewer.getCameraTarget(),
+      zoom: this.viewer.getCameraZoom()
+    };
+  }
+
+  propagateCamera() {
+    // apply the camera to the linked views at most once per animation frame
+    if (this.cameraFrame != null) return;
+    this.cameraFrame = requestAnimationFrame(() => {
+      this.cameraFrame = null;
+      if (this.viewer == null || this.cameraLink == null) return;
+
+      const camera = this.getCamera();
+      for (const view of App.getLinkedViews(this.cameraLink)) {
+        if (view !== this) {
+          view.applyLinkedCamera(camera);
+        }
+      }
+    });
+  }
+
+  applyLinkedCamera(camera) {
+    const viewer = this.viewer;
+    if (viewer == null || !viewer.ready || this.init) return;
+
+    // setters without notification, so that the change does not echo back
+    this.batchUpdates(() => {
+      viewer.setCameraTarget(camera.target, false);
+      viewer.setCameraPosition(camera.position, false, false);
+      if (this.model.get("control") !== "orbit") {
+        viewer.setCameraQuaternion(camera.quaternion, false);
+      }
+      viewer.setCameraZoom(camera.zoom, false);
+    });
+    this.scheduleCameraSync();
+  }
+
+  scheduleCameraSync() {
+    clearTimeout(this.cameraTimer);
+    this.cameraTimer = setTimeout(() => {
+      this.cameraTimer = null;
+      this.syncCamera();
+    }, CAMERA_SYNC_DELAY);
+  }
+
+  syncCamera() {
+    // send the current camera to Python
+    if (this.viewer == null || this.disposed) return;
+
+    const camera = this.getCamera();
+    this._position = camera.position;
+    this._quaternion = camera.quaternion;
+    this._target = camera.target;
+    this._zoom = camera.zoom;
+    CAMERA_KEYS.forEach((key) => this.model.set(key, camera[key]));
+    this.model.save_changes();
+  }
+
+  playTour(id, keyframes, loop) {
+    // interpolate the camera between keyframes in the render loop, Python only
+    // gets the final camera and one completion message
+    this.stopTour();
+    const viewer = this.viewer;
+    if (viewer == null || keyframes.length === 0) {
+      this.send({ type: "tour_done", id: id, completed: false });
+      return;
+    }
+
+    const orbit = this.model.get("control") === "orbit";
+    const up = this.model.get("up") === "Y" ? [0, 1, 0] : [0, 0, 1];
+    const resolve = (from, keyframe) => {
+      const to = {
+        position: keyframe.position || from.position,
+        target: keyframe.target || from.target,
+        quaternion: keyframe.quaternion || from.quaternion,
+        zoom: keyframe.zoom != null ? keyframe.zoom : from.zoom
+      };
+      if (keyframe.quaternion == null && !orbit) {
+        // keep looking at the target when only position and target are given
+        to.quaternion =
+          lookAtQuaternion(to.position, to.target, up) || from.quaternion;
+      }
+      return to;
+    };
+
+    var index = 0;
+    var from = this.getCamera();
+    var to = resolve(from, keyframes[0]);
+    var segmentStart = performance.now();
+
+    const frame = (now) => {
+      if (this.viewer !== viewer || this.disposed) return;
+
+      const keyframe = keyframes[index];
+      const duration = 1000 * (keyframe.duration || 0);
+      const elapsed = now - segmentStart;
+      const t = duration > 0 ? Math.min(elapsed / duration, 1) : 1;
+      const e = EASINGS[keyframe.easing || "ease-in-out"](t);
+
+      this.batchUpdates(() => {
+        viewer.setCameraTarget(lerp(from.target, to.target, e), false);
+        viewer.setCameraPosition(
+          lerp(from.position, to.position, e),
+          false,
+          false
+        );
+        if (!orbit) {
+          viewer.setCameraQuaternion(
+            slerp(from.quaternion, to.quaternion, e),
+            false
+          );
+        }
+        // zoom changes by the same factor per frame
+        viewer.setCameraZoom(
+          from.zoom > 0 && to.zoom > 0
+            ? from.zoom * Math.pow(to.zoom / from.zoom, e)
+            : from.zoom + (to.zoom - from.zoom) * e,
+          false
+        );
+      });
+      if (this.cameraLink != null) {
+        this.propagateCamera();
+      }
+
+      if (elapsed >= duration + 1000 * (keyframe.hold || 0)) {
+        index += 1;
+        if (index === keyframes.length) {
+          if (!loop) {
+            this.finishTour(true);
+            return;
+          }
+          index = 0;
+        }
+        from = to;
+        to = resolve(from, keyframes[index]);
+        segmentStart = now;
+      }
+      this.tour.frame = requestAnimationFrame(frame);
+    };
+
+    // grabbing the camera ends the tour
+    const interrupt = () => this.stopTour();
+    this.container.addEventListener("pointerdown", interrupt);
+    this.tour = {
+      id: id,
+      interrupt: interrupt,
+      frame: requestAnimationFrame(frame)
+    };
+  }
+
+  finishTour(completed) {
+    const tour = this.tour;
+    if (tour == null) return;
+    this.tour = null;
+    cancelAnimationFrame(tour.frame);
+    if (this.container != null) {
+      this.container.removeEventListener("pointerdown", tour.interrupt);
+    }
+    if (!this.disposed) {
+      this.syncCamera();
+      this.send({ type: "tour_done", id: tour.id, completed: completed });
+    }
+  }
+
+  stopTour() {
+    this.finishTour(false);
+  }
+
+  reportMemory() {
+    // report the GPU bytes of geometry per part and of textures to Python
+    const viewer = this.viewer;
+    if (viewer == null || viewer.scene == null) return;
+
+    const groups =
+      viewer.nestedGroup != null && viewer.nestedGroup.groups != null
+        ? viewer.nestedGroup.groups
+        : {};
+    const paths = new Map();
+    for (const path in groups) {
+      paths.set(groups[path], path);
+    }
+
+    const seen = new Set();
+    const parts = {};
+    var geometries = 0;
+    var textures = 0;
+    viewer.scene.traverse((object) => {
+      if (object.geometry != null && !seen.has(object.geometry)) {
+        seen.add(object.geometry);
+        const bytes = geometryBytes(object.geometry);
+        geometries += bytes;
+
+        var group = object;
+        while (group != null && !paths.has(group)) group = group.parent;
+        if (group != null) {
+          const path = paths.get(group);
+          parts[path] = (parts[path] || 0) + bytes;
+        }
+      }
+      const materials = Array.isArray(object.material)
+        ? object.material
+        : [object.material];
+      for (const material of materials) {
+        const map = material != null ? material.map : null;
+        if (map != null && map.image != null && !seen.has(map)) {
+          seen.add(map);
+          textures += 4 * (map.image.width || 0) * (map.image.height || 0);
+        }
+      }
+    });
+
+    const info = viewer.renderer != null ? viewer.renderer.info.memory : {};
+    this.model.set("gpu_memory", {
+      // lets Python tell reports of earlier shapes from current ones
+      trace_id: this.model.get("trace_id"),
+      reported_at: Date.now(),
+      parts: parts,
+      geometries: geometries,
+      textures: textures,
+      geometry_count: info.geometries,
+      texture_count: info.textures
+    });
+    this.model.save_changes();
+  }
+
+  requestGeometry(states) {
+    // ask Python for the geometry of deferred parts that have been made visible
+    const lazyParts = this.model.get("lazy_parts");
+    if (lazyParts == null || lazyParts.length === 0 || states == null) return;
+
+    const paths = lazyParts.filter(
+      (path) =>
+        !this.requestedParts.has(path) &&
+        states[path] != null &&
+        states[path].includes(1)
+    );
+    if (paths.length > 0) {
+      paths.forEach((path) => this.requestedParts.add(path));
+      this.debug("Requesting geometry of", paths);
+      this.send({ type: "request_geometry", paths: paths });
+    }
+  }
+
+  startEviction() {
+    this.stopEviction();
+    if (this.model.get("gpu_budget") != null) {
+      this.hiddenSince = new WeakMap();
+      this.evicted = new WeakSet();
+      this.evictionTimer = setInterval(
+        () => this.evictHidden(),
+        EVICTION_INTERVAL
+      );
+    }
+  }
+
+  stopEviction() {
+    if (this.evictionTimer != null) {
+      clearInterval(this.evictionTimer);
+      this.evictionTimer = null;
+    }
+  }
+
+  evictHidden() {
+    // free the GPU buffers of geometry hidden for long, three.js uploads them again when shown
+    const budget = this.model.get("gpu_budget");
+    if (this.viewer == null || this.viewer.scene == null || budget == null) {
+      return;
+    }
+    const evictAfter = (this.model.get("gpu_evict_after") ?? 30) * 1000;
+    const now = performance.now();
+
+    const geometries = new Map();
+    this.viewer.scene.traverse((object) => {
+      if (object.geometry != null && object.geometry.isBufferGeometry) {
+        const visible = geometries.get(object.geometry) || isRendered(object);
+        geometries.set(object.geometry, visible);
+      }
+    });
+
+    var total = 0;
+    const candidates = [];
+    for (const [geometry, visible] of geometries) {
+      if (visible) {
+        this.hiddenSince.delete(geometry);
+        this.evicted.delete(geometry);
+      } else if (this.evicted.has(geometry)) {
+        continue;
+      } else {
+        if (!this.hiddenSince.has(geometry)) {
+          this.hiddenSince.set(geometry, now);
+        }
+        if (now - this.hiddenSince.get(geometry) >= evictAfter) {
+          candidates.push(geometry);
+        }
+      }
+      total += geometryBytes(geometry);
+    }
+    if (total <= budget) return;
+
+    candidates.sort(
+      (a, b) => this.hiddenSince.get(a) - this.hiddenSince.get(b)
+    );
+    var evicted = 0;
+    for (const geometry of candidates) {
+      if (total <= budget) break;
+      geometry.dispose();
+      this.evicted.add(geometry);
+      total -= geometryBytes(geometry);
+      evicted++;
+    }
+    this.debug(`Evicted ${evicted} hidden geometries, ${total} bytes on GPU`);
+  }
+
   updateCamera() {
     var zoom = this.viewer.getCameraZoom();
     var position = this.viewer.getCameraPosition();
@@ -729,11 +1926,75 @@ export class CadViewerView extends DOMWidgetView {
     this.tracks = [];
   }
 
-  handle_change(change) {
+  handle_change(model) {
+    if (this.init) {
+      this.debug("Ignore message");
+      return;
+    }
+    if (this.suspended) {
+      // the restored viewer is built from the current model state
+      if (model.changed.disposed) this.dispose();
+      return;
+    }
+
+    // all attributes changed together, e.g. by one message from Python, are applied as one batch
+    const changed = model.changed;
+    const keys = CHANGE_ORDER.filter((key) => key in changed);
+    if (keys.length === 0) return;
+
+    this.debug("handle_change:", keys);
+    this.batchUpdates(() => {
+      var resized = false;
+      for (const key of keys) {
+        if (CHANGE_GROUPS.layout.includes(key)) {
+          // cad_width, tree_width and height need one resize only
+          if (!resized) {
+            this.resizeFromModel("tree_width" in changed);
+            resized = true;
+          }
+        } else {
+          this.applyChange(key, changed[key]);
+        }
+      }
+    });
+  }
+
+  batchUpdates(apply) {
+    // defer the render every viewer setter triggers to a single viewer.update after the batch
+    const viewer = this.viewer;
+    if (viewer == null || viewer.update == null) {
+      apply();
+      return;
+    }
+
+    const own = Object.prototype.hasOwnProperty.call(viewer, "update");
+    const update = viewer.update;
+    var requested = false;
+    var updateMarker = false;
+    var notify = false;
+    viewer.update = (marker, notifyFlag = true) => {
+      requested = true;
+      updateMarker = updateMarker || marker;
+      notify = notify || notifyFlag;
+    };
+    try {
+      apply();
+    } finally {
+      if (own) {
+        viewer.update = update;
+      } else {
+        delete viewer.update;
+      }
+    }
+    if (requested && this.viewer === viewer && !this.disposed) {
+      viewer.update(updateMarker, notify);
+    }
+  }
+
+  applyChange(key, value) {
     const setKey = (getter, setter, key, arg = null, arg2 = null) => {
       if (this.viewer == null) return;
 
-      const value = change.changed[key];
       const oldValue =
         arg == null ? this.viewer[getter]() : this.viewer[getter](arg);
       if (!isTolEqual(oldValue, value)) {
@@ -750,17 +2011,8 @@ export class CadViewerView extends DOMWidgetView {
       }
     };
 
-    const key = Object.keys(change.changed)[0];
-
-    if (this.init) {
-      this.debug("Ignore message");
-      return;
-    }
-
     var tracks = "";
-    var value = null;
     var flag = null;
-    this.debug("handle_change:", key, change.changed[key]);
     switch (key) {
       case "zoom":
         setKey("getCameraZoom", "setCameraZoom", key);
@@ -785,7 +2037,7 @@ export class CadViewerView extends DOMWidgetView {
         setKey("getGrids", "setGrids", key);
         break;
       case "center_grid":
-        this.viewer.setGridCenter(change.changed[key]);
+        this.viewer.setGridCenter(value);
         break;
       case "axes0":
         setKey("getAxes0", "setAxes0", key);
@@ -801,14 +2053,14 @@ export class CadViewerView extends DOMWidgetView {
         break;
       case "explode":
         if (this.model.get("explode") != null) {
-          let flag = change.changed[key];
+          let flag = value;
           this.viewer.display.setExplode("", flag);
           this.viewer.display.setExplodeCheck(!flag); // workaround
           this.viewer.display.setExplodeCheck(flag);
         }
         break;
       case "collapse":
-        var val = change.changed[key];
+        var val = value;
         if (["1", "R", "E", "C"].includes(val)) {
           this.viewer.display.collapseNodes(val);
         }
@@ -817,38 +2069,11 @@ export class CadViewerView extends DOMWidgetView {
         setKey("getTools", "showTools", key);
         break;
       case "glass":
-        flag = change.changed[key];
+        flag = value;
         this.viewer.display.glassMode(flag);
         break;
-      case "cad_width":
-        value = change.changed[key];
-        this.viewer.resizeCadView(
-          value,
-          this.model.get("tree_width"),
-          this.model.get("height"),
-          this.model.get("glass")
-        );
-        break;
-      case "tree_width":
-        value = change.changed[key];
-        this.viewer.resizeCadView(
-          this.model.get("cad_width"),
-          value,
-          this.model.get("height"),
-          this.model.get("glass")
-        );
-        break;
-      case "height":
-        value = change.changed[key];
-        this.viewer.resizeCadView(
-          this.model.get("cad_width"),
-          this.model.get("tree_width"),
-          value,
-          this.model.get("glass")
-        );
-        break;
       case "pinning":
-        flag = change.changed[key];
+        flag = value;
         this.viewer.display.showPinning(flag);
         break;
       case "default_edgecolor":
@@ -887,14 +2112,13 @@ export class CadViewerView extends DOMWidgetView {
         }
         break;
       case "state_updates":
-        var states = change.changed[key];
+        var states = value;
         for (var k in states) {
           // supports leaves only. TODO: extend to full sub trees
           this.viewer.setState(k, states[k], false);
         }
         break;
       case "tab":
-        value = change.changed[key];
         if (this.activeTab !== value) {
           this.activeTab = value;
           if (value === "tree" || value == "clip" || value == "material") {
@@ -932,27 +2156,22 @@ export class CadViewerView extends DOMWidgetView {
         setKey("getClipSlider", "setClipSlider", key, 2);
         break;
       case "clip_object_colors":
-        this.viewer.setClipObjectColorCaps(change.changed[key]);
+        this.viewer.setClipObjectColorCaps(value);
+        break;
+      case "gpu_budget":
+        this.startEviction();
+        break;
+      case "camera_link":
+        this.setCameraLink(value);
         break;
       case "debug":
-        this._debug = change.changed[key];
+        this._debug = value;
         break;
       case "disposed":
-        if (this.title != null) {
-          const sidecar = App.getSidecar(this.title);
-          if (sidecar != null) {
-            if (this.anchor == "right") {
-              sidecar.disposeSidebar(null, sidecar.widget);
-            } else {
-              sidecar.widget.title.owner.dispose();
-            }
-          }
-        } else {
-          this.dispose();
-        }
+        this.disposeView();
         break;
       case "measure":
-        this.viewer.handleBackendResponse(change.changed[key]);
+        this.viewer.handleBackendResponse(value);
         break;
     }
   }
@@ -994,7 +2213,283 @@ export class CadViewerView extends DOMWidgetView {
     this.viewer.pinAsPng();
   }
 
+  renderFrames(id, tracks, fps, start, end, width, height, format, quality) {
+    // step the animation clip frame by frame and stream the encoded images to Python
+    const fail = (message) =>
+      this.send({ type: "frames_error", id: id, message: message });
+
+    if (this.viewer == null || this.viewer.renderer == null) {
+      fail("viewer is not rendered");
+      return;
+    }
+    if (tracks == null || tracks.length === 0) {
+      fail("no animation, add tracks first");
+      return;
+    }
+
+    // the tracks of the request can differ from (or arrive before) the model's
+    const replaced =
+      this.viewer.clipAction == null ||
+      JSON.stringify(this.tracks) !== JSON.stringify(tracks);
+    if (replaced) {
+      if (this.viewer.clipAction != null) {
+        this.clearAnimation();
+      }
+      this.addTracks(tracks);
+      this.viewer.initAnimation(
+        Math.max(...tracks.map((track) => Math.max(...track[2]))),
+        1
+      );
+    }
+    const action = this.viewer.clipAction;
+    if (action == null) {
+      fail("no animation, add tracks first");
+      return;
+    }
+
+    const mixer = action.getMixer();
+    const canvas = this.viewer.renderer.domElement;
+    const count = Math.max(1, Math.round((end - start) * fps));
+    const scale =
+      (width != null && width !== canvas.width) ||
+      (height != null && height !== canvas.height);
+    const target = scale ? document.createElement("canvas") : canvas;
+    if (scale) {
+      target.width = width || canvas.width;
+      target.height = height || canvas.height;
+    }
+
+    // freeze the render loop of the viewer, the clip time is set explicitly per frame
+    const paused = action.paused;
+    const time = action.time;
+    action.paused = true;
+    action.enabled = true;
+    if (!action.isScheduled()) action.play();
+
+    const restore = () => {
+      if (replaced) {
+        // go back to the animation of the model
+        this.clearAnimation();
+        const modelTracks = this.model.get("tracks");
+        if (modelTracks != null && modelTracks.length > 0) {
+          this.addTracks(modelTracks);
+          this.animate();
+        }
+      } else {
+        action.time = time;
+        action.paused = paused;
+        mixer.update(0);
+      }
+      this.viewer.update(true, false);
+    };
+
+    const encode = () => {
+      if (scale) {
+        const context = target.getContext("2d");
+        context.drawImage(canvas, 0, 0, target.width, target.height);
+      }
+      return encodeCanvas(target, format, quality);
+    };
+
+    const step = (index) => {
+      if (index >= count || this.disposed) {
+        restore();
+        this.send({ type: "frames_done", id: id, count: index });
+        return;
+      }
+      const t = Math.min(start + index / fps, end);
+      action.time = t;
+      mixer.update(0);
+      // render synchronously, so that the canvas holds the frame when it is encoded
+      this.viewer.update(true, false);
+      encode()
+        .then((buffer) => {
+          this.send(
+            { type: "frame", id: id, index: index, time: t, format: format },
+            [buffer]
+          );
+          step(index + 1);
+        })
+        .catch((error) => {
+          restore();
+          fail(error.message);
+        });
+    };
+    step(0);
+  }
+
+  whenShapesReady() {
+    // custom messages are handled right away, while state updates sent before
+    // them are applied through the model's promise chain and external shapes
+    // are loaded asynchronously on top
+    return this.model.state_change.then(() => this.loading);
+  }
+
+  thumbnails(id, parts, width, height, direction, format, quality) {
+    // wait for the shapes sent before the request, deferred parts to be rendered
+    // are requested first and rendered after their geometry has been added
+    const render = () =>
+      this.renderThumbnails(
+        id,
+        parts,
+        width,
+        height,
+        direction,
+        format,
+        quality
+      );
+
+    this.whenShapesReady().then(() => {
+      // hidden parts are skipped, so only visible deferred parts are needed
+      const states = this.model.get("states") || {};
+      const lazyParts = this.model.get("lazy_parts") || [];
+      const paths = lazyParts.filter(
+        (path) =>
+          !isHidden(states, path) &&
+          parts.some(
+            (part) => path === part.path || path.startsWith(`${part.path}/`)
+          )
+      );
+      if (paths.length === 0 || this.viewer == null) {
+        render();
+        return;
+      }
+      this.pendingThumbnails = render;
+      this.debug("Requesting geometry for thumbnails", paths);
+      this.send({ type: "request_geometry", paths: paths });
+    });
+  }
+
+  renderThumbnails(id, parts, width, height, direction, format, quality) {
+    // render every part isolated and framed with a dedicated camera into an
+    // offscreen render target, the live view and its camera stay untouched.
+    // Hidden parts are skipped and reported as such.
+    const viewer = this.viewer;
+    const live =
+      viewer != null &&
+      viewer.camera != null &&
+      typeof viewer.camera.getCamera === "function"
+        ? viewer.camera.getCamera()
+        : null;
+    if (
+      live == null ||
+      viewer.renderer == null ||
+      viewer.scene == null ||
+      viewer.nestedGroup == null
+    ) {
+      this.send({
+        type: "thumbnails_error",
+        id: id,
+        message: "viewer is not rendered"
+      });
+      return;
+    }
+
+    const renderer = viewer.renderer;
+    const groups = viewer.nestedGroup.groups;
+    const states = this.model.get("states") || {};
+    const distance = viewer.camera.camera_distance;
+
+    // the preset computes the orientation on the live camera, which is restored
+    // before anything is drawn
+    const saved = this.getCamera();
+    viewer.camera.presetCamera(direction);
+    const position = viewer.getCameraPosition();
+    const target = viewer.getCameraTarget();
+    const offset = normalize([0, 1, 2].map((i) => position[i] - target[i]));
+    const quaternion = live.quaternion.clone();
+    viewer.setCameraTarget(saved.target, false);
+    viewer.setCameraPosition(saved.position, false, false);
+    viewer.setCameraQuaternion(saved.quaternion, false);
+    viewer.setCameraZoom(saved.zoom, false);
+
+    const camera = live.clone();
+    const aspect = width / height;
+    if (camera.isPerspectiveCamera) {
+      camera.aspect = aspect;
+    } else {
+      const half = (camera.top - camera.bottom) / 2;
+      camera.left = -half * aspect;
+      camera.right = half * aspect;
+    }
+
+    const renderTarget = new WebGLRenderTarget(width, height, { samples: 4 });
+    const pixels = new Uint8Array(width * height * 4);
+    const srgb = renderer.outputColorSpace === "srgb";
+    const previousTarget = renderer.getRenderTarget();
+
+    const visible = new Map();
+    const images = [];
+    const rendered = [];
+    const skipped = [];
+    try {
+      for (const part of parts) {
+        const path = part.path;
+        if (isHidden(states, path)) {
+          skipped.push(path);
+          continue;
+        }
+        for (const name in groups) {
+          const related =
+            name === path ||
+            name.startsWith(`${path}/`) ||
+            path.startsWith(`${name}/`);
+          if (!visible.has(name)) visible.set(name, groups[name].visible);
+          groups[name].visible = related && visible.get(name);
+        }
+
+        const center = part.center;
+        camera.position.set(
+          ...[0, 1, 2].map((i) => center[i] + offset[i] * distance)
+        );
+        camera.quaternion.copy(quaternion);
+        // zoom 1 frames the whole scene, the camera distance is 5 scene radii
+        camera.zoom = distance / (5 * Math.max(part.radius, 1e-6));
+        camera.updateProjectionMatrix();
+        camera.updateMatrixWorld();
+
+        renderer.setRenderTarget(renderTarget);
+        renderer.clear();
+        renderer.render(viewer.scene, camera);
+        renderer.readRenderTargetPixels(
+          renderTarget,
+          0,
+          0,
+          width,
+          height,
+          pixels
+        );
+        images.push(pixelsToCanvas(pixels, width, height, srgb));
+        rendered.push(path);
+      }
+    } finally {
+      renderer.setRenderTarget(previousTarget);
+      renderTarget.dispose();
+      for (const [name, flag] of visible) groups[name].visible = flag;
+    }
+
+    Promise.all(images.map((image) => encodeCanvas(image, format, quality)))
+      .then((buffers) =>
+        this.send(
+          {
+            type: "thumbnails",
+            id: id,
+            paths: rendered,
+            skipped: skipped,
+            format: format
+          },
+          buffers
+        )
+      )
+      .catch((error) =>
+        this.send({ type: "thumbnails_error", id: id, message: error.message })
+      );
+  }
+
   onCustomMessage(msg, buffers) {
+    // other message types are handled by the model
+    if (msg.type !== "cad_viewer_method") return;
+
     this.debug(
       "New message with msgType:",
       msg.type,
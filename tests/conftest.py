@@ -0,0 +1,41 @@
+import json
+from pathlib import Path
+
+import comm
+import pytest
+from comm.base_comm import BaseComm
+
+from cad_viewer_widget import CadViewer
+from cad_viewer_widget.utils import numpyify
+
+EXAMPLES = Path(__file__).parent.parent / "examples"
+
+
+class RecordingComm(BaseComm):
+    """A comm keeping the messages sent to the browser as (data, buffers)"""
+
+    messages = []
+
+    def publish_msg(self, msg_type, data=None, metadata=None, buffers=None, **keys):
+        RecordingComm.messages.append((data, buffers or []))
+
+
+@pytest.fixture
+def messages(monkeypatch):
+    monkeypatch.setattr(comm, "create_comm", RecordingComm)
+    RecordingComm.messages = []
+    return RecordingComm.messages
+
+
+@pytest.fixture
+def viewer(messages):
+    return CadViewer()
+
+
+@pytest.fixture
+def example():
+    def load(name):
+        with open(EXAMPLES / f"{name}.json", "r") as fd:
+            return numpyify(json.load(fd))
+
+    return load
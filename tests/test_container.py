@@ -0,0 +1,78 @@
+"""Round trip of shapes through the binary container format"""
+
+import numpy as np
+import pytest
+
+from cad_viewer_widget import load_shapes, save_shapes
+from cad_viewer_widget.utils import content_hash, numpyify
+
+
+def make_shapes():
+    return numpyify(
+        {
+            "version": 3,
+            "name": "Group",
+            "id": "/Group",
+            "loc": [[0, 0, 0], [0, 0, 0, 1]],
+            "parts": [
+                {
+                    "version": 3,
+                    "name": "Box",
+                    "id": "/Group/Box",
+                    "type": "shapes",
+                    "color": "#e8b024",
+                    "loc": [[0, 0, 0], [0, 0, 0, 1]],
+                    "shape": {
+                        "vertices": [0, 0, 0, 1, 0, 0, 0, 1, 0],
+                        "normals": [0, 0, 1, 0, 0, 1, 0, 0, 1],
+                        "triangles": [0, 1, 2],
+                        "edges": [0, 0, 0, 1, 0, 0],
+                    },
+                },
+                {
+                    "version": 3,
+                    "name": "Edges",
+                    "id": "/Group/Edges",
+                    "type": "edges",
+                    "color": "#ba55d3",
+                    "loc": [[0, 0, 0], [0, 0, 0, 1]],
+                    "shape": {
+                        "vertices": [],
+                        "normals": [],
+                        "triangles": [],
+                        "edges": [0, 0, 0, 0, 0, 1],
+                    },
+                },
+            ],
+            "bb": {"xmin": 0, "xmax": 1, "ymin": 0, "ymax": 1, "zmin": 0, "zmax": 1},
+        }
+    )
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_round_trip(tmp_path, mmap):
+    shapes = make_shapes()
+    path = tmp_path / "shapes.cvw"
+    size = save_shapes(path, shapes)
+    assert size == path.stat().st_size
+
+    loaded = load_shapes(path, mmap=mmap)
+    assert loaded["name"] == "Group"
+    box, edges = (part["shape"] for part in loaded["parts"])
+
+    np.testing.assert_array_equal(box["vertices"], shapes["parts"][0]["shape"]["vertices"])
+    np.testing.assert_array_equal(box["triangles"], [[0, 1, 2]])
+    assert box["triangles"].dtype == np.uint32
+
+    # empty arrays keep their shape, e.g. the (0, 3) triangles of parts without faces
+    assert edges["triangles"].shape == (0, 3)
+    assert edges["vertices"].shape == (0,)
+    np.testing.assert_array_equal(edges["edges"], shapes["parts"][1]["shape"]["edges"])
+
+
+def test_content_hash_with_empty_arrays():
+    shapes = make_shapes()
+    assert content_hash(shapes) == content_hash(make_shapes())
+
+    shapes["parts"][1]["shape"]["edges"] = np.zeros((0, 3), dtype=np.float32)
+    assert content_hash(shapes) != content_hash(make_shapes())
@@ -0,0 +1,76 @@
+"""Face and edge offset tables of decoded geometries"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from cad_viewer_widget.container import _decode_buffer
+from cad_viewer_widget.geometry import GeometryCache, ShapeGeometry
+
+EXAMPLES = Path(__file__).parent.parent / "examples"
+
+
+def instances(name):
+    with open(EXAMPLES / f"{name}.json", "r", encoding="utf-8") as fd:
+        return json.load(fd)["instances"]
+
+
+@pytest.mark.parametrize("name", ["boxes", "hexapod", "faces"])
+def test_slices_follow_the_counts(name):
+    for instance in instances(name):
+        geometry = ShapeGeometry(instance)
+        triangles = _decode_buffer(instance["triangles"]).reshape(-1, 3)
+        edges = _decode_buffer(instance["edges"]).reshape(-1, 2, 3)
+        triangles_per_face = _decode_buffer(instance["triangles_per_face"])
+        segments_per_edge = _decode_buffer(instance["segments_per_edge"])
+
+        assert geometry.n_faces == len(triangles_per_face)
+        assert geometry.n_edges == len(segments_per_edge)
+
+        start = 0
+        for i, count in enumerate(triangles_per_face):
+            np.testing.assert_array_equal(geometry.face(i), triangles[start : start + count])
+            assert all(geometry.face_of_triangle(t) == i for t in range(start, start + count))
+            start += count
+        assert start == len(triangles)
+
+        start = 0
+        for j, count in enumerate(segments_per_edge):
+            np.testing.assert_array_equal(geometry.edge(j), edges[start : start + count])
+            start += count
+        assert start == len(edges)
+
+
+def test_faces_without_triangles():
+    # a unit square split into two triangles as face 0, an empty face 1 and a single triangle as face 2
+    geometry = ShapeGeometry(
+        {
+            "vertices": [0, 0, 0, 1, 0, 0, 1, 1, 0, 0, 1, 0, 0, 0, 1],
+            "triangles": [0, 1, 2, 0, 2, 3, 0, 1, 4],
+            "triangles_per_face": [2, 0, 1],
+            "edges": [],
+            "segments_per_edge": [],
+        }
+    )
+    assert geometry.n_faces == 3 and geometry.n_edges == 0
+    assert geometry.face(1).shape == (0, 3)
+    np.testing.assert_array_equal(geometry.face(2), [[0, 1, 4]])
+    np.testing.assert_array_equal(geometry.triangle_faces, [0, 0, 2])
+
+    np.testing.assert_allclose(geometry.face_areas, [1.0, 0.0, 0.5])
+    np.testing.assert_allclose(geometry.face_normals, [[0, 0, 1], [0, 0, 0], [0, -1, 0]])
+    np.testing.assert_allclose(geometry.face_centers[0], [0.5, 0.5, 0])
+
+
+def test_cache_shares_instances(example):
+    shapes = example("boxes")
+    red, green, blue = shapes["shapes"]["parts"]
+    blue["parts"][0]["shape"] = {"ref": 0}
+
+    cache = GeometryCache(shapes)
+    assert cache[blue["parts"][0]["id"]] is cache[red["parts"][0]["id"]]
+    assert cache[green["parts"][0]["id"]] is not cache[red["parts"][0]["id"]]
+    with pytest.raises(KeyError):
+        cache["/unknown"]
@@ -0,0 +1,85 @@
+"""Deferred geometry of hidden parts"""
+
+import numpy as np
+import pytest
+
+from cad_viewer_widget.lazy import defer_hidden, select_parts
+from cad_viewer_widget.utils import iter_parts
+
+GREEN = "/ensemble/green box/green box"
+BLUE = "/ensemble/blue box/blue box"
+
+
+@pytest.fixture
+def boxes(example):
+    shapes = example("boxes")
+    for part in iter_parts(shapes["shapes"]):
+        if part["id"] in (GREEN, BLUE):
+            part["state"] = [0, 0]
+    return shapes
+
+
+def test_defer_hidden(boxes):
+    payload, deferred = defer_hidden(boxes)
+    assert sorted(deferred) == [BLUE, GREEN]
+
+    parts = {part["id"]: part for part in iter_parts(payload["shapes"])}
+    for path in deferred:
+        shape = payload["instances"][parts[path]["shape"]["ref"]]
+        assert shape["vertices"]["buffer"] == ""
+        # deferred parts keep their metadata
+        assert parts[path]["color"] is not None
+
+    payload, deferred = defer_hidden(boxes, loaded={GREEN})
+    assert deferred == [BLUE]
+
+    payload, deferred = defer_hidden(boxes, states={GREEN: (1, 1)})
+    assert deferred == [BLUE]
+
+
+def test_select_parts(boxes):
+    payload = select_parts(boxes, {GREEN})
+    assert [part["id"] for part in payload["shapes"]["parts"]] == [GREEN]
+
+    part = payload["shapes"]["parts"][0]
+    assert list(part) == ["id", "type", "shape"]
+    source = next(p for p in iter_parts(boxes["shapes"]) if p["id"] == GREEN)
+    np.testing.assert_array_equal(
+        payload["instances"][part["shape"]["ref"]]["vertices"],
+        boxes["instances"][source["shape"]["ref"]]["vertices"],
+    )
+
+
+def test_reveal_sends_only_the_part(viewer, messages, boxes):
+    viewer.add_shapes(boxes, up="Z", control="trackball", lazy=True)
+    assert sorted(viewer.widget.lazy_parts) == [BLUE, GREEN]
+
+    viewer.widget.states = {part["id"]: part["state"] for part in iter_parts(boxes["shapes"])}
+    messages.clear()
+    viewer.update_states({GREEN: (1, 1)})
+
+    assert viewer.widget.lazy_parts == [BLUE]
+    states = [data["state"] for data, _ in messages if data["method"] == "update"]
+    assert not any("shapes" in state for state in states)
+
+    custom = [data["content"] for data, _ in messages if data["method"] == "custom"]
+    assert len(custom) == 1 and custom[0]["type"] == "part_geometry"
+    assert [part["id"] for part in custom[0]["data"]["shapes"]["parts"]] == [GREEN]
+
+    # parts already sent are not requested again
+    messages.clear()
+    viewer.update_states({GREEN: (1, 1)})
+    assert not any(data["method"] == "custom" for data, _ in messages)
+
+
+def test_request_geometry_runs_in_the_background(viewer, messages, boxes):
+    from cad_viewer_widget.background import get_executor
+
+    viewer.add_shapes(boxes, up="Z", control="trackball", lazy=True)
+    with viewer._lock:
+        # the shell thread returns right away, even while the viewer is busy
+        viewer._handle_msg(viewer.widget, {"type": "request_geometry", "paths": [GREEN]}, [])
+        assert sorted(viewer.widget.lazy_parts) == [BLUE, GREEN]
+
+    get_executor().submit(lambda: None).result(timeout=10)
+    assert viewer.widget.lazy_parts == [BLUE]
@@ -0,0 +1,52 @@
+"""Streaming JSON loader against json.load"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from cad_viewer_widget.container import _decode_buffer, _is_encoded_buffer
+from cad_viewer_widget.loader import iter_shapes_json, load_shapes_json
+from cad_viewer_widget.utils import iter_parts
+
+PATHS = sorted((Path(__file__).parent.parent / "examples").glob("*.json"))
+
+
+def assert_same(loaded, expected, path="$"):
+    if _is_encoded_buffer(expected):
+        np.testing.assert_array_equal(loaded, _decode_buffer(expected), err_msg=path)
+        assert loaded.dtype == expected["dtype"], path
+    elif isinstance(expected, dict):
+        assert list(loaded) == list(expected), path
+        for key, value in expected.items():
+            assert_same(loaded[key], value, f"{path}.{key}")
+    elif isinstance(expected, list):
+        assert len(loaded) == len(expected), path
+        for i, (a, b) in enumerate(zip(loaded, expected)):
+            assert_same(a, b, f"{path}[{i}]")
+    else:
+        assert loaded == expected, path
+
+
+@pytest.mark.parametrize("path", PATHS, ids=lambda p: p.stem)
+# small chunks split values and whitespace across reads
+@pytest.mark.parametrize("chunk_size", [7, 1 << 20])
+def test_load_shapes_json(path, chunk_size):
+    with open(path, "r", encoding="utf-8") as fd:
+        expected = json.load(fd)
+    assert_same(load_shapes_json(path, chunk_size=chunk_size), expected)
+
+
+@pytest.mark.parametrize("path", PATHS[:3], ids=lambda p: p.stem)
+def test_iter_shapes_json_resolves_instances(path):
+    with open(path, "r", encoding="utf-8") as fd:
+        expected = json.load(fd)
+
+    leaves = list(iter_shapes_json(path, chunk_size=64))
+    assert [leaf["id"] for leaf in leaves] == [part["id"] for part in iter_parts(expected["shapes"])]
+    for leaf, part in zip(leaves, iter_parts(expected["shapes"])):
+        shape = part["shape"]
+        if isinstance(shape, dict) and shape.get("ref") is not None:
+            shape = expected["instances"][shape["ref"]]
+        assert_same(leaf["shape"], shape)
@@ -0,0 +1,40 @@
+"""Memory accounting of shapes payloads"""
+
+import base64
+
+import pytest
+
+from cad_viewer_widget.memory import TEXEL_BYTES, estimate
+from cad_viewer_widget.utils import iter_parts
+
+IMAGE = b"\x89PNG" + bytes(range(256)) * 400
+
+
+@pytest.fixture
+def textured_boxes(example):
+    shapes = example("boxes")
+    # one image shared by all parts, as with catalog parts
+    data = base64.b64encode(IMAGE).decode()
+    for part in iter_parts(shapes["shapes"]):
+        part["texture"] = {"image": {"format": "png", "data": data}, "width": 100, "height": 100}
+    return shapes
+
+
+def test_memory_report_with_extracted_textures(viewer, textured_boxes):
+    before = estimate(textured_boxes)
+
+    viewer.add_shapes(textured_boxes, up="Z", control="trackball")
+    assert "textures" in viewer.widget.shapes
+    report = viewer.memory_report()
+
+    parts = list(report["parts"].values())
+    texture = [part["payload"]["texture"] for part in parts]
+    # the shared image is counted once, as binary buffer
+    assert sorted(texture) == [0, 0, len(IMAGE)]
+    assert [part["gpu"]["texture"] for part in parts] == [int(100 * 100 * TEXEL_BYTES)] * 3
+
+    assert report["total"]["gpu"] == before["total"]["gpu"]
+    geometry = before["total"]["payload"] - len(base64.b64encode(IMAGE))
+    assert report["total"]["payload"] == geometry + len(IMAGE)
+    # the browser figures arrive with the next call
+    assert report["browser"] is None
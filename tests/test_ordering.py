@@ -0,0 +1,35 @@
+"""Preview of the most visible parts"""
+
+from cad_viewer_widget.ordering import preview_parts, rank_parts
+from cad_viewer_widget.utils import iter_parts
+
+
+def test_rank_parts_from_bb(example):
+    shapes = example("boxes")
+    parts = list(iter_parts(shapes["shapes"]))
+    ranking = dict(rank_parts(shapes))
+
+    # with a bb the geometry is not decoded, a larger box ranks first
+    big = parts[0]
+    big["bb"] = {"xmin": -100, "xmax": 100, "ymin": -100, "ymax": 100, "zmin": -100, "zmax": 100}
+    big["shape"] = {"ref": None}
+    assert rank_parts(shapes)[0][0] == big["id"]
+    assert set(dict(rank_parts(shapes))) == set(ranking)
+
+
+def test_progressive_adds_the_other_parts(viewer, messages, example):
+    shapes = example("hexapod")
+    keep = preview_parts(shapes, 0.05)
+    assert keep is not None
+
+    viewer.add_shapes(shapes, up="Z", control="trackball", progressive=True)
+
+    sent = [data["state"]["shapes"] for data, _ in messages if (data.get("state") or {}).get("shapes")]
+    assert len(sent) == 1
+    custom = [data["content"] for data, _ in messages if data.get("method") == "custom"]
+    assert len(custom) == 1 and custom[0]["type"] == "part_geometry"
+
+    rest = {part["id"] for part in custom[0]["data"]["shapes"]["parts"]}
+    assert rest and not rest & keep
+    assert rest | keep == {part["id"] for part in iter_parts(shapes["shapes"])}
+    assert viewer.widget.lazy_parts == []
@@ -0,0 +1,70 @@
+"""Recording the comm traffic of a viewer and replaying it"""
+
+from cad_viewer_widget import CadViewer
+from cad_viewer_widget.recorder import HeadlessComm, headless_viewer, read_recording, replay
+from cad_viewer_widget.utils import iter_parts
+
+GREEN = "/ensemble/green box/green box"
+
+
+def record(viewer, example, path):
+    shapes = example("boxes")
+    viewer.start_recording(path)
+    viewer.add_shapes(shapes, up="Z", control="trackball")
+    viewer.update_states({GREEN: (0, 1)})
+    # a state change from the browser
+    viewer.widget._handle_msg(
+        {"content": {"data": {"method": "update", "state": {"zoom": 2.0}, "buffer_paths": []}}, "buffers": []}
+    )
+    return viewer.stop_recording()
+
+
+def test_recording(viewer, example, tmp_path):
+    path = tmp_path / "session.cvw"
+    totals = record(viewer, example, path)
+
+    records = list(read_recording(path))
+    assert len(records) == totals["messages"]
+    assert sum(record["size"] for record in records) == totals["bytes"]
+    assert records[0]["direction"] == "open"
+    incoming = [record["data"] for record in records if record["direction"] == "in"]
+    assert [data["state"] for data in incoming] == [{"zoom": 2.0}]
+    assert [r["time"] for r in records] == sorted(r["time"] for r in records)
+
+
+def test_replay_into_headless_viewer(viewer, example, tmp_path):
+    path = tmp_path / "session.cvw"
+    totals = record(viewer, example, path)
+
+    replayed = headless_viewer()
+    assert isinstance(replayed.widget.comm, HeadlessComm)
+    stats = replay(path, replayed, speed=None, incoming=True)
+
+    assert stats["messages"] == totals["messages"]
+    assert stats["by_direction"]["in"]["messages"] == 1
+    assert len(stats["slowest"]) == min(10, totals["messages"])
+
+    # the kernel side of the replayed viewer ends up in the recorded state
+    assert replayed.widget.states == viewer.widget.states
+    assert replayed.widget.zoom == 2.0
+    assert [part["id"] for part in iter_parts(replayed.widget.shapes["shapes"])] == [
+        part["id"] for part in iter_parts(viewer.widget.shapes["shapes"])
+    ]
+
+
+def test_replay_sends_the_recorded_messages(viewer, messages, example, tmp_path):
+    path = tmp_path / "session.cvw"
+    record(viewer, example, path)
+    # echoes of states set on the kernel side differ, the replay applies every recorded state
+    recorded = [
+        r["data"] for r in read_recording(path) if r["direction"] == "out" and r["data"]["method"] != "echo_update"
+    ]
+
+    replayed = CadViewer()
+    messages.clear()
+    replay(path, replayed, speed=None)
+
+    # the initial state is sent as an update, followed by the recorded messages
+    sent = [data for data, _ in messages if data["method"] != "echo_update"]
+    assert sent[0]["method"] == "update"
+    assert sent[1:] == recorded
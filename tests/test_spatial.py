@@ -0,0 +1,108 @@
+"""Spatial queries against brute force over all boxes and triangles"""
+
+import numpy as np
+import pytest
+
+from cad_viewer_widget.geometry import GeometryCache
+from cad_viewer_widget.spatial import (
+    BVH,
+    SpatialIndex,
+    _closest_on_triangles,
+    _located_parts,
+    _ray_triangles,
+)
+
+
+@pytest.fixture
+def hexapod(example):
+    return example("hexapod")
+
+
+def world_triangles(shapes):
+    """Triangle corners of all parts in world coordinates and the path of every triangle"""
+    geometries = GeometryCache(shapes)
+    corners, paths = [], []
+    for part, rotation, translation in _located_parts(shapes["shapes"]):
+        geometry = geometries[part["id"]]
+        tri = geometry.vertices.astype(np.float64)[geometry.triangles]
+        corners.append(tri @ rotation.T + translation)
+        paths.extend([part["id"]] * len(tri))
+    corners = np.concatenate(corners)
+    return (corners[:, 0], corners[:, 1], corners[:, 2]), np.array(paths)
+
+
+def random_points(shapes, n, rng, margin=0.0):
+    bb = shapes["shapes"]["bb"]
+    lo = np.array([bb["xmin"], bb["ymin"], bb["zmin"]]) - margin
+    hi = np.array([bb["xmax"], bb["ymax"], bb["zmax"]]) + margin
+    return lo + rng.random((n, 3)) * (hi - lo)
+
+
+@pytest.mark.parametrize("leaf_size", [1, 8])
+def test_bvh_query(leaf_size):
+    rng = np.random.default_rng(1)
+    mins = rng.random((500, 3)) * 100
+    maxs = mins + rng.random((500, 3)) * 10
+    bvh = BVH(mins, maxs, leaf_size=leaf_size)
+
+    for lo in rng.random((20, 3)) * 100:
+        hi = lo + 15
+
+        def intersects(node_min, node_max):
+            return np.all((node_min <= hi) & (node_max >= lo), axis=1)
+
+        # the boxes of all leaves passing the test, a superset of the boxes passing it
+        found = bvh.query(intersects)
+        assert len(np.unique(found)) == len(found)
+        found = np.sort(found[intersects(mins[found], maxs[found])])
+        np.testing.assert_array_equal(found, np.flatnonzero(intersects(mins, maxs)))
+
+    assert BVH(np.zeros((0, 3)), np.zeros((0, 3))).query(lambda a, b: None).size == 0
+
+
+def test_ray_pick(hexapod):
+    rng = np.random.default_rng(2)
+    index = SpatialIndex(hexapod)
+    (a, b, c), paths = world_triangles(hexapod)
+
+    origins = random_points(hexapod, 50, rng, margin=100)
+    targets = random_points(hexapod, 50, rng)
+    hits = 0
+    for origin, target in zip(origins, targets):
+        direction = (target - origin) / np.linalg.norm(target - origin)
+        t = _ray_triangles(origin, direction, a, b, c)
+        hit = index.ray_pick(origin, target - origin)
+
+        if not np.isfinite(t.min()):
+            assert hit is None
+            continue
+        hits += 1
+        assert hit["distance"] == pytest.approx(t.min(), rel=1e-9, abs=1e-9)
+        assert hit["path"] in paths[t <= t.min() + 1e-9]
+        np.testing.assert_allclose(hit["point"], origin + t.min() * direction, atol=1e-6)
+    assert hits > 10
+
+
+def test_parts_in_box(hexapod):
+    rng = np.random.default_rng(3)
+    index = SpatialIndex(hexapod)
+
+    corners = random_points(hexapod, 40, rng)
+    for lo, hi in zip(corners[::2], corners[1::2]):
+        lo, hi = np.minimum(lo, hi), np.maximum(lo, hi)
+        overlaps = np.all((index.mins <= hi) & (index.maxs >= lo), axis=1)
+        inside = np.all((index.mins >= lo) & (index.maxs <= hi), axis=1)
+        assert index.parts_in_box((lo, hi)) == [p for p, o in zip(index.paths, overlaps) if o]
+        assert index.parts_in_box((lo, hi), inside=True) == [p for p, i in zip(index.paths, inside) if i]
+
+
+def test_nearest_part(hexapod):
+    rng = np.random.default_rng(4)
+    index = SpatialIndex(hexapod)
+    (a, b, c), paths = world_triangles(hexapod)
+
+    for point in random_points(hexapod, 20, rng, margin=50):
+        distances = np.linalg.norm(_closest_on_triangles(point, a, b, c) - point, axis=1)
+        nearest = index.nearest_part(point)
+        assert nearest["distance"] == pytest.approx(distances.min(), rel=1e-9, abs=1e-9)
+        assert nearest["path"] in paths[distances <= distances.min() + 1e-9]